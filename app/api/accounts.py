@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response
 from uuid import UUID, uuid4
 from datetime import datetime, timezone
 from app.models.schemas.account import Account, AccountOut
 from app.models.schemas.membership import UserAccount, UserAccountOut
-from app.services.storage import load_versions, save_version, mark_old_version_as_stale, soft_delete_record, log_action
+from app.services.storage import (
+    load_page_async,
+    load_versions_async,
+    save_version_async,
+    mark_old_version_as_stale_async,
+    soft_delete_record_async,
+    log_action_async,
+    next_version,
+)
 from app.services.auth import get_current_user
+from app.services.commitlog import transaction
+from app.services.etags import check_if_match, conditional_get, etag
+from app.services.serialization import json_rows_response
 from app.services.roles import require_household_role, get_membership, require_account_access
-from app.services.utils import page_params
+from app.services.utils import as_of_param, decode_cursor, page_params, set_next_cursor
 from app.services.fetchers import fetch_record
 from app.models.enums import Role
 
@@ -14,8 +25,8 @@ router = APIRouter()
 
 
 @router.post("/")
-def create_account(payload: Account, user=Depends(get_current_user)):
-    require_household_role(user, payload.household_id, Role.admin)
+async def create_account(payload: Account, user=Depends(get_current_user)):
+    await require_household_role(user, payload.household_id, Role.admin)
     now = datetime.now(timezone.utc)
     account = Account(
         account_id=uuid4(),
@@ -26,81 +37,92 @@ def create_account(payload: Account, user=Depends(get_current_user)):
         is_current=True,
         is_deleted=False,
     )
-    save_version(account, "accounts", "account_id")
-    log_action(user["user_id"], "create", "accounts", str(account.account_id), payload.model_dump())
+    await save_version_async(account, "accounts", "account_id")
+    await log_action_async(user["user_id"], "create", "accounts", str(account.account_id), payload.model_dump())
 
     return {"message": "Account created", "account_id": str(account.account_id)}
 
 
 @router.post("/{account_id}/assign-user")
-def assign_user_to_account(account_id: UUID, target_user_id: UUID, user=Depends(get_current_user)):
-    acc_df = load_versions("accounts", Account, record_id=account_id)
+async def assign_user_to_account(account_id: UUID, target_user_id: UUID, user=Depends(get_current_user)):
+    acc_df = await load_versions_async("accounts", Account, record_id=account_id)
     cur = acc_df[(acc_df["is_current"]) & (~acc_df["is_deleted"].fillna(False))]
     if cur.empty:
         raise HTTPException(status_code=404, detail="Account not found")
     acc = cur.iloc[0].to_dict()
 
-    require_household_role(user, acc["household_id"], Role.admin)
+    await require_household_role(user, acc["household_id"], Role.admin)
 
-    mem = get_membership(target_user_id, acc["household_id"])
+    mem = await get_membership(target_user_id, acc["household_id"])
     if not mem:
         raise HTTPException(status_code=400, detail="Assignee must be a member of the household")
 
     # Mark previous mapping as stale (enforce 1 user per account)
-    ua = load_versions("user_accounts", UserAccount)
+    ua = await load_versions_async("user_accounts", UserAccount)
     existing = ua[(ua["account_id"] == str(account_id)) & (ua["is_current"]) & (~ua["is_deleted"].fillna(False))]
     for _, row in existing.iterrows():
-        mark_old_version_as_stale("user_accounts", row["mapping_id"], "mapping_id")
+        await mark_old_version_as_stale_async("user_accounts", row["mapping_id"], "mapping_id")
         row_dict = row.to_dict()
         row_dict.update({"updated_at": datetime.now(timezone.utc), "is_current": True, "is_deleted": True})
-        save_version(UserAccount(**row_dict), "user_accounts", "mapping_id")
+        await save_version_async(UserAccount(**row_dict), "user_accounts", "mapping_id")
 
     # Add new mapping
     mapping = UserAccount(user_id=target_user_id, account_id=account_id, role=Role("member"))
-    save_version(mapping, "user_accounts", "mapping_id")
+    await save_version_async(mapping, "user_accounts", "mapping_id")
 
-    log_action(user["user_id"], "assign_user", "accounts", str(account_id), {"user_id": str(target_user_id)})
+    await log_action_async(
+        user["user_id"], "assign_user", "accounts", str(account_id), {"user_id": str(target_user_id)}
+    )
     return {"message": "Account assigned", "account_id": str(account_id), "user_id": str(target_user_id)}
 
 
 @router.put("/{account_id}")
-def update_account(account_id: UUID, name: str, user=Depends(get_current_user)):
-    acc_df = load_versions("accounts", Account, record_id=account_id)
+async def update_account(
+    account_id: UUID,
+    name: str,
+    response: Response,
+    if_match: str | None = Header(None),
+    user=Depends(get_current_user),
+):
+    acc_df = await load_versions_async("accounts", Account, record_id=account_id)
     cur = acc_df[(acc_df["is_current"]) & (~acc_df["is_deleted"].fillna(False))]
     if cur.empty:
         raise HTTPException(status_code=404, detail="Account not found")
     acc = cur.iloc[0].to_dict()
+    check_if_match(if_match, acc["version"])
 
-    require_household_role(user, acc["household_id"], Role.admin)
-
-    mark_old_version_as_stale("accounts", account_id, "account_id")
+    await require_household_role(user, acc["household_id"], Role.admin)
 
     updated = Account(
         account_id=account_id,
         name=name,
-        household_id=cur["household_id"],
-        created_at=cur["created_at"],
+        household_id=acc["household_id"],
+        created_at=acc["created_at"],
         updated_at=datetime.now(timezone.utc),
         is_current=True,
         is_deleted=False,
+        version=next_version(acc),
     )
-    save_version(updated, "accounts", "account_id")
-    log_action(user["user_id"], "update", "accounts", str(account_id), {"name": name})
+    async with transaction():
+        await mark_old_version_as_stale_async("accounts", account_id, "account_id")
+        await save_version_async(updated, "accounts", "account_id")
+        await log_action_async(user["user_id"], "update", "accounts", str(account_id), {"name": name})
 
+    response.headers["ETag"] = etag(updated.version)
     return {"message": "Account updated", "account_id": str(account_id)}
 
 
 @router.delete("/{account_id}")
-def delete_account(account_id: UUID, user=Depends(get_current_user)):
+async def delete_account(account_id: UUID, user=Depends(get_current_user)):
     # Only admin of the household (or superuser)
-    acc_df = load_versions("accounts", Account, record_id=account_id)
+    acc_df = await load_versions_async("accounts", Account, record_id=account_id)
     cur = acc_df[(acc_df["is_current"]) & (~acc_df["is_deleted"].fillna(False))]
     if cur.empty:
         raise HTTPException(status_code=404, detail="Account not found")
     acc = cur.iloc[0].to_dict()
-    require_household_role(user, acc["household_id"], Role.admin)
+    await require_household_role(user, acc["household_id"], Role.admin)
 
-    resp = soft_delete_record(
+    resp = await soft_delete_record_async(
         "accounts",
         account_id,
         "account_id",
@@ -109,17 +131,24 @@ def delete_account(account_id: UUID, user=Depends(get_current_user)):
         require_owner=False,  # ownership enforced by role above
     )
 
-    log_action(user["user_id"], "delete", "accounts", str(account_id))
+    await log_action_async(user["user_id"], "delete", "accounts", str(account_id))
     return resp
 
 
 @router.get("/", response_model=list[AccountOut])
-def list_accounts(user=Depends(get_current_user), page=Depends(page_params)):
-    accounts = load_versions("accounts", Account)
-    current = accounts[(accounts["is_current"]) & (~accounts["is_deleted"].fillna(False))]
-
-    # only return accounts where user has membership
-    user_accounts = load_versions("user_accounts", UserAccount)
+async def list_accounts(
+    request: Request,
+    response: Response,
+    user=Depends(get_current_user),
+    page=Depends(page_params),
+    as_of=Depends(as_of_param),
+):
+    not_modified = await conditional_get(request, response, user, [f"user_id={user['user_id']}", "accounts"])
+    if not_modified is not None:
+        return not_modified
+
+    # only return accounts where user has membership now
+    user_accounts = await load_versions_async("user_accounts", UserAccount)
     memberships = user_accounts[
         (user_accounts["user_id"] == str(user["user_id"]))
         & (user_accounts["is_current"])
@@ -127,16 +156,27 @@ def list_accounts(user=Depends(get_current_user), page=Depends(page_params)):
     ]
     allowed_ids = set(memberships["account_id"])
 
-    current = current[current["account_id"].isin(allowed_ids)]
-    current = current.iloc[page["offset"] : page["offset"] + page["limit"]]
+    async def member_of(rows):
+        return rows[rows["account_id"].isin(allowed_ids)]
+
+    current, next_key = await load_page_async(
+        "accounts",
+        Account,
+        limit=page["offset"] + page["limit"],
+        after=decode_cursor(page["cursor"], "accounts/"),
+        keep=member_of,
+        as_of=as_of,
+    )
+    current = current.iloc[page["offset"] :]
+    set_next_cursor(response, next_key)
 
-    log_action(user["user_id"], "list", "accounts", None, {"count": len(current)})
-    return current.to_dict(orient="records")
+    await log_action_async(user["user_id"], "list", "accounts", None, {"count": len(current)})
+    return json_rows_response(current, AccountOut, response)
 
 
 @router.get("/memberships", response_model=list[UserAccountOut])
-def list_account_memberships(user=Depends(get_current_user), page=Depends(page_params)):
-    df = load_versions("user_accounts", UserAccount)
+async def list_account_memberships(user=Depends(get_current_user), page=Depends(page_params)):
+    df = await load_versions_async("user_accounts", UserAccount)
 
     if df.empty:
         return []
@@ -144,26 +184,27 @@ def list_account_memberships(user=Depends(get_current_user), page=Depends(page_p
     # Filter current + not deleted memberships
     df = df[(df["is_current"]) & (~df.get("is_deleted", False).fillna(False))]
     df = df.iloc[page["offset"] : page["offset"] + page["limit"]]
-    log_action(user["user_id"], "list", "account_membership", None, {"count": len(df)})
+    await log_action_async(user["user_id"], "list", "account_membership", None, {"count": len(df)})
     return df.to_dict(orient="records")
 
 
 @router.get("/{account_id}", response_model=AccountOut)
-def get_account(account_id: UUID, user=Depends(get_current_user)):
-    row = fetch_record(
+async def get_account(account_id: UUID, response: Response, user=Depends(get_current_user)):
+    row = await fetch_record(
         "accounts",
         Account,
         account_id,
         permission_check=lambda r: require_account_access(user, r, min_role=Role.member),
         history=False,
     )
-    log_action(user["user_id"], "get", "accounts", str(account_id))
+    await log_action_async(user["user_id"], "get", "accounts", str(account_id))
+    response.headers["ETag"] = etag(row["version"])
     return row
 
 
 @router.get("/{account_id}/history", response_model=list[AccountOut])
-def get_account_history(account_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
-    versions = fetch_record(
+async def get_account_history(account_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
+    versions = await fetch_record(
         "accounts",
         Account,
         account_id,
@@ -172,7 +213,7 @@ def get_account_history(account_id: UUID, user=Depends(get_current_user), page=D
         page=page,
         sort_by="updated_at",
     )
-    log_action(
+    await log_action_async(
         user["user_id"], "get_history", "accounts", str(account_id), {"offset": page["offset"], "limit": page["limit"]}
     )
     return versions
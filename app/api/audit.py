@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends, Query
-import pandas as pd
-from app.services.storage import load_versions
+from fastapi import APIRouter, Depends, Query, Response
+from typing import TYPE_CHECKING
+from app.lazy import lazy_module
+from app.services.storage import load_page_async
 from app.models.schemas.audit import AuditLog
 from app.services.auth import get_current_user
-from app.services.utils import page_params
+from app.services.serialization import json_rows_response
+from app.services.utils import decode_cursor, page_params, set_next_cursor
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
 
 router = APIRouter()
 
 
 @router.get("/logs", response_model=list[AuditLog])
-def list_audit_logs(
+async def list_audit_logs(
+    response: Response,
     user_id: str | None = Query(None),
     resource_type: str | None = Query(None),
     action: str | None = Query(None),
@@ -18,29 +26,33 @@ def list_audit_logs(
     user=Depends(get_current_user),
     page=Depends(page_params),
 ):
-    start_dt, end_dt = None, None
+    start_day, end_day = None, None
     if start and end:
-        start_dt, end_dt = pd.to_datetime(start), pd.to_datetime(end)
-
-    df = load_versions("audit_logs", AuditLog, start=start_dt, end=end_dt)
-    if df.empty:
-        return []
-
-    df = df[df["is_current"] & ~df["is_deleted"].fillna(False)]
-
-    if user_id:
-        df = df[df["user_id"] == user_id]
-    if resource_type:
-        df = df[df["resource_type"] == resource_type]
-    if action:
-        df = df[df["action"] == action]
-
-    # default sort desc by timestamp (or created_at)
-    sort_col = "created_at" if "created_at" in df.columns else "timestamp"
-    if sort_col in df.columns:
-        df = df.sort_values(by=sort_col, ascending=False)
-
-    # pagination slice
-    df = df.iloc[page["offset"] : page["offset"] + page["limit"]]
-
-    return df.to_dict(orient="records")
+        start_day, end_day = pd.to_datetime(start).date(), pd.to_datetime(end).date()
+
+    async def matching(df):
+        if user_id:
+            df = df[df["user_id"] == user_id]
+        if resource_type:
+            df = df[df["resource_type"] == resource_type]
+        if action:
+            df = df[df["action"] == action]
+        if start_day is not None:
+            # Whole days, both ends included
+            days = df["timestamp"].dt.date
+            df = df[(days >= start_day) & (days <= end_day)]
+        return df
+
+    # Newest first; logs are written once, so their key's write time is their timestamp
+    df, next_key = await load_page_async(
+        "audit_logs",
+        AuditLog,
+        limit=page["offset"] + page["limit"],
+        after=decode_cursor(page["cursor"], "audit_logs/"),
+        keep=matching,
+        newest_first=True,
+    )
+    df = df.iloc[page["offset"] :]
+    set_next_cursor(response, next_key)
+
+    return json_rows_response(df, AuditLog, response)
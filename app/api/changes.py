@@ -0,0 +1,74 @@
+import io
+import pyarrow.parquet as pq
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from app.models.schemas.account import AccountOut
+from app.models.schemas.debt import DebtOut
+from app.models.schemas.entry import EntryOut
+from app.models.schemas.household import HouseholdOut
+from app.models.schemas.membership import UserAccountOut, UserHouseholdOut
+from app.models.schemas.user import UserOut
+from app.services.auth import get_current_user
+from app.services.commitlog import COMMITS_PREFIX, changes_since
+from app.services.objectstore import get_existing
+from app.services.utils import decode_cursor, encode_cursor
+
+router = APIRouter()
+
+# Record types whose versions the feed includes, serialized as the API returns them. Other types
+# (tokens, password history, audit logs) are reported with ``record: None``.
+FEED_SCHEMAS: dict[str, type[BaseModel]] = {
+    "users": UserOut,
+    "households": HouseholdOut,
+    "accounts": AccountOut,
+    "user_households": UserHouseholdOut,
+    "user_accounts": UserAccountOut,
+    "debts": DebtOut,
+    "entries": EntryOut,
+}
+
+
+@router.get("/")
+async def list_changes(
+    cursor: str | None = Query(
+        None, description="Opaque cursor from a previous response; omit to start at the beginning"
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of commits to return"),
+    record_type: str | None = Query(None, description="Only report changes to this record type"),
+    user=Depends(get_current_user),
+):
+    """Record versions committed after ``cursor``, in commit order.
+
+    Upserts carry ``record: None`` when their type is not exported or their file has since been purged.
+    """
+    if not user.get("is_superuser", False):
+        raise HTTPException(status_code=403, detail="Not authorized to read the change feed")
+
+    commits, next_key = await changes_since(decode_cursor(cursor, COMMITS_PREFIX), limit)
+
+    changes = []
+    for _, manifest in commits:
+        for action in manifest["actions"]:
+            # Deleted files of superseded versions are not a change of any record
+            if action["op"] == "forget" or (record_type and action["record_type"] != record_type):
+                continue
+            changes.append(
+                {
+                    "commit": manifest["txn"],
+                    "committed_at": manifest["committed_at"],
+                    "op": "upsert" if action["op"] == "add" else "supersede",
+                    "record_type": action["record_type"],
+                    "record_id": action["record_id"],
+                    "key": action["key"],
+                    "record": None,
+                }
+            )
+
+    # Attach the written version to every upsert of an exported type
+    upserts = [c for c in changes if c["op"] == "upsert" and c["record_type"] in FEED_SCHEMAS]
+    for change, body in zip(upserts, await get_existing([c["key"] for c in upserts])):
+        if body is not None:
+            row = pq.read_table(io.BytesIO(body)).to_pylist()[0]
+            change["record"] = FEED_SCHEMAS[change["record_type"]].model_validate(row).model_dump(mode="json")
+
+    return {"changes": changes, "next_cursor": encode_cursor(next_key)}
@@ -1,35 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
 from datetime import datetime, timezone
 from uuid import uuid4, UUID
-import pandas as pd
+from typing import TYPE_CHECKING
+from app.lazy import lazy_module
 from app.models.schemas.debt import Debt, DebtCreate, DebtOut
 from app.models.schemas.entry import Entry
 from app.models.schemas.account import Account
 from app.models.schemas.household import Household
 from app.services.storage import (
-    save_version,
-    resolve_id_by_name,
-    load_versions,
-    soft_delete_record,
-    log_action,
-    mark_old_version_as_stale,
+    save_version_async,
+    resolve_id_by_name_async,
+    load_versions_async,
+    soft_delete_record_async,
+    log_action_async,
+    mark_old_version_as_stale_async,
+    supersede_records_async,
     generate_debt_entries,
+    load_page_async,
+    next_version,
 )
 from app.services.auth import get_current_user
-from app.services.roles import validate_entry_permissions
-from app.services.utils import page_params
+from app.services.commitlog import transaction
+from app.services.etags import check_if_match, conditional_get, etag
+from app.services.serialization import json_rows_response
+from app.services.roles import filter_entry_permissions, validate_entry_permissions
+from app.services.utils import as_of_param, decode_cursor, page_params, set_next_cursor
 from app.services.fetchers import fetch_record
 
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
 router = APIRouter()
 
 
 @router.post("/")
-def create_debt(payload: DebtCreate, user=Depends(get_current_user)):
-    account_id = resolve_id_by_name("accounts", payload.account_name, Account, "name", "account_id")
-    household_id = resolve_id_by_name("households", payload.household_name, Household, "name", "household_id")
+async def create_debt(payload: DebtCreate, user=Depends(get_current_user)):
+    account_id = await resolve_id_by_name_async("accounts", payload.account_name, Account, "name", "account_id")
+    household_id = await resolve_id_by_name_async(
+        "households", payload.household_name, Household, "name", "household_id"
+    )
 
     now = datetime.now(timezone.utc)
-    validate_entry_permissions(user["user_id"], account_id, household_id, user)
+    await validate_entry_permissions(user["user_id"], account_id, household_id, user)
 
     # --- Build and save debt ---
     debt_id = uuid4()
@@ -49,14 +63,16 @@ def create_debt(payload: DebtCreate, user=Depends(get_current_user)):
         is_current=True,
         is_deleted=False,
     )
-    save_version(debt, "debts", "debt_id")
-    log_action(user["user_id"], "create", "debts", str(debt.debt_id), payload.model_dump())
+    # The debt and its installments are committed together
+    async with transaction():
+        await save_version_async(debt, "debts", "debt_id")
+        await log_action_async(user["user_id"], "create", "debts", str(debt.debt_id), payload.model_dump())
 
-    # --- Generate installments ---
-    entries = generate_debt_entries(debt)
-    for e in entries:
-        save_version(e, "entries", "entry_id")
-        log_action(user["user_id"], "create", "entries", str(e.entry_id), e.model_dump())
+        # --- Generate installments ---
+        entries = generate_debt_entries(debt)
+        for e in entries:
+            await save_version_async(e, "entries", "entry_id")
+            await log_action_async(user["user_id"], "create", "entries", str(e.entry_id), e.model_dump())
 
     return {
         "message": "Debt created",
@@ -67,55 +83,80 @@ def create_debt(payload: DebtCreate, user=Depends(get_current_user)):
 
 
 @router.put("/{debt_id}")
-def update_debt(debt_id: UUID, payload: dict, user=Depends(get_current_user)):
-    debts = load_versions("debts", Debt, record_id=debt_id)
+async def update_debt(
+    debt_id: UUID,
+    payload: dict,
+    response: Response,
+    if_match: str | None = Header(None),
+    user=Depends(get_current_user),
+):
+    debts = await load_versions_async("debts", Debt, record_id=debt_id)
     match = debts[(debts["is_current"]) & (~debts["is_deleted"].fillna(False))]
 
     if match.empty:
         raise HTTPException(status_code=404, detail="Debt not found")
 
     row = match.iloc[0].to_dict()
-    mark_old_version_as_stale("debts", debt_id, "debt_id")
-
-    updated = Debt(
-        **{**row, **payload},
-        debt_id=debt_id,
-        updated_at=datetime.now(timezone.utc),
-        is_current=True,
-        is_deleted=False,
-    )
-    save_version(updated, "debts", "debt_id")
-    log_action(user["user_id"], "update", "debts", str(debt_id), payload)
-
-    # Load existing debt entries
-    entries = load_versions("entries", Entry)
-    debt_entries = entries[
-        (entries["debt_id"] == debt_id) & (entries["is_current"]) & (~entries["is_deleted"].fillna(False))
-    ]
-
-    today = datetime.now(timezone.utc).date()
-
-    for _, e in debt_entries.iterrows():
-        entry_date = pd.to_datetime(e["entry_date"]).date()
-
-        if entry_date < today:
-            # Past entries: only update description if debt name changed
-            if "name" in payload and payload["name"] != row["name"]:
-                mark_old_version_as_stale("entries", e["entry_id"], "entry_id")
-                e_dict = e.to_dict()
-                e_dict["description"] = e_dict["description"].replace(row["name"], payload["name"])
-                e_dict.update({"is_current": True, "is_deleted": False, "updated_at": datetime.now(timezone.utc)})
-                save_version(Entry(**e_dict), "entries", "entry_id")
-        else:
-            # Future entries: recalc with new debt terms
-            mark_old_version_as_stale("entries", e["entry_id"], "entry_id")
-
-    # --- Generate installments ---
-    entries = generate_debt_entries(updated, start_date=today)
-    for e in entries:
-        save_version(e, "entries", "entry_id")
-        log_action(user["user_id"], "update", "entries", str(e.entry_id), e.model_dump())
-
+    check_if_match(if_match, row["version"])
+    # The debt and its regenerated installments are committed together
+    async with transaction():
+        await mark_old_version_as_stale_async("debts", debt_id, "debt_id")
+
+        updated = Debt(
+            **{
+                **row,
+                **payload,
+                "debt_id": debt_id,
+                "updated_at": datetime.now(timezone.utc),
+                "is_current": True,
+                "is_deleted": False,
+                "version": next_version(row),
+            }
+        )
+        await save_version_async(updated, "debts", "debt_id")
+        await log_action_async(user["user_id"], "update", "debts", str(debt_id), payload)
+
+        # Load existing debt entries
+        entries = await load_versions_async("entries", Entry)
+        debt_entries = entries[
+            (entries["debt_id"] == str(debt_id)) & (entries["is_current"]) & (~entries["is_deleted"].fillna(False))
+        ]
+
+        today = datetime.now(timezone.utc).date()
+        renamed = "name" in payload and payload["name"] != row["name"]
+
+        # Every replaced installment is superseded in one pass below, not one listing each
+        superseded = []
+        for _, e in debt_entries.iterrows():
+            entry_date = pd.to_datetime(e["entry_date"]).date()
+
+            if entry_date < today:
+                # Past entries: only update description if debt name changed
+                if renamed:
+                    superseded.append(e["entry_id"])
+                    e_dict = e.to_dict()
+                    e_dict["description"] = e_dict["description"].replace(row["name"], payload["name"])
+                    e_dict.update(
+                        {
+                            "is_current": True,
+                            "is_deleted": False,
+                            "updated_at": datetime.now(timezone.utc),
+                            "version": next_version(e_dict),
+                        }
+                    )
+                    await save_version_async(Entry(**e_dict), "entries", "entry_id")
+            else:
+                # Future entries: recalc with new debt terms
+                superseded.append(e["entry_id"])
+        await supersede_records_async("entries", "entry_id", superseded)
+
+        # --- Generate installments ---
+        entries = generate_debt_entries(updated, start_date=today)
+        for e in entries:
+            await save_version_async(e, "entries", "entry_id")
+            await log_action_async(user["user_id"], "update", "entries", str(e.entry_id), e.model_dump())
+
+    response.headers["ETag"] = etag(updated.version)
     return {
         "message": "Debt update",
         "debt_id": str(updated.debt_id),
@@ -125,67 +166,65 @@ def update_debt(debt_id: UUID, payload: dict, user=Depends(get_current_user)):
 
 
 @router.delete("/{debt_id}")
-def delete_debt(debt_id: UUID, user=Depends(get_current_user)):
+async def delete_debt(debt_id: UUID, user=Depends(get_current_user)):
     # Cascade to child entries handled inside storage
-    df = load_versions("debts", Debt, record_id=debt_id)
+    df = await load_versions_async("debts", Debt, record_id=debt_id)
     current = df[(df["is_current"]) & (~df["is_deleted"].fillna(False))]
     if current.empty:
         raise HTTPException(status_code=404, detail="Debt not found")
 
     row = current.iloc[0].to_dict()
-    validate_entry_permissions(row["user_id"], row["account_id"], row["household_id"], user)
+    await validate_entry_permissions(row["user_id"], row["account_id"], row["household_id"], user)
 
-    return soft_delete_record("debts", debt_id, "debt_id", Debt, user=user, owner_field="user_id", require_owner=True)
+    return await soft_delete_record_async(
+        "debts", debt_id, "debt_id", Debt, user=user, owner_field="user_id", require_owner=True
+    )
 
 
 @router.get("/", response_model=list[DebtOut])
-def list_debts(user=Depends(get_current_user), page=Depends(page_params)):
-    df = load_versions("debts", Debt)
-    if df.empty:
-        return []
-
-    df = df[(df["is_current"]) & (~df.get("is_deleted", False).fillna(False))]
-
-    # Validate each debt against entry permissions
-    allowed = []
-    for _, row in df.iterrows():
-        try:
-            validate_entry_permissions(
-                user_id=row["user_id"],
-                account_id=row["account_id"],
-                household_id=row["household_id"],
-                acting_user=user,
-            )
-            allowed.append(row)
-        except HTTPException:
-            continue
-
-    # Build new dataframe from allowed rows
-    if not allowed:
-        return []
-    df = pd.DataFrame(allowed)
-    df = df.iloc[page["offset"] : page["offset"] + page["limit"]]
-
-    log_action(user["user_id"], "list", "debts", None, {"count": len(df)})
-    return df.to_dict(orient="records")
+async def list_debts(
+    request: Request,
+    response: Response,
+    user=Depends(get_current_user),
+    page=Depends(page_params),
+    as_of=Depends(as_of_param),
+):
+    not_modified = await conditional_get(request, response, user, [f"user_id={user['user_id']}"])
+    if not_modified is not None:
+        return not_modified
+
+    df, next_key = await load_page_async(
+        "debts",
+        Debt,
+        limit=page["offset"] + page["limit"],
+        after=decode_cursor(page["cursor"], "debts/"),
+        keep=lambda rows: filter_entry_permissions(rows, user),
+        as_of=as_of,
+    )
+    df = df.iloc[page["offset"] :]
+    set_next_cursor(response, next_key)
+
+    await log_action_async(user["user_id"], "list", "debts", None, {"count": len(df)})
+    return json_rows_response(df, DebtOut, response)
 
 
 @router.get("/{debt_id}", response_model=DebtOut)
-def get_debt(debt_id: UUID, user=Depends(get_current_user)):
-    row = fetch_record(
+async def get_debt(debt_id: UUID, response: Response, user=Depends(get_current_user)):
+    row = await fetch_record(
         "debts",
         Debt,
         debt_id,
         permission_check=lambda r: validate_entry_permissions(r["user_id"], r["account_id"], r["household_id"], user),
         history=False,
     )
-    log_action(user["user_id"], "get", "debts", str(debt_id))
+    await log_action_async(user["user_id"], "get", "debts", str(debt_id))
+    response.headers["ETag"] = etag(row["version"])
     return row
 
 
 @router.get("/{debt_id}/history", response_model=list[DebtOut])
-def get_debt_history(debt_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
-    versions = fetch_record(
+async def get_debt_history(debt_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
+    versions = await fetch_record(
         "debts",
         Debt,
         debt_id,
@@ -194,7 +233,7 @@ def get_debt_history(debt_id: UUID, user=Depends(get_current_user), page=Depends
         page=page,
         sort_by="updated_at",
     )
-    log_action(
+    await log_action_async(
         user["user_id"], "get_history", "debts", str(debt_id), {"offset": page["offset"], "limit": page["limit"]}
     )
     return versions
@@ -1,35 +1,51 @@
 from app.services.storage import (
-    save_version,
-    load_versions,
-    mark_old_version_as_stale,
-    resolve_id_by_name,
-    soft_delete_record,
-    log_action,
+    save_version_async,
+    load_versions_async,
+    mark_old_version_as_stale_async,
+    resolve_id_by_name_async,
+    soft_delete_record_async,
+    log_action_async,
+    load_page_async,
+    next_version,
+    stream_records_async,
 )
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from app.models.schemas.entry import EntryCreate, Entry, EntryUpdate, EntryOut
 from app.models.schemas.account import Account
 from app.models.schemas.household import Household
 from uuid import uuid4, UUID
-import pandas as pd
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from typing import TYPE_CHECKING
+from app.lazy import lazy_module
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 import io
 from app.services.auth import get_current_user
-from app.services.roles import validate_entry_permissions
-from app.services.utils import page_params
-from app.models.enums import EntryType, Category
+from app.services.commitlog import transaction
+from app.services.etags import check_if_match, conditional_get, etag
+from app.services.export import ExportFormat, columnar_response, export_schema, to_arrow
+from app.services.serialization import json_rows_response
+from app.services.roles import filter_entry_permissions, require_household_role, validate_entry_permissions
+from app.services.utils import as_of_param, decode_cursor, ndjson_response, page_params, set_next_cursor
+from app.models.enums import EntryType, Category, Role
 from app.services.fetchers import fetch_record
 
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
 
 router = APIRouter()
 
 
 @router.post("/")
-def create_entry(payload: EntryCreate, user=Depends(get_current_user)):
-    account_id = resolve_id_by_name("accounts", payload.account_name, Account, "name", "account_id")
-    household_id = resolve_id_by_name("households", payload.household_name, Household, "name", "household_id")
+async def create_entry(payload: EntryCreate, user=Depends(get_current_user)):
+    account_id = await resolve_id_by_name_async("accounts", payload.account_name, Account, "name", "account_id")
+    household_id = await resolve_id_by_name_async(
+        "households", payload.household_name, Household, "name", "household_id"
+    )
 
-    validate_entry_permissions(payload.user_id, account_id, household_id, acting_user=user)
+    await validate_entry_permissions(payload.user_id, account_id, household_id, acting_user=user)
 
     entry = Entry(
         entry_id=uuid4(),
@@ -47,14 +63,14 @@ def create_entry(payload: EntryCreate, user=Depends(get_current_user)):
         is_current=True,
     )
 
-    save_version(entry, "entries", "entry_id")
-    log_action(user["user_id"], "create", "entries", str(entry.entry_id), payload.model_dump())
+    await save_version_async(entry, "entries", "entry_id")
+    await log_action_async(user["user_id"], "create", "entries", str(entry.entry_id), payload.model_dump())
 
     return {"message": "Entry created", "entry_id": str(entry.entry_id)}
 
 
 @router.post("/import")
-def import_entries_upload(
+async def import_entries_upload(
     file: UploadFile = File(...),
     user=Depends(get_current_user),
 ):
@@ -73,7 +89,7 @@ def import_entries_upload(
     Optional:
       - description
     """
-    raw = file.file.read()
+    raw = await file.read()
     name = (file.filename or "").lower()
 
     # Load dataframe based on extension
@@ -122,10 +138,10 @@ def import_entries_upload(
         hname_to_id = {}
         aname_to_id = {}
         for hname in df["household_name"].dropna().unique():
-            hid = resolve_id_by_name("households", hname, Household, "name", "household_id")
+            hid = await resolve_id_by_name_async("households", hname, Household, "name", "household_id")
             hname_to_id[hname] = hid
         for aname in df["account_name"].dropna().unique():
-            aid = resolve_id_by_name("accounts", aname, Account, "name", "account_id")
+            aid = await resolve_id_by_name_async("accounts", aname, Account, "name", "account_id")
             aname_to_id[aname] = aid
 
         df["household_id"] = df["household_name"].map(hname_to_id)
@@ -146,7 +162,7 @@ def import_entries_upload(
             household_id = row["household_id"]
 
             # enforce permissions (also checks membership + assignment)
-            validate_entry_permissions(
+            await validate_entry_permissions(
                 user_id=acting_user_id,
                 account_id=account_id,
                 household_id=household_id,
@@ -168,7 +184,7 @@ def import_entries_upload(
                 is_current=True,
                 is_deleted=False,
             )
-            save_version(entry, "entries", "entry_id")
+            await save_version_async(entry, "entries", "entry_id")
             imported_ids.append(str(entry.entry_id))
         except HTTPException:
             # bubble API exceptions
@@ -177,24 +193,33 @@ def import_entries_upload(
             skipped += 1
             continue
 
-    log_action(user["user_id"], "import", "entries", None, {"imported": len(imported_ids), "skipped": skipped})
+    await log_action_async(
+        user["user_id"], "import", "entries", None, {"imported": len(imported_ids), "skipped": skipped}
+    )
     return {"imported": len(imported_ids), "skipped": skipped, "entry_ids": imported_ids}
 
 
 @router.put("/{entry_id}")
-def update_entry(entry_id: UUID, payload: EntryUpdate, user=Depends(get_current_user)):
-    account_id = resolve_id_by_name("accounts", payload.account_name, Account, "name", "account_id")
-    household_id = resolve_id_by_name("households", payload.household_name, Household, "name", "household_id")
+async def update_entry(
+    entry_id: UUID,
+    payload: EntryUpdate,
+    response: Response,
+    if_match: str | None = Header(None),
+    user=Depends(get_current_user),
+):
+    account_id = await resolve_id_by_name_async("accounts", payload.account_name, Account, "name", "account_id")
+    household_id = await resolve_id_by_name_async(
+        "households", payload.household_name, Household, "name", "household_id"
+    )
 
-    df = load_versions("entries", Entry, record_id=entry_id)
+    df = await load_versions_async("entries", Entry, record_id=entry_id)
     current = df[(df["is_current"]) & (~df["is_deleted"].fillna(False))]
     if current.empty:
         raise HTTPException(status_code=404, detail="Entry not found")
 
-    validate_entry_permissions(payload.user_id, account_id, household_id, user)
-
-    # Stale old version
-    mark_old_version_as_stale("entries", entry_id, "entry_id")
+    row = current.iloc[0].to_dict()
+    check_if_match(if_match, row["version"])
+    await validate_entry_permissions(payload.user_id, account_id, household_id, user)
 
     updated = Entry(
         entry_id=entry_id,
@@ -210,77 +235,109 @@ def update_entry(entry_id: UUID, payload: EntryUpdate, user=Depends(get_current_
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc),
         is_current=True,
+        version=next_version(row),
     )
 
-    save_version(updated, "entries", "entry_id")
-    log_action(user["user_id"], "update", "entries", str(entry_id), payload.model_dump())
+    # Supersede the old version and write the new one atomically
+    async with transaction():
+        await mark_old_version_as_stale_async("entries", entry_id, "entry_id")
+        await save_version_async(updated, "entries", "entry_id")
+        await log_action_async(user["user_id"], "update", "entries", str(entry_id), payload.model_dump())
 
+    response.headers["ETag"] = etag(updated.version)
     return {"message": "Entry updated", "entry_id": str(entry_id)}
 
 
 @router.delete("/{entry_id}")
-def delete_entry(entry_id: UUID, user=Depends(get_current_user)):
-    df = load_versions("entries", Entry, record_id=entry_id)
+async def delete_entry(entry_id: UUID, user=Depends(get_current_user)):
+    df = await load_versions_async("entries", Entry, record_id=entry_id)
     current = df[(df["is_current"]) & (~df["is_deleted"].fillna(False))]
     if current.empty:
         raise HTTPException(status_code=404, detail="Entry not found")
 
     row = current.iloc[0].to_dict()
-    validate_entry_permissions(row["user_id"], row["account_id"], row["household_id"], user)
+    await validate_entry_permissions(row["user_id"], row["account_id"], row["household_id"], user)
 
-    return soft_delete_record("entries", entry_id, "entry_id", Entry, user=user, require_owner=False)
+    return await soft_delete_record_async("entries", entry_id, "entry_id", Entry, user=user, require_owner=False)
 
 
 @router.get("/", response_model=list[EntryOut])
-def list_current_entries(user=Depends(get_current_user), page=Depends(page_params)):
-    df = load_versions("entries", Entry)
-    if df.empty:
-        return []
+async def list_current_entries(
+    request: Request,
+    response: Response,
+    user=Depends(get_current_user),
+    page=Depends(page_params),
+    as_of=Depends(as_of_param),
+):
+    not_modified = await conditional_get(request, response, user, [f"user_id={user['user_id']}"])
+    if not_modified is not None:
+        return not_modified
 
-    # Filter current and active
-    df = df[(df["is_current"]) & (~df.get("is_deleted", False).fillna(False))]
+    df, next_key = await load_page_async(
+        "entries",
+        Entry,
+        limit=page["offset"] + page["limit"],
+        after=decode_cursor(page["cursor"], "entries/"),
+        keep=lambda rows: filter_entry_permissions(rows, user),
+        as_of=as_of,
+    )
+    df = df.iloc[page["offset"] :]
+    set_next_cursor(response, next_key)
 
-    # Validate each debt against entry permissions
-    allowed = []
-    for _, row in df.iterrows():
-        try:
-            validate_entry_permissions(
-                user_id=row["user_id"],
-                account_id=row["account_id"],
-                household_id=row["household_id"],
-                acting_user=user,
-            )
-            allowed.append(row)
-        except HTTPException:
-            continue
+    await log_action_async(user["user_id"], "list", "entries", None, {"count": len(df)})
+
+    return json_rows_response(df, EntryOut, response)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_entries(
+    format: ExportFormat = Query("ndjson", description="ndjson (one EntryOut per line), parquet or arrow (IPC stream)"),
+    start: date | None = Query(None, description="First entry_date to include"),
+    end: date | None = Query(None, description="Last entry_date to include"),
+    household_id: UUID | None = Query(None, description="Restrict to a specific household"),
+    as_of=Depends(as_of_param),
+    user=Depends(get_current_user),
+):
+    """Every entry the user can see, streamed batch by batch while storage is read."""
+    if household_id:
+        await require_household_role(user, household_id, required_role=Role.member)
 
-    # Build new dataframe from allowed rows
-    if not allowed:
-        return []
-    df = pd.DataFrame(allowed)
-    df = df.iloc[page["offset"] : page["offset"] + page["limit"]]
+    async def wanted(rows):
+        if household_id:
+            rows = rows[rows["household_id"] == str(household_id)]
+        if start:
+            rows = rows[rows["entry_date"] >= start]
+        if end:
+            rows = rows[rows["entry_date"] <= end]
+        return await filter_entry_permissions(rows, user)
 
-    log_action(user["user_id"], "list", "entries", None, {"count": len(df)})
+    await log_action_async(user["user_id"], "export", "entries", None, {"format": format})
+    batches = stream_records_async("entries", Entry, keep=wanted, as_of=as_of)
+    if format == "ndjson":
+        return ndjson_response(batches, EntryOut)
 
-    return df.to_dict(orient="records")
+    # Columnar formats are written straight from the Arrow tables: no per-row validation or JSON
+    schema = export_schema(Entry, list(EntryOut.model_fields))
+    return columnar_response((to_arrow(df, schema) async for df in batches), schema, format, "entries")
 
 
 @router.get("/{entry_id}", response_model=EntryOut)
-def get_entry(entry_id: UUID, user=Depends(get_current_user)):
-    row = fetch_record(
+async def get_entry(entry_id: UUID, response: Response, user=Depends(get_current_user)):
+    row = await fetch_record(
         "entries",
         Entry,
         entry_id,
         permission_check=lambda r: validate_entry_permissions(r["user_id"], r["account_id"], r["household_id"], user),
         history=False,
     )
-    log_action(user["user_id"], "get", "entries", str(entry_id))
+    await log_action_async(user["user_id"], "get", "entries", str(entry_id))
+    response.headers["ETag"] = etag(row["version"])
     return row
 
 
 @router.get("/{entry_id}/history", response_model=list[EntryOut])
-def get_entry_history(entry_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
-    versions = fetch_record(
+async def get_entry_history(entry_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
+    versions = await fetch_record(
         "entries",
         Entry,
         entry_id,
@@ -289,7 +346,7 @@ def get_entry_history(entry_id: UUID, user=Depends(get_current_user), page=Depen
         page=page,
         sort_by="updated_at",
     )
-    log_action(
+    await log_action_async(
         user["user_id"], "get_history", "entries", str(entry_id), {"offset": page["offset"], "limit": page["limit"]}
     )
     return versions
@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response
 from uuid import UUID, uuid4
 from datetime import datetime, timezone
 from app.models.schemas.household import Household, HouseholdCreate, HouseholdOut
 from app.models.schemas.membership import UserHousehold, UserHouseholdOut
-from app.services.storage import save_version, mark_old_version_as_stale, load_versions, soft_delete_record, log_action
+from app.services.storage import (
+    save_version_async,
+    mark_old_version_as_stale_async,
+    load_page_async,
+    load_versions_async,
+    soft_delete_record_async,
+    log_action_async,
+    next_version,
+)
 from app.services.auth import get_current_user
+from app.services.commitlog import transaction
+from app.services.etags import check_if_match, conditional_get, etag
+from app.services.serialization import json_rows_response
 from app.services.roles import require_household_role
-from app.services.utils import page_params
+from app.services.utils import as_of_param, decode_cursor, page_params, set_next_cursor
 from app.services.fetchers import fetch_record
 from app.models.enums import Role
 
@@ -14,9 +25,9 @@ router = APIRouter()
 
 
 @router.post("/")
-def create_household(payload: HouseholdCreate, user=Depends(get_current_user)):
+async def create_household(payload: HouseholdCreate, user=Depends(get_current_user)):
     # Enforce one household per creator
-    hh = load_versions("households", Household)
+    hh = await load_versions_async("households", Household)
     existing = hh[
         (hh.get("created_by_user_id") == str(user["user_id"]))
         & (hh["is_current"])
@@ -35,8 +46,8 @@ def create_household(payload: HouseholdCreate, user=Depends(get_current_user)):
         is_current=True,
         is_deleted=False,
     )
-    save_version(household, "households", "household_id")
-    log_action(user["user_id"], "create", "households", str(household.household_id), payload.model_dump())
+    await save_version_async(household, "households", "household_id")
+    await log_action_async(user["user_id"], "create", "households", str(household.household_id), payload.model_dump())
 
     # Automatically assign the creator as a member
     mapping = UserHousehold(
@@ -45,8 +56,8 @@ def create_household(payload: HouseholdCreate, user=Depends(get_current_user)):
         household_id=household.household_id,
         role=Role("admin"),
     )
-    save_version(mapping, "user_households", "mapping_id")
-    log_action(
+    await save_version_async(mapping, "user_households", "mapping_id")
+    await log_action_async(
         user["user_id"], "assign_user", "households", str(household.household_id), {"user_id": str(user["user_id"])}
     )
 
@@ -54,21 +65,30 @@ def create_household(payload: HouseholdCreate, user=Depends(get_current_user)):
 
 
 @router.post("/assign-user-to-household")
-def assign_user_to_household(user_id: UUID, household_id: UUID, user=Depends(get_current_user)):
-    require_household_role(user, household_id, required_role=Role.admin)
+async def assign_user_to_household(user_id: UUID, household_id: UUID, user=Depends(get_current_user)):
+    await require_household_role(user, household_id, required_role=Role.admin)
     mapping = UserHousehold(user_id=user_id, household_id=household_id)
-    save_version(mapping, "user_households", "mapping_id")
-    log_action(user["user_id"], "assign_user", "households", str(household_id), {"user_id": str(user_id)})
+    await save_version_async(mapping, "user_households", "mapping_id")
+    await log_action_async(user["user_id"], "assign_user", "households", str(household_id), {"user_id": str(user_id)})
 
     return {"message": "User assigned to household"}
 
 
 @router.put("/{household_id}")
-def update_household(household_id: UUID, name: str, user=Depends(get_current_user)):
-    require_household_role(user, household_id, required_role=Role.admin)
-    mark_old_version_as_stale("households", household_id, "household_id")
-    households = load_versions("households", Household)
-    current = households[households["household_id"] == str(household_id)].iloc[-1].to_dict()
+async def update_household(
+    household_id: UUID,
+    name: str,
+    response: Response,
+    if_match: str | None = Header(None),
+    user=Depends(get_current_user),
+):
+    await require_household_role(user, household_id, required_role=Role.admin)
+    households = await load_versions_async("households", Household, record_id=household_id)
+    match = households[(households["is_current"]) & (~households["is_deleted"].fillna(False))]
+    if match.empty:
+        raise HTTPException(status_code=404, detail="Household not found")
+    current = match.iloc[0].to_dict()
+    check_if_match(if_match, current["version"])
 
     updated = Household(
         household_id=household_id,
@@ -78,29 +98,40 @@ def update_household(household_id: UUID, name: str, user=Depends(get_current_use
         updated_at=datetime.now(timezone.utc),
         is_current=True,
         is_deleted=False,
+        version=next_version(current),
     )
-    save_version(updated, "households", "household_id")
-    log_action(user["user_id"], "update", "households", str(household_id), {"name": name})
+    async with transaction():
+        await mark_old_version_as_stale_async("households", household_id, "household_id")
+        await save_version_async(updated, "households", "household_id")
+        await log_action_async(user["user_id"], "update", "households", str(household_id), {"name": name})
 
+    response.headers["ETag"] = etag(updated.version)
     return {"message": "Household updated", "household_id": str(household_id)}
 
 
 @router.delete("/{household_id}")
-def delete_household(household_id: UUID, user=Depends(get_current_user)):
-    require_household_role(user, household_id, required_role=Role.admin)
+async def delete_household(household_id: UUID, user=Depends(get_current_user)):
+    await require_household_role(user, household_id, required_role=Role.admin)
 
-    return soft_delete_record(
+    return await soft_delete_record_async(
         "households", household_id, "household_id", Household, user=user, owner_field="user_id", require_owner=True
     )
 
 
 @router.get("/", response_model=list[HouseholdOut])
-def list_households(user=Depends(get_current_user), page=Depends(page_params)):
-    households = load_versions("households", Household)
-    current = households[(households["is_current"]) & (~households["is_deleted"].fillna(False))]
-
-    # Only return households where user is a member
-    memberships = load_versions("user_households", UserHousehold)
+async def list_households(
+    request: Request,
+    response: Response,
+    user=Depends(get_current_user),
+    page=Depends(page_params),
+    as_of=Depends(as_of_param),
+):
+    not_modified = await conditional_get(request, response, user, [f"user_id={user['user_id']}", "households"])
+    if not_modified is not None:
+        return not_modified
+
+    # Only return households where user is a member now
+    memberships = await load_versions_async("user_households", UserHousehold)
     memberships = memberships[
         (memberships["user_id"] == str(user["user_id"]))
         & (memberships["is_current"])
@@ -108,15 +139,26 @@ def list_households(user=Depends(get_current_user), page=Depends(page_params)):
     ]
     allowed_ids = set(memberships["household_id"])
 
-    current = current[current["household_id"].isin(allowed_ids)]
-    current = current.iloc[page["offset"] : page["offset"] + page["limit"]]
-    log_action(user["user_id"], "list", "households", None, {"count": len(current)})
-    return current.to_dict(orient="records")
+    async def member_of(rows):
+        return rows[rows["household_id"].isin(allowed_ids)]
+
+    current, next_key = await load_page_async(
+        "households",
+        Household,
+        limit=page["offset"] + page["limit"],
+        after=decode_cursor(page["cursor"], "households/"),
+        keep=member_of,
+        as_of=as_of,
+    )
+    current = current.iloc[page["offset"] :]
+    set_next_cursor(response, next_key)
+    await log_action_async(user["user_id"], "list", "households", None, {"count": len(current)})
+    return json_rows_response(current, HouseholdOut, response)
 
 
 @router.get("/memberships", response_model=list[UserHouseholdOut])
-def list_household_memberships(user=Depends(get_current_user), page=Depends(page_params)):
-    df = load_versions("user_households", UserHousehold)
+async def list_household_memberships(user=Depends(get_current_user), page=Depends(page_params)):
+    df = await load_versions_async("user_households", UserHousehold)
 
     if df.empty:
         return []
@@ -124,26 +166,27 @@ def list_household_memberships(user=Depends(get_current_user), page=Depends(page
     # Filter only current user + active memberships
     df = df[(df["user_id"] == str(user["user_id"])) & (df["is_current"]) & (~df.get("is_deleted", False).fillna(False))]
     df = df.iloc[page["offset"] : page["offset"] + page["limit"]]
-    log_action(user["user_id"], "list", "household_memberships", None, {"count": len(df)})
+    await log_action_async(user["user_id"], "list", "household_memberships", None, {"count": len(df)})
     return df.to_dict(orient="records")
 
 
 @router.get("/{household_id}", response_model=HouseholdOut)
-def get_account(household_id: UUID, user=Depends(get_current_user)):
-    row = fetch_record(
+async def get_account(household_id: UUID, response: Response, user=Depends(get_current_user)):
+    row = await fetch_record(
         "households",
         Household,
         household_id,
         permission_check=lambda r: require_household_role(user, r["household_id"], required_role=Role.member),
         history=False,
     )
-    log_action(user["user_id"], "get", "households", str(household_id))
+    await log_action_async(user["user_id"], "get", "households", str(household_id))
+    response.headers["ETag"] = etag(row["version"])
     return row
 
 
 @router.get("/{household_id}/history", response_model=list[HouseholdOut])
-def get_account_history(household_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
-    versions = fetch_record(
+async def get_account_history(household_id: UUID, user=Depends(get_current_user), page=Depends(page_params)):
+    versions = await fetch_record(
         "households",
         Household,
         household_id,
@@ -152,7 +195,7 @@ def get_account_history(household_id: UUID, user=Depends(get_current_user), page
         page=page,
         sort_by="updated_at",
     )
-    log_action(
+    await log_action_async(
         user["user_id"],
         "get_history",
         "households",
@@ -163,20 +206,20 @@ def get_account_history(household_id: UUID, user=Depends(get_current_user), page
 
 
 @router.post("/{household_id}/members")
-def add_member(household_id: UUID, target_user_id: UUID, role: str = "member", user=Depends(get_current_user)):
-    require_household_role(user, household_id, required_role=Role.admin)
+async def add_member(household_id: UUID, target_user_id: UUID, role: str = "member", user=Depends(get_current_user)):
+    await require_household_role(user, household_id, required_role=Role.admin)
     mapping = UserHousehold(user_id=target_user_id, household_id=household_id, role=Role(role))
-    save_version(mapping, "user_households", "mapping_id")
-    log_action(
+    await save_version_async(mapping, "user_households", "mapping_id")
+    await log_action_async(
         user["user_id"], "add_member", "households", str(household_id), {"user_id": str(target_user_id), "role": role}
     )
     return {"message": "Member added", "household_id": str(household_id), "user_id": str(target_user_id)}
 
 
 @router.delete("/{household_id}/members/{target_user_id}")
-def remove_member(household_id: UUID, target_user_id: UUID, user=Depends(get_current_user)):
-    require_household_role(user, household_id, required_role=Role.admin)
-    df = load_versions("user_households", UserHousehold)
+async def remove_member(household_id: UUID, target_user_id: UUID, user=Depends(get_current_user)):
+    await require_household_role(user, household_id, required_role=Role.admin)
+    df = await load_versions_async("user_households", UserHousehold)
     cur = df[
         (df["user_id"] == str(target_user_id))
         & (df["household_id"] == str(household_id))
@@ -186,10 +229,12 @@ def remove_member(household_id: UUID, target_user_id: UUID, user=Depends(get_cur
     if cur.empty:
         raise HTTPException(status_code=404, detail="Membership not found")
     row = cur.iloc[0]
-    mark_old_version_as_stale("user_households", row["mapping_id"], "mapping_id")
+    await mark_old_version_as_stale_async("user_households", row["mapping_id"], "mapping_id")
     # save a deleted version
     deleted = row.to_dict()
     deleted.update({"is_current": True, "is_deleted": True, "updated_at": datetime.now(timezone.utc)})
-    save_version(UserHousehold(**deleted), "user_households", "mapping_id")
-    log_action(user["user_id"], "remove_member", "households", str(household_id), {"user_id": str(target_user_id)})
+    await save_version_async(UserHousehold(**deleted), "user_households", "mapping_id")
+    await log_action_async(
+        user["user_id"], "remove_member", "households", str(household_id), {"user_id": str(target_user_id)}
+    )
     return {"message": "Member removed", "household_id": str(household_id), "user_id": str(target_user_id)}
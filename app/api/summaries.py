@@ -1,31 +1,82 @@
-from fastapi import APIRouter, Depends, Query
-import pandas as pd
+import asyncio
+from datetime import date
+from typing import TYPE_CHECKING, Literal
+from fastapi import APIRouter, Depends, Query, Request, Response
+from app.lazy import lazy_module
+import pyarrow as pa
 from uuid import UUID
-from app.services.storage import load_versions, resolve_name_by_id
+from app.services.etags import conditional_get
+from app.services.export import columnar_response, to_arrow
+from app.services.storage import (
+    load_versions_async,
+    resolve_name_by_id_async,
+    shared_read,
+    stream_records_async,
+)
 from app.services.auth import get_current_user
 from app.services.roles import require_household_role
+from app.services.utils import as_of_param
 from app.models.schemas.entry import Entry
 from app.models.schemas.account import Account
 from app.models.schemas.household import Household
 from app.models.enums import Role
 
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
 router = APIRouter()
 
+SUMMARY_KEYS = ["month", "household_id", "account_id", "type", "category"]
+SUMMARY_SCHEMA = pa.schema(
+    [(name, pa.string()) for name in SUMMARY_KEYS] + [("amount", pa.float64()), ("entries", pa.int64())]
+)
+
 
 @router.get("/summary")
-def get_entry_summary(
+async def get_entry_summary(
+    request: Request,
+    response: Response,
     month: str | None = Query(None, description="Month in YYYY-MM format"),
     start: str | None = Query(None, description="Start month YYYY-MM"),
     end: str | None = Query(None, description="End month YYYY-MM"),
     last_n_months: int | None = Query(None, description="Last N months to include"),
     type: str | None = Query(None, description="Optional filter: income or expense"),
     household_id: UUID | None = Query(None, description="Restrict to a specific household"),
+    as_of=Depends(as_of_param),
     user=Depends(get_current_user),
 ):
-    df = load_versions("entries", Entry)
+    # Authorize before answering 304: a matching ETag must not confirm a household to a non-member
+    if household_id:
+        await require_household_role(user, household_id, required_role=Role.member)
+
+    # The user's entries, plus the names of the accounts and households they are booked on
+    scopes = [f"user_id={user['user_id']}"]
+    scopes += [f"household_id={household_id}"] if household_id else ["accounts", "households"]
+    not_modified = await conditional_get(request, response, user, scopes)
+    if not_modified is not None:
+        return not_modified
+
+    # Shared by every worker until one of the scopes changes
+    params = (str(user["user_id"]), month, start, end, last_n_months, type, household_id, as_of)
+    return await shared_read("summaries", params, scopes, lambda: _summarize(*params))
+
+
+async def _summarize(
+    user_id: str,
+    month: str | None,
+    start: str | None,
+    end: str | None,
+    last_n_months: int | None,
+    type: str | None,
+    household_id: UUID | None,
+    as_of,
+) -> dict:
+    df = await load_versions_async("entries", Entry, as_of=as_of)
 
     # --- Base filter ---
-    df = df[(df["is_current"]) & (~df["is_deleted"].fillna(False)) & (df["user_id"] == str(user["user_id"]))]
+    df = df[(df["is_current"]) & (~df["is_deleted"].fillna(False)) & (df["user_id"] == user_id)]
     if df.empty:
         return {"message": "No entries available"}
 
@@ -35,7 +86,6 @@ def get_entry_summary(
 
     # --- Household filter ---
     if household_id:
-        require_household_role(user, household_id, required_role=Role.member)
         df = df[df["household_id"] == str(household_id)]
 
     # --- Date filtering ---
@@ -64,16 +114,20 @@ def get_entry_summary(
     df["month"] = df["entry_date"].dt.strftime("%Y-%m")
 
     # --- Resolve account & household names ---
-    df["account_name"] = df["account_id"].apply(
-        lambda x: resolve_name_by_id("accounts", x, Account, "account_id", "name")
+    account_ids = df["account_id"].unique().tolist()
+    household_ids = df["household_id"].unique().tolist()
+    account_names = await asyncio.gather(
+        *(resolve_name_by_id_async("accounts", x, Account, "account_id", "name", as_of) for x in account_ids)
     )
-    df["household_name"] = df["household_id"].apply(
-        lambda x: resolve_name_by_id("households", x, Household, "household_id", "name")
+    household_names = await asyncio.gather(
+        *(resolve_name_by_id_async("households", x, Household, "household_id", "name", as_of) for x in household_ids)
     )
+    df["account_name"] = df["account_id"].map(dict(zip(account_ids, account_names)))
+    df["household_name"] = df["household_id"].map(dict(zip(household_ids, household_names)))
 
     # --- Aggregate summaries ---
     total = float(df["amount"].sum())
-    by_category = df.groupby("category")["amount"].sum().to_dict()
+    by_category = df.groupby("category", observed=True)["amount"].sum().to_dict()
     by_account = df.groupby("account_name")["amount"].sum().to_dict()
     by_household = df.groupby("household_name")["amount"].sum().to_dict()
 
@@ -83,9 +137,13 @@ def get_entry_summary(
         df_tr = df.copy()
         df_tr["month"] = df_tr["entry_date"].dt.to_period("M").astype(str)
 
-        type_trends = df_tr.groupby(["month", "type"])["amount"].sum().reset_index().to_dict(orient="records")
+        type_trends = (
+            df_tr.groupby(["month", "type"], observed=True)["amount"].sum().reset_index().to_dict(orient="records")
+        )
 
-        category_trends = df_tr.groupby(["month", "category"])["amount"].sum().reset_index().to_dict(orient="records")
+        category_trends = (
+            df_tr.groupby(["month", "category"], observed=True)["amount"].sum().reset_index().to_dict(orient="records")
+        )
 
     return {
         "total": round(total, 2),
@@ -95,3 +153,43 @@ def get_entry_summary(
         "type_trends": type_trends,
         "category_trends": category_trends,
     }
+
+
+@router.get("/export")
+async def export_summary(
+    format: Literal["parquet", "arrow"] = Query("parquet", description="parquet or arrow (IPC stream)"),
+    start: date | None = Query(None, description="First entry_date to include"),
+    end: date | None = Query(None, description="Last entry_date to include"),
+    household_id: UUID | None = Query(None, description="Restrict to a specific household"),
+    as_of=Depends(as_of_param),
+    user=Depends(get_current_user),
+):
+    """Monthly totals per household, account, type and category, as one columnar table."""
+    if household_id:
+        await require_household_role(user, household_id, required_role=Role.member)
+
+    async def own(rows):
+        rows = rows[rows["user_id"] == str(user["user_id"])]
+        if household_id:
+            rows = rows[rows["household_id"] == str(household_id)]
+        if start:
+            rows = rows[rows["entry_date"] >= start]
+        if end:
+            rows = rows[rows["entry_date"] <= end]
+        return rows
+
+    # Aggregate batch by batch so only the totals are ever held in memory
+    partials = []
+    async for df in stream_records_async("entries", Entry, keep=own, as_of=as_of):
+        df["month"] = pd.to_datetime(df["entry_date"]).dt.strftime("%Y-%m")
+        df[["type", "category"]] = df[["type", "category"]].astype(str)
+        partials.append(df.groupby(SUMMARY_KEYS)["amount"].agg(amount="sum", entries="count").reset_index())
+
+    summary = pd.DataFrame(columns=SUMMARY_SCHEMA.names)
+    if partials:
+        summary = pd.concat(partials).groupby(SUMMARY_KEYS)[["amount", "entries"]].sum().reset_index()
+
+    async def tables():
+        yield to_arrow(summary, SUMMARY_SCHEMA)
+
+    return columnar_response(tables(), SUMMARY_SCHEMA, format, "summary")
@@ -1,36 +1,63 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Request, Response
 from uuid import uuid4, UUID
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import os
 import secrets
-import pandas as pd
+from typing import TYPE_CHECKING
+from app.lazy import lazy_module
 import jwt
-from app.services.utils import validate_password_strength, is_password_expired, normalize_email
+from app.services.utils import (
+    validate_password_strength,
+    is_password_expired,
+    normalize_email,
+    is_recent_password,
+)
+from app.services.hashing import hash_password, verify_password
 from app.models.schemas.user import (
     RegisterRequest,
     LoginRequest,
     UserUpdateRequest,
     User,
-    RefreshToken,
     PasswordHistory,
     PasswordResetToken,
 )
-from app.services.storage import load_versions, save_version, mark_old_version_as_stale, soft_delete_record, log_action
-from app.services.auth import get_current_user, create_access_token, create_refresh_token, SECRET_KEY, ALGORITHM
+from app.services.storage import (
+    load_versions_async,
+    save_version_async,
+    mark_old_version_as_stale_async,
+    soft_delete_record_async,
+    log_action_async,
+)
+from app.config import settings
+from app.services import ratelimit, tokens
+from app.services.commitlog import transaction
+from app.services.jobs import get_job, start_job
+from app.services.auth import (
+    get_current_user,
+    create_access_token,
+    create_refresh_token,
+    rotate_refresh_token,
+    SECRET_KEY,
+    ALGORITHM,
+)
 from app.services.triggers import on_user_suspended, on_user_unsuspended, on_password_change
 
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
 MIN_NUMBER_OF_PREVIOUS_PASSWORDS = 5
-RESET_TOKEN_EXPIRY_HOURS = 1
+RESET_TOKEN_EXPIRY_HOURS = settings.reset_token_expire_hours
 MIN_NUMBER_OF_PREVIOUS_PASSWORDS = 3
 
 router = APIRouter()
 
 
 @router.post("/register")
-def register_user(request: RegisterRequest):
+async def register_user(request: RegisterRequest):
     normalized_email = normalize_email(request.email)
-    users_df = load_versions("users", User)
+    users_df = await load_versions_async("users", User)
 
     if normalized_email in users_df["email"].values:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -41,12 +68,11 @@ def register_user(request: RegisterRequest):
     bootstrap_email = os.getenv("BOOTSTRAP_SUPERUSER_EMAIL", "").lower()
     is_superuser = request.email.lower() == bootstrap_email
 
-    salt = bcrypt.gensalt()
     new_user = User(
         user_id=uuid4(),
         user_name=request.user_name,
         email=normalized_email,
-        hashed_password=bcrypt.hashpw(request.password.encode("utf-8"), salt),
+        hashed_password=await hash_password(request.password),
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc),
         is_current=True,
@@ -55,24 +81,32 @@ def register_user(request: RegisterRequest):
         is_superuser=is_superuser,
     )
 
-    save_version(new_user, "users", "user_id")
-    log_action(str(new_user.user_id), "register", "users", str(new_user.user_id), request.model_dump())
+    await save_version_async(new_user, "users", "user_id")
+    await log_action_async(str(new_user.user_id), "register", "users", str(new_user.user_id), request.model_dump())
 
     return {"message": "User registered successfully", "user_id": str(new_user.user_id)}
 
 
 @router.post("/login")
-def login_user(request: LoginRequest):
-    users_df = load_versions("users", User)
+async def login_user(request: LoginRequest, http_request: Request):
     normalized_email = normalize_email(request.email)
-    row = users_df[(users_df["email"] == normalized_email) & (users_df["is_current"]) & (~users_df["is_deleted"])]
-
-    if row.empty:
-        raise HTTPException(status_code=401, detail="Invalid email or password")
+    # Throttled before any storage read or bcrypt check: every attempt counts per client, failures per email
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    await ratelimit.check("login_ip", client_ip, settings.login_attempts_per_ip, settings.login_ip_window_seconds)
+    await ratelimit.check(
+        "login_email",
+        normalized_email,
+        settings.login_failures_per_email,
+        settings.login_email_window_seconds,
+        count=False,
+    )
 
-    user = row.iloc[0]
+    users_df = await load_versions_async("users", User)
+    row = users_df[(users_df["email"] == normalized_email) & (users_df["is_current"]) & (~users_df["is_deleted"])]
+    user = None if row.empty else row.iloc[0]
 
-    if not bcrypt.checkpw(request.password.encode("utf-8"), user["hashed_password"].encode("utf-8")):
+    if user is None or not await verify_password(request.password, user["hashed_password"]):
+        await ratelimit.record("login_email", normalized_email, settings.login_email_window_seconds)
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     if is_password_expired(user):
@@ -82,9 +116,9 @@ def login_user(request: LoginRequest):
         raise HTTPException(status_code=403, detail="Account is suspended")
 
     access_token = create_access_token({"sub": str(user.user_id)})
-    refresh_token = create_refresh_token(str(user.user_id))
+    refresh_token = await create_refresh_token(str(user.user_id))
 
-    log_action(user["user_id"], "login", "users", str(user["user_id"]))
+    await log_action_async(user["user_id"], "login", "users", str(user["user_id"]))
     return {
         "message": "Login successful",
         "user_id": user["user_id"],
@@ -95,7 +129,7 @@ def login_user(request: LoginRequest):
 
 
 @router.get("/me")
-def get_current_user_info(user=Depends(get_current_user)):
+async def get_current_user_info(user=Depends(get_current_user)):
     return {
         "user_id": user["user_id"],
         "email": user["email"],
@@ -105,28 +139,25 @@ def get_current_user_info(user=Depends(get_current_user)):
 
 
 @router.put("/{user_id}")
-def update_user(user_id: UUID, update: UserUpdateRequest, user=Depends(get_current_user)):
+async def update_user(user_id: UUID, update: UserUpdateRequest, user=Depends(get_current_user)):
     if str(user["user_id"]) != str(user_id) and not user.get("is_superuser", False):
         raise HTTPException(status_code=403, detail="You can only update your own profile")
 
-    users_df = load_versions("users", User, record_id=user_id)
+    users_df = await load_versions_async("users", User, record_id=user_id)
 
     normalized_email = normalize_email(update.email) if update.email else None
     if normalized_email and normalized_email in users_df["email"].values:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     old = users_df.iloc[-1].to_dict()
-    salt = bcrypt.gensalt()
 
-    mark_old_version_as_stale("users", user_id, "user_id")
+    await mark_old_version_as_stale_async("users", user_id, "user_id")
 
     updated_user = User(
         user_id=user_id,
         user_name=update.user_name or old["user_name"],
         email=normalized_email or old["email"],
-        hashed_password=bcrypt.hashpw(update.password.encode("utf-8"), salt)
-        if update.password
-        else old["hashed_password"],
+        hashed_password=await hash_password(update.password) if update.password else old["hashed_password"],
         created_at=old["created_at"],
         updated_at=datetime.now(timezone.utc),
         is_current=True,
@@ -134,22 +165,45 @@ def update_user(user_id: UUID, update: UserUpdateRequest, user=Depends(get_curre
         is_active=True,
     )
 
-    save_version(updated_user, "users", "user_id")
-    log_action(user["user_id"], "update", "users", str(user_id), update.model_dump())
+    await save_version_async(updated_user, "users", "user_id")
+    await log_action_async(user["user_id"], "update", "users", str(user_id), update.model_dump())
     return {"message": "User updated successfully", "user_id": str(user_id)}
 
 
 @router.delete("/{user_id}")
-def soft_delete_user(user_id: UUID, user=Depends(get_current_user)):
+async def soft_delete_user(
+    user_id: UUID,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    background: bool = Query(False, description="Delete after responding; poll /users/jobs/{job_id}"),
+    user=Depends(get_current_user),
+):
     # Only allow deleting your own account (or admins if you add auth)
     if str(user["user_id"]) != str(user_id) and not user.get("is_superuser", False):
         raise HTTPException(status_code=403, detail="You can only update your own profile")
 
-    return soft_delete_record("users", user_id, "user_id", User, user=user, owner_field="user_id", require_owner=True)
+    async def delete():
+        # Memberships cascade inside soft_delete_record_async; tokens are revoked in the same commit
+        async with transaction():
+            result = await soft_delete_record_async(
+                "users", user_id, "user_id", User, user=user, owner_field="user_id", require_owner=True
+            )
+            await tokens.revoke_all(user_id)
+        return result
+
+    if not background:
+        return await delete()
+    response.status_code = 202
+    return await start_job(background_tasks, "delete_user", user["user_id"], delete)
+
+
+@router.get("/jobs/{job_id}")
+async def get_user_job(job_id: str):
+    return await get_job(job_id)
 
 
 @router.post("/refresh")
-def refresh_tokens(refresh_token: str):
+async def refresh_tokens(refresh_token: str):
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
@@ -158,19 +212,9 @@ def refresh_tokens(refresh_token: str):
         if not user_id or not token_id:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        # Verify token in S3
-        df = load_versions("refresh_tokens", schema=RefreshToken, record_id=token_id)
-        token_row = df[(df["is_current"])]
-
-        if token_row.empty:
-            raise HTTPException(status_code=401, detail="Token expired or already used")
-
-        # Mark old refresh token as stale (rotation)
-        mark_old_version_as_stale("refresh_tokens", token_id, "refresh_token_id")
-
-        # Issue new tokens
+        # Rotation: the old token is retired and the new one issued in one commit
+        new_refresh_token = await rotate_refresh_token(user_id, token_id)
         access_token = create_access_token({"sub": user_id})
-        new_refresh_token = create_refresh_token(user_id)
 
         return {"access_token": access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
 
@@ -181,8 +225,8 @@ def refresh_tokens(refresh_token: str):
 
 
 @router.post("/request-password-reset")
-def request_password_reset(email: str):
-    users_df = load_versions("users", User)
+async def request_password_reset(email: str):
+    users_df = await load_versions_async("users", User)
 
     normalized_email = normalize_email(email)
 
@@ -196,8 +240,7 @@ def request_password_reset(email: str):
 
     # Generate OTP
     otp = f"{secrets.randbelow(1000000):06}"  # 6-digit numeric
-    salt = bcrypt.gensalt()
-    hashed_otp = bcrypt.hashpw(otp.encode("utf-8"), salt).decode("utf-8")
+    hashed_otp = await hash_password(otp)
 
     reset_token = PasswordResetToken(
         token_id=uuid4(),
@@ -207,8 +250,8 @@ def request_password_reset(email: str):
         used=False,
         created_at=datetime.now(timezone.utc),
     )
-    save_version(reset_token, "password_reset_tokens", "token_id")
-    log_action(
+    await save_version_async(reset_token, "password_reset_tokens", "token_id")
+    await log_action_async(
         None,
         "request_password_reset",
         "users",
@@ -216,13 +259,17 @@ def request_password_reset(email: str):
         {"email": normalized_email, "otp_issued": True},  # Don’t log raw OTP
     )
 
-    return {"message": "Password reset token generated", "otp": otp, "expires_in_minutes": 15}
+    return {
+        "message": "Password reset token generated",
+        "otp": otp,
+        "expires_in_minutes": RESET_TOKEN_EXPIRY_HOURS * 60,
+    }
     # Hybrid: return token in dev/test, send email in prod
     # if os.getenv("ENV", "dev") == "dev":
     #     return {
     #         "message": "Password reset token generated",
     #         "otp": otp,
-    #         "expires_in_minutes": 15
+    #         "expires_in_minutes": RESET_TOKEN_EXPIRY_HOURS * 60
     #     }
     # else:
     #     # TODO: replace with SES email later
@@ -231,35 +278,34 @@ def request_password_reset(email: str):
 
 
 @router.post("/change-password")
-def change_password(current_password: str, new_password: str, user=Depends(get_current_user)):
+async def change_password(current_password: str, new_password: str, user=Depends(get_current_user)):
     now = datetime.now(timezone.utc)
-    users_df = load_versions("users", User)
+    users_df = await load_versions_async("users", User)
     row = users_df[(users_df["user_id"] == str(user["user_id"])) & (users_df["is_current"])]
 
     user = row.iloc[0]
 
-    if row.empty or not bcrypt.checkpw(current_password.encode("utf-8"), user["hashed_password"].encode("utf-8")):
+    if row.empty or not await verify_password(current_password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    history = load_versions("password_history", PasswordHistory)
-    user_history = history[history["user_id"] == str(user["user_id"])].sort_values("changed_at", ascending=False)
+    history = await load_versions_async("password_history", PasswordHistory, parent_id=user["user_id"])
+    user_history = history.sort_values("changed_at", ascending=False)
     recent_passwords = user_history.head(MIN_NUMBER_OF_PREVIOUS_PASSWORDS)["hashed_password"].tolist()
 
-    if any(bcrypt.checkpw(new_password.encode("utf-8"), p.encode("utf-8")) for p in recent_passwords):
+    if await is_recent_password(new_password, recent_passwords):
         raise HTTPException(
             status_code=400, detail=f"Cannot reuse the last {MIN_NUMBER_OF_PREVIOUS_PASSWORDS} passwords"
         )
 
     validate_password_strength(new_password)
 
-    mark_old_version_as_stale("users", user["user_id"], "user_id")
-    salt = bcrypt.gensalt()
+    await mark_old_version_as_stale_async("users", user["user_id"], "user_id")
     # Create new version with new password
     updated_user = User(
         user_id=user["user_id"],
         user_name=user["user_name"],
         email=user["email"],
-        hashed_password=bcrypt.hashpw(new_password.encode("utf-8"), salt),
+        hashed_password=await hash_password(new_password),
         created_at=user["created_at"],
         updated_at=now,
         password_changed_at=now,
@@ -274,18 +320,18 @@ def change_password(current_password: str, new_password: str, user=Depends(get_c
         changed_at=now,
     )
 
-    save_version(updated_user, "users", "user_id")
-    log_action(user["user_id"], "change_password", "users", str(user["user_id"]))
+    await save_version_async(updated_user, "users", "user_id")
+    await log_action_async(user["user_id"], "change_password", "users", str(user["user_id"]))
 
-    save_version(password_history, "password_history", "history_id")
-    on_password_change(UUID(user["user_id"]))
+    await save_version_async(password_history, "password_history", "history_id")
+    await on_password_change(UUID(user["user_id"]))
 
     return {"message": "Password changed successfully. Please log in again."}
 
 
 @router.post("/reset-password")
-def reset_password(email: str, otp_code: str, new_password: str):
-    users_df = load_versions("users", User)
+async def reset_password(email: str, otp_code: str, new_password: str):
+    users_df = await load_versions_async("users", User)
 
     normalized_email = normalize_email(email)
 
@@ -297,11 +343,11 @@ def reset_password(email: str, otp_code: str, new_password: str):
 
     user_id = match.iloc[0]["user_id"]
 
-    tokens_df = load_versions("password_reset_tokens", PasswordResetToken)
+    # The user's own tokens only: expired and used ones are purged, so this stays a handful of files
+    tokens_df = await load_versions_async("password_reset_tokens", PasswordResetToken, parent_id=user_id)
     token_row = (
         tokens_df[
-            (tokens_df["user_id"] == str(user_id))
-            & (tokens_df["is_current"])
+            (tokens_df["is_current"])
             & (~tokens_df.get("is_deleted", False).fillna(False))
             & (~tokens_df["used"].fillna(False))
         ]
@@ -317,31 +363,32 @@ def reset_password(email: str, otp_code: str, new_password: str):
     if datetime.now(timezone.utc) > pd.to_datetime(token["expires_at"]):
         raise HTTPException(status_code=400, detail="Reset token expired")
 
-    if not bcrypt.checkpw(otp_code.encode("utf-8"), token["otp_code"].encode("utf-8")):
+    if not await verify_password(otp_code, token["otp_code"]):
         raise HTTPException(status_code=400, detail="Invalid OTP code")
 
     # Enforce password strength + history
     validate_password_strength(new_password)
-    history = load_versions("password_history", PasswordHistory)
-    user_history = history[history["user_id"] == str(user_id)].sort_values("changed_at", ascending=False)
+    history = await load_versions_async("password_history", PasswordHistory, parent_id=user_id)
+    user_history = history.sort_values("changed_at", ascending=False)
     recent_passwords = user_history.head(MIN_NUMBER_OF_PREVIOUS_PASSWORDS)["hashed_password"].tolist()
-    if any(bcrypt.checkpw(new_password.encode("utf-8"), p.encode("utf-8")) for p in recent_passwords):
+    if await is_recent_password(new_password, recent_passwords):
         raise HTTPException(
             status_code=400, detail=f"Cannot reuse the last {MIN_NUMBER_OF_PREVIOUS_PASSWORDS} passwords"
         )
 
     # Update password
-    mark_old_version_as_stale("users", user_id, "user_id")
-    salt = bcrypt.gensalt()
+    await mark_old_version_as_stale_async("users", user_id, "user_id")
     updated_user = User(
-        **{k: match.iloc[0][k] for k in User.model_fields if k in match.iloc[0]},
-        hashed_password=bcrypt.hashpw(new_password.encode("utf-8"), salt),
-        updated_at=datetime.now(timezone.utc),
-        password_changed_at=datetime.now(timezone.utc),
-        is_current=True,
-        is_deleted=False,
+        **{
+            **{k: match.iloc[0][k] for k in User.model_fields if k in match.iloc[0]},
+            "hashed_password": await hash_password(new_password),
+            "updated_at": datetime.now(timezone.utc),
+            "password_changed_at": datetime.now(timezone.utc),
+            "is_current": True,
+            "is_deleted": False,
+        }
     )
-    save_version(updated_user, "users", "user_id")
+    await save_version_async(updated_user, "users", "user_id")
 
     # Store password history
     password_history = PasswordHistory(
@@ -350,8 +397,8 @@ def reset_password(email: str, otp_code: str, new_password: str):
         hashed_password=updated_user.hashed_password,
         changed_at=datetime.now(timezone.utc),
     )
-    save_version(password_history, "password_history", "history_id")
-    log_action(
+    await save_version_async(password_history, "password_history", "history_id")
+    await log_action_async(
         None,
         "reset_password",
         "users",
@@ -359,40 +406,38 @@ def reset_password(email: str, otp_code: str, new_password: str):
         {"otp_validated": True, "method": "otp"},  # instead of logging the OTP
     )
 
-    # Mark token used
-    mark_old_version_as_stale("password_reset_tokens", token["token_id"], "token_id")
-    used_token = PasswordResetToken(**{**token.to_dict(), "used": True, "is_current": True})
-    save_version(used_token, "password_reset_tokens", "token_id")
+    # Spend the token: superseded with no new version, so the next purge deletes it
+    await mark_old_version_as_stale_async("password_reset_tokens", token["token_id"], "token_id", parent_id=user_id)
 
-    log_action(user_id, "reset_password", "users", str(user_id))
+    await log_action_async(user_id, "reset_password", "users", str(user_id))
 
     return {"message": "Password reset successful"}
 
 
 @router.get("/{user_id}")
-def get_user(user_id: UUID, user=Depends(get_current_user)):
-    df = load_versions("users", User, record_id=user_id)
+async def get_user(user_id: UUID, user=Depends(get_current_user)):
+    df = await load_versions_async("users", User, record_id=user_id)
 
     match = df[(df["is_current"]) & (~df.get("is_deleted", False).fillna(False))]
 
     if match.empty:
         raise HTTPException(status_code=404, detail="User not found")
-    log_action(user["user_id"], "get", "user", str(user_id))
+    await log_action_async(user["user_id"], "get", "user", str(user_id))
     return match.iloc[0].to_dict()
 
 
 @router.post("/{user_id}/suspend")
-def suspend_user(user_id: UUID, reason: str, admin=Depends(get_current_user)):
+async def suspend_user(user_id: UUID, reason: str, admin=Depends(get_current_user)):
     if not admin.get("is_superuser", False):
         raise HTTPException(status_code=403, detail="Not authorized to suspend users")
-    users = load_versions("users", User, record_id=user_id)
+    users = await load_versions_async("users", User, record_id=user_id)
     match = users[(users["is_current"]) & (~users["is_deleted"])]
 
     if match.empty:
         raise HTTPException(status_code=404, detail="User not found")
 
     row = match.iloc[0].to_dict()
-    mark_old_version_as_stale("users", user_id, "user_id")
+    await mark_old_version_as_stale_async("users", user_id, "user_id")
 
     updated = User(
         **row,
@@ -405,22 +450,22 @@ def suspend_user(user_id: UUID, reason: str, admin=Depends(get_current_user)):
         is_current=True,
     )
 
-    save_version(updated, "users", "user_id")
-    on_user_suspended(user_id, reason, admin["user_id"])
-    log_action(admin["user_id"], "suspend", "users", str(user_id), {"reason": reason})
+    await save_version_async(updated, "users", "user_id")
+    await on_user_suspended(user_id, reason, admin["user_id"])
+    await log_action_async(admin["user_id"], "suspend", "users", str(user_id), {"reason": reason})
     return {"message": "User suspended", "user_id": str(user_id)}
 
 
 @router.post("/{user_id}/unsuspend")
-def unsuspend_user(user_id: UUID, admin=Depends(get_current_user)):
-    users = load_versions("users", User, record_id=user_id)
+async def unsuspend_user(user_id: UUID, admin=Depends(get_current_user)):
+    users = await load_versions_async("users", User, record_id=user_id)
     match = users[(users["is_current"]) & (~users["is_deleted"])]
 
     if match.empty:
         raise HTTPException(status_code=404, detail="User not found")
 
     row = match.iloc[0].to_dict()
-    mark_old_version_as_stale("users", user_id, "user_id")
+    await mark_old_version_as_stale_async("users", user_id, "user_id")
 
     updated = User(
         **row,
@@ -433,7 +478,7 @@ def unsuspend_user(user_id: UUID, admin=Depends(get_current_user)):
         is_current=True,
     )
 
-    save_version(updated, "users", "user_id")
-    on_user_unsuspended(user_id, admin["user_id"])
+    await save_version_async(updated, "users", "user_id")
+    await on_user_unsuspended(user_id, admin["user_id"])
 
     return {"message": "User unsuspended", "user_id": str(user_id)}
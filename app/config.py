@@ -15,10 +15,27 @@ class Settings(BaseSettings):
     secret_key: str = Field(alias="SECRET_KEY")
     db_url: Optional[str] = Field(default=None, alias="DB_URL")
     s3_bucket: Optional[str] = Field(default="hf-dev", alias="S3_BUCKET")
+    s3_endpoint_url: Optional[str] = Field(default=None, alias="S3_ENDPOINT_URL")
+    s3_max_pool_connections: int = Field(default=50, alias="S3_MAX_POOL_CONNECTIONS")
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
     access_token_expire_minutes: int = Field(default=15, alias="ACCESS_TOKEN_EXPIRE_MINUTES")
     refresh_token_expire_days: int = Field(default=7, alias="REFRESH_TOKEN_EXPIRE_DAYS")
+    reset_token_expire_hours: int = Field(default=1, alias="RESET_TOKEN_EXPIRE_HOURS")
     encoding_algorithm: str = Field(default="HS256", alias="ENCODING_ALGORITHM")
+    cache_url: Optional[str] = Field(default=None, alias="CACHE_URL")
+    cache_ttl_seconds: int = Field(default=300, alias="CACHE_TTL_SECONDS")
+    cache_max_entries: int = Field(default=10_000, alias="CACHE_MAX_ENTRIES")
+    scheduler_enabled: bool = Field(default=True, alias="SCHEDULER_ENABLED")
+    job_intervals: dict[str, float] = Field(default_factory=dict, alias="JOB_INTERVALS")
+    hash_workers: int = Field(default=0, alias="HASH_WORKERS")  # 0: one per core
+    hash_queue_limit: int = Field(default=64, alias="HASH_QUEUE_LIMIT")
+    # Proxies trusted to report the client address in X-Forwarded-For: the load balancer's addresses or CIDRs
+    forwarded_allow_ips: str = Field(default="127.0.0.1", alias="FORWARDED_ALLOW_IPS")
+    login_attempts_per_ip: int = Field(default=30, alias="LOGIN_ATTEMPTS_PER_IP")
+    login_ip_window_seconds: int = Field(default=60, alias="LOGIN_IP_WINDOW_SECONDS")
+    login_failures_per_email: int = Field(default=10, alias="LOGIN_FAILURES_PER_EMAIL")
+    login_email_window_seconds: int = Field(default=900, alias="LOGIN_EMAIL_WINDOW_SECONDS")
+    hot_tables_refresh_seconds: float = Field(default=15.0, alias="HOT_TABLES_REFRESH_SECONDS")
 
 
 # Global settings instance
@@ -0,0 +1,19 @@
+"""Deferred imports for heavy libraries that startup and light requests never touch."""
+
+import importlib
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """Stand-in for a module that imports it on first attribute access and then behaves as the module."""
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self.__name__)
+        # Later lookups hit the copied namespace directly; __getattr__ only runs for names still missing
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_module(name: str) -> ModuleType:
+    """Return ``name`` as a module imported on first use. Use under ``if TYPE_CHECKING`` so mypy sees the real one."""
+    return LazyModule(name)
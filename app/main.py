@@ -1,7 +1,43 @@
-from fastapi import FastAPI
-from app.api import entries, users, household, accounts, summaries, debts, audit
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+from app.api import entries, users, household, accounts, summaries, debts, audit, changes
+from app.config import settings
+from app.services import hashing, hottables, metrics, scheduler
+from app.services.objectstore import close_client
+from app.services.readcache import request_cache_middleware
+from app.services.telemetry import storage_accounting_middleware
 
-app = FastAPI()
+logging.basicConfig(level=settings.log_level, format="%(message)s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Hot tables warm up in the background: /health answers at once, /ready once they are loaded.
+    # Every process runs the scheduler loop; only the lease holder runs jobs.
+    background = [asyncio.create_task(hottables.keep_fresh(settings.hot_tables_refresh_seconds))]
+    if settings.scheduler_enabled:
+        background.append(asyncio.create_task(scheduler.run_forever()))
+    yield
+    for task in background:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await close_client()
+    hashing.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(request_cache_middleware)
+app.middleware("http")(storage_accounting_middleware)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Outermost: the client address is taken from X-Forwarded-For only when a trusted proxy connects, and then
+# from the last hop that proxy saw, so clients cannot pick their own (per-IP login limits depend on it)
+trusted_proxies = [host.strip() for host in settings.forwarded_allow_ips.split(",") if host.strip()]
+app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=trusted_proxies)
 
 
 @app.get("/health")
@@ -9,6 +45,20 @@ def health():
     return {"ok": True}
 
 
+@app.get("/ready")
+def ready(response: Response):
+    """Readiness: the hot tables are warm, so the first requests do not all scan storage."""
+    if not hottables.is_ready():
+        response.status_code = 503
+    return {"ready": hottables.is_ready()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 app.include_router(entries.router, prefix="/entries", tags=["Entries"])
 app.include_router(debts.router, prefix="/debts", tags=["Debts"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
@@ -16,3 +66,4 @@ app.include_router(household.router, prefix="/households", tags=["Households"])
 app.include_router(accounts.router, prefix="/accounts", tags=["Accounts"])
 app.include_router(audit.router, prefix="/audit", tags=["Audit"])
 app.include_router(summaries.router, prefix="/summaries", tags=["Summaries"])
+app.include_router(changes.router, prefix="/changes", tags=["Changes"])
@@ -0,0 +1,102 @@
+from datetime import date, datetime
+from enum import Enum
+from functools import lru_cache
+from types import NoneType, UnionType
+from typing import TYPE_CHECKING, Any, Union, get_args, get_origin
+from uuid import UUID
+from app.lazy import lazy_module
+import pyarrow as pa
+from pydantic import BaseModel, EmailStr
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
+# UUIDs are stored as their canonical string form: every reader compares and returns them as strings.
+UUID_TYPE = pa.string()
+ENUM_TYPE = pa.dictionary(pa.int32(), pa.string())
+TIMESTAMP_TYPE = pa.timestamp("us", tz="UTC")
+
+_SCALAR_TYPES: dict[type, pa.DataType] = {
+    UUID: UUID_TYPE,
+    str: pa.string(),
+    EmailStr: pa.string(),
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    datetime: TIMESTAMP_TYPE,
+    date: pa.date32(),
+}
+
+
+def _arrow_type(annotation) -> tuple[pa.DataType, bool]:
+    """Map a field annotation to (arrow type, nullable)."""
+    nullable = False
+    if get_origin(annotation) in (Union, UnionType):
+        args = [a for a in get_args(annotation) if a is not NoneType]
+        nullable = len(args) < len(get_args(annotation))
+        if len(args) != 1:
+            raise TypeError(f"Unsupported union annotation for storage: {annotation}")
+        annotation = args[0]
+
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return ENUM_TYPE, nullable
+    for py_type, arrow_type in _SCALAR_TYPES.items():
+        if isinstance(annotation, type) and issubclass(annotation, py_type):
+            # bool is a subclass of int and datetime of date: the mapping lists the specific type first
+            return arrow_type, nullable
+    raise TypeError(f"Unsupported annotation for storage: {annotation}")
+
+
+@lru_cache(maxsize=None)
+def arrow_schema(model: type[BaseModel]) -> pa.Schema:
+    """Canonical Arrow schema of a stored model, in field order."""
+    fields = []
+    for name, info in model.model_fields.items():
+        arrow_type, nullable = _arrow_type(info.annotation)
+        fields.append(pa.field(name, arrow_type, nullable=nullable or info.default is None))
+    return pa.schema(fields)
+
+
+def _storable(value: Any) -> Any:
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (float, datetime)) and pd.isna(value):
+        # NaN / NaT come back from rows that were round-tripped through pandas
+        return None
+    return value
+
+
+def to_table(record_data: dict, model: type[BaseModel] | None = None) -> pa.Table:
+    """Build a one-row table, typed by ``model``'s canonical schema when given."""
+    row = {k: _storable(v) for k, v in record_data.items()}
+    if model is None:
+        return pa.Table.from_pylist([row])
+    return pa.Table.from_pylist([row], schema=arrow_schema(model))
+
+
+def conform(table: pa.Table, model: type[BaseModel]) -> pa.Table:
+    """Cast a table read from storage to ``model``'s canonical schema.
+
+    Files written before schemas were enforced may hold strings for timestamps, plain strings for
+    enums or lack newer columns; missing columns are filled with the field default (or nulls).
+    """
+    schema = arrow_schema(model)
+    if table.schema.equals(schema):
+        return table
+
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table.column(field.name)
+            if column.type != field.type:
+                column = column.cast(field.type, safe=False)
+        else:
+            info = model.model_fields[field.name]
+            value = None if info.is_required() or info.default_factory else _storable(info.default)
+            column = pa.array([value] * table.num_rows, type=field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema)
@@ -7,6 +7,7 @@ class Account(BaseModel):
     account_id: UUID = Field(default_factory=uuid4)
     name: str
     household_id: UUID
+    version: int = 1
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_current: bool = True
@@ -14,6 +14,7 @@ class Debt(BaseModel):
     installments: int
     start_date: date
     due_day: int  # day of month for payments
+    version: int = 1
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_current: bool = True
@@ -17,6 +17,7 @@ class Entry(BaseModel):
     category: Category
     amount: float
     description: str = ""
+    version: int = 1  # incremented by every new version of the record
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_current: bool = True
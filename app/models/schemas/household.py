@@ -9,6 +9,7 @@ class Household(BaseModel):
     household_id: UUID = Field(default_factory=uuid4)
     name: str
     created_by_user_id: UUID
+    version: int = 1
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_current: bool = True
@@ -23,7 +23,7 @@ class User(BaseModel):
 class RefreshToken(BaseModel):
     refresh_token_id: UUID = Field(default_factory=uuid4)
     user_id: UUID
-    token: str
+    token: str | None = None  # the signed JWT is never persisted, only its metadata
     expires_at: datetime
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -64,6 +64,8 @@ class PasswordResetToken(BaseModel):
     expires_at: datetime
     used: bool = False
     created_at: datetime
+    is_current: bool = True
+    is_deleted: bool = False
 
 
 class UserOut(BaseModel):
@@ -1,8 +1,10 @@
 import jwt
 from fastapi import HTTPException, Depends
 from datetime import datetime, timedelta, timezone
-from uuid import uuid4, UUID
-from app.services.storage import save_version, load_versions
+from uuid import UUID
+from app.services import tokens
+from app.services.commitlog import transaction
+from app.services.storage import SENSITIVE_FIELDS, load_versions_async, shared_read
 from app.models.schemas.user import User
 from fastapi.security import OAuth2PasswordBearer
 from app.config import settings
@@ -23,28 +25,44 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def create_refresh_token(user_id: str):
+async def create_refresh_token(user_id: str):
     expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    token_id = str(uuid4())
+    token_id = await tokens.issue(user_id, expire)
     payload = {"sub": str(user_id), "jti": token_id, "exp": expire}
-    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
-
-    # Save refresh token metadata in S3
-    save_version(
-        {
-            "refresh_token_id": token_id,
-            "user_id": user_id,
-            "expires_at": expire.isoformat(),
-            "is_current": True,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        },
-        "refresh_tokens",
-        "refresh_token_id",
-    )
-    return token
-
-
-def get_current_user(token: str = Depends(oauth2_scheme)):
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+async def rotate_refresh_token(user_id: str, token_id: str) -> str:
+    """Exchange a refresh token for a new one; each token can be exchanged once."""
+    try:
+        async with transaction():
+            await tokens.retire(user_id, token_id)
+            return await create_refresh_token(user_id)
+    except HTTPException as exc:
+        # Another request exchanged the same token first
+        if exc.status_code == 412:
+            raise HTTPException(status_code=401, detail="Token expired or already used")
+        raise
+
+
+async def load_principal(user_id: UUID | str) -> dict | None:
+    """The user's current record without its secrets, shared across requests until a user record is written.
+    Password checks read the hash from storage.
+    """
+
+    async def load():
+        users_df = await load_versions_async("users", User, record_id=user_id)
+        match = users_df[(users_df["is_current"]) & (~users_df.get("is_deleted", False).fillna(False))]
+        if match.empty:
+            return None
+        return {k: v for k, v in match.iloc[0].to_dict().items() if k not in SENSITIVE_FIELDS}
+
+    user = await shared_read("principals", (str(user_id),), ["users"], load)
+    # Callers may annotate the principal: never hand out the shared copy
+    return dict(user) if user is not None else None
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: UUID = payload.get("sub")
@@ -55,14 +73,10 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    users_df = load_versions("users", User, record_id=user_id)
-    match = users_df[(users_df["is_current"]) & (~users_df.get("is_deleted", False).fillna(False))]
-
-    if match.empty:
+    user = await load_principal(user_id)
+    if user is None:
         raise HTTPException(status_code=401, detail="User not found")
 
-    user = match.iloc[0].to_dict()
-
     if not user.get("is_active", True):
         raise HTTPException(status_code=403, detail="User is inactive")
     if user.get("is_suspended", False):
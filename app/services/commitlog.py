@@ -0,0 +1,370 @@
+"""
+Commit log for the version store.
+
+Every write is part of a transaction. Its data files are uploaded first, under keys tagged with the
+transaction id, then one manifest listing the files it adds and the versions it supersedes is written
+to ``_commits/``. Readers only see data files whose transaction has a manifest and treat superseded
+versions as ``is_current=False``, so a transaction that fails midway leaves nothing visible.
+
+Files written before the log existed carry no transaction tag and are always visible.
+
+The state a process keeps stays bounded. Once the files of transactions that never committed have been
+swept, a manifest declares every tagged file written before some moment committed, and ids of older
+transactions are dropped; a manifest likewise names deleted data files, which are dropped from the
+superseded keys.
+
+Updates of versioned records (models with a ``version`` field) also claim ``_versions/<record_type>/<id>/<version>``
+with a conditional PUT before their data is uploaded, so two writers can never both commit the same
+version of a record: the loser gets a 412.
+"""
+
+import asyncio
+import json
+import re
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import uuid4
+from fastapi import HTTPException
+from app.services.objectstore import (
+    delete_many,
+    get_bytes,
+    get_many,
+    get_with_etag,
+    list_keys,
+    put_bytes,
+    put_conditional,
+)
+from app.services import sharedcache
+from app.services.readcache import invalidate, once_per_request
+
+COMMITS_PREFIX = "_commits/"
+CHECKPOINTS_PREFIX = "_checkpoints/"
+VERSIONS_PREFIX = "_versions/"
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+# Manifests can land out of key order (clock skew, slow uploads): refreshes re-list this far back.
+SETTLE_WINDOW = timedelta(seconds=10)
+# Checkpoints kept besides the latest: a process restoring while a new one is written still finds the one it listed
+CHECKPOINTS_KEPT = 1
+# A version claim whose transaction has not committed after this long is considered abandoned.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+_TXN_TAG = re.compile(r"-([0-9a-f]{32})\.parquet$")
+_WRITTEN_TAG = re.compile(r"-(\d{8}T\d{12}Z)-[0-9a-f]{32}\.parquet$")
+
+
+def timestamp(moment: datetime) -> str:
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def commit_time(commit_key: str) -> datetime:
+    """Commit timestamp encoded in a manifest key (``_commits/<timestamp>-<txn>.json``)."""
+    stamp = commit_key.removeprefix(COMMITS_PREFIX).split("-", 1)[0]
+    return datetime.strptime(stamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def transaction_of(key: str) -> str | None:
+    """Transaction id tagged on a data file key, or None for files that predate the log."""
+    match = _TXN_TAG.search(key)
+    return match.group(1) if match else None
+
+
+def _written(key: str) -> str | None:
+    """Timestamp a transaction's data file was written at, as encoded in its key."""
+    match = _WRITTEN_TAG.search(key)
+    return match.group(1) if match else None
+
+
+def manifest_scopes(manifest: dict) -> set[str]:
+    """Record types and ``<field>=<id>`` scopes whose data generation a commit changes."""
+    return {scope for action in manifest["actions"] for scope in (action["record_type"], *action.get("scopes", ()))}
+
+
+def settle_point(cursor: str | None) -> str | None:
+    """Manifest key before which no new manifest is expected to appear."""
+    if cursor is None:
+        return None
+    return f"{COMMITS_PREFIX}{timestamp(commit_time(cursor) - SETTLE_WINDOW)}"
+
+
+@dataclass
+class LogState:
+    """What a process knows about the log. Merging takes the latest of every field.
+
+    Transaction ids are only kept for commits after ``committed_before``: a tagged file written before
+    that moment is committed, since the files of transactions that did not are deleted by then.
+    Superseded keys are kept until their files are deleted (``compactions`` counts those drops).
+    """
+
+    committed: dict[str, str] = field(default_factory=dict)  # transaction id -> its manifest key
+    stale: dict[str, str] = field(default_factory=dict)  # superseded data key -> manifest key superseding it
+    generations: dict[str, str] = field(default_factory=dict)  # record type or scope -> latest manifest key
+    seen: set[str] = field(default_factory=set)  # manifest keys applied, within the settle window
+    cursor: str | None = None  # greatest manifest key applied
+    committed_before: str | None = None  # timestamp before which every remaining tagged file is committed
+    compactions: int = 0
+    loaded: bool = False
+
+    def apply(self, commit_key: str, manifest: dict) -> None:
+        if commit_key in self.seen:
+            return
+        self.seen.add(commit_key)
+        if manifest.get("committed_before"):
+            self._fold(manifest["committed_before"])
+        self._commit(manifest["txn"], commit_key)
+        forgotten = []
+        for action in manifest["actions"]:
+            if action["op"] == "remove":
+                self._supersede(action["key"], commit_key)
+            elif action["op"] == "forget":
+                forgotten.append(action["key"])
+        self._forget(forgotten)
+        for scope in manifest_scopes(manifest):
+            self._touch(scope, commit_key)
+        if self.cursor is None or commit_key > self.cursor:
+            self.cursor = commit_key
+
+    def is_visible(self, key: str) -> bool:
+        txn = transaction_of(key)
+        if txn is None or txn in self.committed:
+            return True
+        written = _written(key)
+        return written is not None and self.committed_before is not None and written < self.committed_before
+
+    def _commit(self, txn: str, commit_key: str) -> None:
+        if self.committed_before is None or commit_key >= f"{COMMITS_PREFIX}{self.committed_before}":
+            self.committed[txn] = commit_key
+
+    def _fold(self, committed_before: str) -> None:
+        """Drop the ids of transactions committed before ``committed_before``: their files are visible anyway."""
+        if self.committed_before is not None and committed_before <= self.committed_before:
+            return
+        self.committed_before = committed_before
+        folded = f"{COMMITS_PREFIX}{committed_before}"
+        self.committed = {txn: key for txn, key in self.committed.items() if key >= folded}
+
+    def _forget(self, keys: list[str]) -> None:
+        """Drop superseded keys whose files were deleted."""
+        dropped = [key for key in keys if self.stale.pop(key, None) is not None]
+        if dropped:
+            self.compactions += 1
+
+    def _supersede(self, key: str, commit_key: str) -> None:
+        # Keep the earliest commit, whatever order manifests are applied in
+        if key not in self.stale or commit_key < self.stale[key]:
+            self.stale[key] = commit_key
+
+    def _touch(self, scope: str, commit_key: str) -> None:
+        if commit_key > self.generations.get(scope, ""):
+            self.generations[scope] = commit_key
+
+    def superseded_at(self, key: str) -> datetime | None:
+        """When ``key`` stopped being current, or None if it still is."""
+        commit_key = self.stale.get(key)
+        return commit_time(commit_key) if commit_key else None
+
+    def prune(self) -> None:
+        settle = settle_point(self.cursor)
+        if settle is not None:
+            self.seen = {k for k in self.seen if k > settle}
+
+    def merge(self, data: dict) -> None:
+        if data.get("committed_before"):
+            self._fold(data["committed_before"])
+        committed = data["committed"]
+        if isinstance(committed, list):
+            # Checkpoints written before commit keys were tracked: date the transactions at the checkpoint
+            committed = dict.fromkeys(committed, data["cursor"])
+        for txn, commit_key in committed.items():
+            self._commit(txn, commit_key)
+        stale = data["stale"]
+        if isinstance(stale, list):
+            # Checkpoints written before supersede times were tracked: date them at the checkpoint
+            stale = dict.fromkeys(stale, data["cursor"])
+        for key, commit_key in stale.items():
+            self._supersede(key, commit_key)
+        for scope, commit_key in data.get("generations", {}).items():
+            self._touch(scope, commit_key)
+        self.seen.update(data["seen"])
+        if self.cursor is None or data["cursor"] > self.cursor:
+            self.cursor = data["cursor"]
+
+    def snapshot(self) -> dict:
+        return {
+            "cursor": self.cursor,
+            "committed_before": self.committed_before,
+            "committed": dict(sorted(self.committed.items())),
+            "stale": dict(sorted(self.stale.items())),
+            "generations": dict(sorted(self.generations.items())),
+            "seen": sorted(self.seen),
+        }
+
+
+_state = LogState()
+
+
+async def _restore_checkpoint() -> str | None:
+    """Merge the latest checkpoint into the state and return where listing must resume."""
+    keys = await list_keys(CHECKPOINTS_PREFIX)
+    if not keys:
+        return None
+    data = json.loads(await get_bytes(keys[-1]))
+    _state.merge(data)
+    return settle_point(data["cursor"])
+
+
+async def _refresh() -> LogState:
+    start_after = settle_point(_state.cursor) if _state.loaded else await _restore_checkpoint()
+    keys = [k for k in await list_keys(COMMITS_PREFIX, start_after=start_after) if k not in _state.seen]
+    for key, body in zip(keys, await get_many(keys)):
+        _state.apply(key, json.loads(body))
+    _state.loaded = True
+    _state.prune()
+    return _state
+
+
+async def current_state() -> LogState:
+    """The log state, refreshed from storage at most once per request."""
+    return await once_per_request(("_commits",), _refresh)
+
+
+async def changes_since(cursor: str | None, limit: int = 100) -> tuple[list[tuple[str, dict]], str | None]:
+    """Up to ``limit`` commits after ``cursor`` (a manifest key), oldest first, and the cursor to resume from.
+
+    Only commits older than the settle window are returned, so a consumer resuming from the returned
+    cursor never skips a commit that landed out of order.
+    """
+    settled = f"{COMMITS_PREFIX}{timestamp(datetime.now(timezone.utc) - SETTLE_WINDOW)}"
+    keys = [k for k in await list_keys(COMMITS_PREFIX, start_after=cursor, limit=limit) if k < settled]
+    manifests = [json.loads(body) for body in await get_many(keys)]
+    return list(zip(keys, manifests)), (keys[-1] if keys else cursor)
+
+
+async def write_checkpoint() -> None:
+    """Snapshot the log state, so new processes restore it instead of replaying every manifest, and delete
+    the checkpoints it supersedes. Only the scheduler's lease holder runs it (the ``checkpoint`` job).
+    Writes nothing while the log is empty.
+    """
+    state = await _refresh()
+    if state.cursor is None:
+        return
+    key = f"{CHECKPOINTS_PREFIX}{state.cursor.removeprefix(COMMITS_PREFIX)}"
+    await put_bytes(key, json.dumps(state.snapshot()).encode())
+    older = [k for k in await list_keys(CHECKPOINTS_PREFIX) if k < key]
+    await delete_many(older[: max(len(older) - CHECKPOINTS_KEPT, 0)])
+
+
+class Transaction:
+    """Pending writes of one commit: files to add and data keys they supersede."""
+
+    def __init__(self):
+        self.txn_id = uuid4().hex
+        self.actions: list[dict] = []
+        self._files: list[tuple[str, bytes]] = []
+        self._claims: list[tuple[str, str, int]] = []
+        self.committed_before: str | None = None
+
+    def data_key(self, stem: str) -> str:
+        """Key of a data file written by this transaction, tagged with its id."""
+        return f"{stem}-{self.txn_id}.parquet"
+
+    def add(self, record_type: str, record_id: str, key: str, body: bytes, scopes: list[str] | None = None) -> None:
+        """Add a data file. ``scopes`` (``user_id=<id>``, ``household_id=<id>``) name whose data it changes."""
+        self._files.append((key, body))
+        action: dict[str, Any] = {"op": "add", "record_type": record_type, "record_id": str(record_id), "key": key}
+        if scopes:
+            action["scopes"] = scopes
+        self.actions.append(action)
+
+    def remove(self, record_type: str, record_id: str, keys: list[str]) -> None:
+        self.actions.extend(
+            {"op": "remove", "record_type": record_type, "record_id": str(record_id), "key": key} for key in keys
+        )
+
+    def forget(self, record_type: str, record_id: str, keys: list[str]) -> None:
+        """Record that data files were deleted, so processes stop tracking them."""
+        self.actions.extend(
+            {"op": "forget", "record_type": record_type, "record_id": str(record_id), "key": key} for key in keys
+        )
+
+    def fold_committed(self, before: datetime) -> None:
+        """Declare every remaining tagged file written before ``before`` committed. Only valid once the files
+        of transactions that did not commit have been deleted up to then.
+        """
+        self.committed_before = timestamp(before)
+
+    def claim(self, record_type: str, record_id: str, version: int) -> None:
+        """Require that nobody else commits ``version`` of this record."""
+        self._claims.append((record_type, str(record_id), int(version)))
+
+    async def _claim(self, record_type: str, record_id: str, version: int) -> str:
+        key = f"{VERSIONS_PREFIX}{record_type}/{record_id}/{version:012d}"
+        body = self.txn_id.encode()
+        if await put_conditional(key, body):
+            return key
+
+        # Taken: only an abandoned claim (its transaction never committed) may be taken over
+        owner, etag, claimed_at = await get_with_etag(key)
+        state = await _refresh()
+        abandoned = owner.decode() not in state.committed and datetime.now(timezone.utc) - claimed_at > CLAIM_TIMEOUT
+        if abandoned and await put_conditional(key, body, if_match=etag):
+            return key
+        raise HTTPException(
+            status_code=412, detail=f"{record_type[:-1].capitalize()} {record_id} was modified concurrently"
+        )
+
+    async def commit(self) -> str | None:
+        if not self.actions and self.committed_before is None:
+            return None
+        claimed = await asyncio.gather(*(self._claim(*claim) for claim in self._claims), return_exceptions=True)
+        failures = [c for c in claimed if isinstance(c, BaseException)]
+        if failures:
+            # Release what we did claim so those records are not blocked until the claims time out
+            await delete_many([c for c in claimed if isinstance(c, str)])
+            raise failures[0]
+        # Files stamped before an orphan sweep's cutoff would be taken for committed ones (see ``LogState``):
+        # a transaction that ran that long writes nothing
+        too_old = timestamp(datetime.now(timezone.utc) - CLAIM_TIMEOUT + SETTLE_WINDOW)
+        if any((_written(key) or too_old) < too_old for key, _ in self._files):
+            await delete_many([c for c in claimed if isinstance(c, str)])
+            raise HTTPException(status_code=503, detail="Transaction took too long to commit; please retry")
+        await asyncio.gather(*(put_bytes(key, body) for key, body in self._files))
+
+        now = datetime.now(timezone.utc)
+        commit_key = f"{COMMITS_PREFIX}{timestamp(now)}-{self.txn_id}.json"
+        manifest = {"txn": self.txn_id, "committed_at": now.isoformat(), "actions": self.actions}
+        if self.committed_before is not None:
+            manifest["committed_before"] = self.committed_before
+        await put_bytes(commit_key, json.dumps(manifest).encode())
+
+        _state.apply(commit_key, manifest)
+        for record_type in {a["record_type"] for a in self.actions}:
+            invalidate(record_type)
+        await sharedcache.invalidate(sorted(manifest_scopes(manifest)))
+        return commit_key
+
+
+_current_txn: ContextVar[Transaction | None] = ContextVar("transaction", default=None)
+
+
+@asynccontextmanager
+async def transaction():
+    """Group every version store write in the block into one atomic commit.
+
+    Nested blocks join the outermost transaction. If the block raises, nothing is written.
+    Reads inside the block do not see its pending writes.
+    """
+    txn = _current_txn.get()
+    if txn is not None:
+        yield txn
+        return
+
+    txn = Transaction()
+    token = _current_txn.set(txn)
+    try:
+        yield txn
+    finally:
+        _current_txn.reset(token)
+    await txn.commit()
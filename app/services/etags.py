@@ -0,0 +1,39 @@
+import hashlib
+import json
+from fastapi import HTTPException, Request, Response
+from app.services.commitlog import current_state
+
+
+def etag(version) -> str:
+    """Strong ETag of a versioned record."""
+    return f'"{int(version)}"'
+
+
+def check_if_match(if_match: str | None, version) -> None:
+    """Reject the request with 412 unless ``If-Match`` (when sent) names the current version."""
+    if if_match is None:
+        return
+    tags = {tag.strip() for tag in if_match.split(",")}
+    if "*" in tags or etag(version) in tags:
+        return
+    raise HTTPException(status_code=412, detail="Precondition failed: the record has been modified")
+
+
+async def conditional_get(request: Request, response: Response, user: dict, scopes: list[str]) -> Response | None:
+    """Tag a read with the data generation of ``scopes`` (record types or ``<field>=<id>`` scopes).
+
+    Returns a ``304 Not Modified`` response to send instead when ``If-None-Match`` already names it,
+    so unchanged polls are answered from the commit log alone, without reading any data.
+    """
+    state = await current_state()
+    generations = [state.generations.get(scope) for scope in scopes]
+    query = sorted(request.query_params.multi_items())
+    digest = hashlib.sha256(json.dumps([request.url.path, query, str(user["user_id"]), generations]).encode())
+    tag = f'W/"{digest.hexdigest()[:32]}"'
+
+    # Only concrete tags match: "*" would answer 304 without knowing whether the caller holds any representation
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and tag in {t.strip() for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+    return None
@@ -0,0 +1,60 @@
+"""Columnar exports: Parquet files or Arrow IPC streams written batch by batch from Arrow tables."""
+
+from __future__ import annotations
+
+import io
+from typing import TYPE_CHECKING, AsyncIterator, Literal
+from app.lazy import lazy_module
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.models.arrow import arrow_schema
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
+ExportFormat = Literal["ndjson", "parquet", "arrow"]
+
+MEDIA_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.stream"}
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrows"}
+
+
+def export_schema(model: type[BaseModel], columns: list[str]) -> pa.Schema:
+    """``columns`` of ``model``, typed as they are stored."""
+    schema = arrow_schema(model)
+    return pa.schema([schema.field(name) for name in columns])
+
+
+def to_arrow(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    chunk = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return chunk
+
+
+def columnar_response(
+    tables: AsyncIterator[pa.Table], schema: pa.Schema, fmt: Literal["parquet", "arrow"], filename: str
+) -> StreamingResponse:
+    """Stream ``tables`` as one Parquet file (a row group per table) or one Arrow IPC stream."""
+
+    async def chunks():
+        sink = io.BytesIO()
+        writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+        async for table in tables:
+            writer.write_table(table)
+            yield _drain(sink)
+        writer.close()
+        yield _drain(sink)
+
+    return StreamingResponse(
+        chunks(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{EXTENSIONS[fmt]}"'},
+    )
@@ -1,15 +1,15 @@
-from typing import Callable, Optional
+from typing import Awaitable, Callable, Optional
 from fastapi import HTTPException
 from uuid import UUID
-from app.services.storage import load_versions
+from app.services.storage import load_versions_async
 
 
-def fetch_record(
+async def fetch_record(
     record_type: str,
     schema,
     record_id: UUID,
     *,
-    permission_check: Optional[Callable[[dict], None]] = None,
+    permission_check: Optional[Callable[[dict], Awaitable[None]]] = None,
     history: bool = False,
     page: dict | None = None,
     sort_by: str = "updated_at",
@@ -21,12 +21,12 @@ def fetch_record(
     - record_type: e.g., "accounts", "debts", "entries"
     - schema: your Pydantic storage schema (e.g., Debt, Entry)
     - record_id: id as string
-    - permission_check: callable(row_dict) -> None (raise HTTPException if forbidden)
+    - permission_check: async callable(row_dict) -> None (raise HTTPException if forbidden)
     - history: if True, return list[dict] of versions; else return the current row dict
     - page: {"limit": int, "offset": int} when history=True
     - sort_by: column to sort versions desc
     """
-    df = load_versions(record_type, schema, record_id=record_id)
+    df = await load_versions_async(record_type, schema, record_id=record_id)
     if df.empty:
         raise HTTPException(status_code=404, detail=f"{record_type[:-1].capitalize()} not found")
 
@@ -37,7 +37,7 @@ def fetch_record(
     # Permission check on the current row
     row = current.iloc[0].to_dict()
     if permission_check:
-        permission_check(row)
+        await permission_check(row)
 
     if not history:
         return row
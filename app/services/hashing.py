@@ -0,0 +1,77 @@
+"""
+Password hashing off the event loop and off the API's threads.
+
+bcrypt is deliberately slow (about 250 ms of CPU per call). Calls run in a process pool with one worker
+per core (``HASH_WORKERS`` overrides it), so a burst of logins queues there instead of holding the
+threads and the GIL every other endpoint needs. The queue is bounded: with ``HASH_QUEUE_LIMIT`` calls
+already waiting for a worker, new ones are turned away with a 503 rather than waiting for minutes.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from fastapi import HTTPException
+from app.config import settings
+from app.services.metrics import BCRYPT_SECONDS, HASH_QUEUE_DEPTH, HASH_REJECTED
+
+_pool: ProcessPoolExecutor | None = None
+_pending = 0  # calls submitted and not finished
+
+
+def workers() -> int:
+    return settings.hash_workers or os.cpu_count() or 1
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Workers start from a fresh forkserver process, not a copy of the threaded server
+        _pool = ProcessPoolExecutor(workers(), mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+
+def _hash(password: bytes) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+async def _run(operation: str, fn, *args):
+    global _pool, _pending
+    if _pending - workers() >= settings.hash_queue_limit:
+        HASH_REJECTED.labels(operation).inc()
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
+    _pending += 1
+    HASH_QUEUE_DEPTH.set(max(_pending - workers(), 0))
+    try:
+        with BCRYPT_SECONDS.labels(operation).time():
+            return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
+    except BrokenProcessPool:
+        # A worker died (killed, out of memory): start a new pool for the next call
+        _pool = None
+        raise
+    finally:
+        _pending -= 1
+        HASH_QUEUE_DEPTH.set(max(_pending - workers(), 0))
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password with bcrypt in the pool."""
+    return (await _run("hash", _hash, password.encode("utf-8"))).decode("utf-8")
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    """Check a password against a bcrypt hash in the pool."""
+    return await _run("verify", _check, password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -0,0 +1,200 @@
+"""
+Hot tables: small record types that nearly every request reads in full (users, memberships, accounts,
+households), kept in memory by each process.
+
+``warm_up`` downloads them once at startup; afterwards only the commit log delta is applied: manifests
+listed since the last refresh name the data files each commit added, and only those are downloaded.
+Which versions are visible or current is still decided by the request's log state, so a read served
+from memory matches a read from storage. A table that is behind the log state is caught up before it
+serves a read, and falls back to storage if it cannot be.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import logging
+import weakref
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from app.lazy import lazy_module
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+from app.models.arrow import arrow_schema, conform
+from app.models.schemas.account import Account
+from app.models.schemas.household import Household
+from app.models.schemas.membership import UserAccount, UserHousehold
+from app.models.schemas.user import User
+from app.services.commitlog import COMMITS_PREFIX, LogState, current_state, settle_point
+from app.services.objectstore import get_many, list_keys
+from app.services.readcache import request_scope
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
+HOT_TABLES: dict[str, type[BaseModel]] = {
+    "users": User,
+    "user_households": UserHousehold,
+    "user_accounts": UserAccount,
+    "accounts": Account,
+    "households": Household,
+}
+
+logger = logging.getLogger("app.hottables")
+
+
+@dataclass
+class HotTable:
+    model: type[BaseModel]
+    files: dict[str, pa.Table] = field(default_factory=dict)  # data key -> its rows
+    generation: str = ""  # latest manifest key applied that touches the record type
+    version: int = 0  # bumped whenever files are added
+    _built: tuple[tuple, pd.DataFrame] | None = None
+
+    def add(self, keys: list[str], bodies: list[bytes]) -> None:
+        for key, body in zip(keys, bodies):
+            self.files[key] = conform(pq.read_table(io.BytesIO(body)), self.model)
+        if keys:
+            self.version += 1
+
+    def drop(self, keys: list[str]) -> None:
+        dropped = [key for key in keys if self.files.pop(key, None) is not None]
+        if dropped:
+            self.version += 1
+
+    def frame(self, state: LogState, record_type: str) -> pd.DataFrame:
+        """All visible versions, ``is_current`` overlaid from the log, as ``load_versions_async`` returns them."""
+        token = (self.version, state.generations.get(record_type))
+        if self._built is None or self._built[0] != token:
+            tables = [
+                _not_current(table) if key in state.stale else table
+                for key, table in sorted(self.files.items())
+                if state.is_visible(key)
+            ]
+            df = pa.concat_tables(tables).to_pandas() if tables else arrow_schema(self.model).empty_table().to_pandas()
+            self._built = (token, df)
+        return self._built[1].copy()
+
+
+def _not_current(table: pa.Table) -> pa.Table:
+    idx = table.schema.get_field_index("is_current")
+    return table.set_column(idx, table.schema.field(idx), pa.array([False] * table.num_rows, type=pa.bool_()))
+
+
+_tables: dict[str, HotTable] = {}
+_cursor: str | None = None  # greatest manifest key applied
+_seen: set[str] = set()  # manifest keys applied, within the settle window
+_ready = False
+# One refresh at a time per event loop: requests that find a table behind queue for the one in flight
+_refresh_locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock] = weakref.WeakKeyDictionary()
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def reset() -> None:
+    """Forget every table (tests, or after the bucket was swapped)."""
+    global _cursor, _ready
+    _tables.clear()
+    _seen.clear()
+    _cursor = None
+    _ready = False
+
+
+async def warm_up() -> None:
+    """Download every hot table in full and remember where in the log they stand."""
+    global _cursor, _ready
+    state = await current_state()
+    listed = await asyncio.gather(*(list_keys(f"{record_type}/") for record_type in HOT_TABLES))
+    for (record_type, model), keys in zip(HOT_TABLES.items(), listed):
+        keys = [k for k in keys if state.is_visible(k)]
+        table = HotTable(model, generation=state.generations.get(record_type, ""))
+        table.add(keys, await get_many(keys))
+        _tables[record_type] = table
+    _cursor = state.cursor
+    _seen.update(state.seen)
+    _ready = True
+
+
+def _refresh_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _refresh_locks.get(loop)
+    if lock is None:
+        lock = _refresh_locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def refresh() -> None:
+    """Apply the commits listed since the last refresh: download the files they add to hot tables."""
+    async with _refresh_lock():
+        await _apply_new_commits()
+
+
+async def _apply_new_commits() -> None:
+    global _cursor
+    if not _tables:
+        return
+    keys = [k for k in await list_keys(COMMITS_PREFIX, start_after=settle_point(_cursor)) if k not in _seen]
+    manifests = [json.loads(body) for body in await get_many(keys)]
+
+    added: dict[str, list[str]] = {record_type: [] for record_type in _tables}
+    deleted: dict[str, list[str]] = {record_type: [] for record_type in _tables}
+    generations: dict[str, str] = {}
+    for commit_key, manifest in zip(keys, manifests):
+        for action in manifest["actions"]:
+            table = _tables.get(action["record_type"])
+            if table is None:
+                continue
+            generations[action["record_type"]] = max(generations.get(action["record_type"], ""), commit_key)
+            if action["op"] == "add" and action["key"] not in table.files:
+                added[action["record_type"]].append(action["key"])
+            elif action["op"] == "forget":
+                deleted[action["record_type"]].append(action["key"])
+    for record_type, old_keys in deleted.items():
+        _tables[record_type].drop(old_keys)
+    for record_type, new_keys in added.items():
+        _tables[record_type].add(new_keys, await get_many(new_keys))
+    # Only once every file is in: a refresh that fails part way leaves the tables behind, not wrong
+    for record_type, generation in generations.items():
+        _tables[record_type].generation = max(_tables[record_type].generation, generation)
+
+    _seen.update(keys)
+    if keys and (_cursor is None or keys[-1] > _cursor):
+        _cursor = keys[-1]
+    settle = settle_point(_cursor)
+    if settle is not None:
+        _seen.difference_update({k for k in _seen if k <= settle})
+
+
+async def read(record_type: str, schema, state: LogState) -> pd.DataFrame | None:
+    """Every visible version of a hot table as of ``state``, or None when it must be read from storage."""
+    table = _tables.get(record_type)
+    if table is None or table.model is not schema:
+        return None
+    wanted = state.generations.get(record_type, "")
+    if table.generation < wanted:
+        async with _refresh_lock():
+            # Requests that queued behind a refresh usually find the table caught up by it
+            if table.generation < wanted:
+                await _apply_new_commits()
+        if table.generation < wanted:
+            return None
+    return table.frame(state, record_type)
+
+
+async def keep_fresh(interval: float) -> None:
+    """Warm up, then refresh every ``interval`` seconds until cancelled. Failures are retried."""
+    while True:
+        try:
+            with request_scope():
+                await (refresh() if _ready else warm_up())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("hot table %s failed", "refresh" if _ready else "warm-up")
+        await asyncio.sleep(interval)
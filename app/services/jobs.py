@@ -0,0 +1,65 @@
+"""
+Jobs started by a request and finished after its response: the caller gets a job id right away and
+polls for the outcome with it. Job records live in the store (``_jobs/<id>.json``), so any worker can answer.
+"""
+
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+from uuid import UUID, uuid4
+from botocore.exceptions import ClientError
+from fastapi import BackgroundTasks, HTTPException
+from app.services.objectstore import get_bytes, put_bytes
+from app.services.readcache import request_scope
+
+JOBS_PREFIX = "_jobs/"
+
+logger = logging.getLogger("app.jobs")
+
+
+async def _save(job: dict) -> None:
+    await put_bytes(f"{JOBS_PREFIX}{job['job_id']}.json", json.dumps(job, default=str).encode())
+
+
+async def start_job(background: BackgroundTasks, kind: str, owner_id: str, work: Callable[[], Awaitable[Any]]) -> dict:
+    """Record a pending job, run ``work`` once the response is sent, and return the job record."""
+    job = {
+        "job_id": uuid4().hex,
+        "kind": kind,
+        "owner_id": str(owner_id),
+        "status": "running",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    await _save(job)
+
+    async def run():
+        try:
+            with request_scope():
+                outcome = {"status": "done", "result": await work()}
+        except HTTPException as exc:
+            outcome = {"status": "failed", "error": exc.detail, "status_code": exc.status_code}
+        except Exception:
+            logger.exception("job %s (%s) failed", job["job_id"], kind)
+            outcome = {"status": "failed", "error": "Internal error", "status_code": 500}
+        await _save({**job, **outcome, "finished_at": datetime.now(timezone.utc).isoformat()})
+
+    background.add_task(run)
+    return job
+
+
+async def get_job(job_id: str) -> dict:
+    """A job record. The id is an unguessable capability handed only to the caller who started the job:
+    polling needs no token, since a job such as deleting one's own account revokes it.
+    """
+    try:
+        key = f"{JOBS_PREFIX}{UUID(hex=job_id).hex}.json"
+        job = json.loads(await get_bytes(key))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("owner_id", None)
+    return job
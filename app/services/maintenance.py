@@ -0,0 +1,71 @@
+"""Periodic maintenance jobs. Each is a plain coroutine returning how much work it did; the scheduler
+(or ``python -m scripts.run_job``) decides when to run it.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+from app.models.schemas.user import PasswordResetToken
+from app.services import tokens
+from app.services.commitlog import (
+    CLAIM_TIMEOUT,
+    SETTLE_WINDOW,
+    VERSIONS_PREFIX,
+    current_state,
+    transaction,
+    transaction_of,
+    write_checkpoint,
+)
+from app.services.objectstore import delete_many, list_keys, list_objects
+from app.services.storage import purge_expired_records_async, written_at
+
+
+async def checkpoint() -> int:
+    """Write a checkpoint of the commit log state (none while the log is empty)."""
+    if (await current_state()).cursor is None:
+        return 0
+    await write_checkpoint()
+    return 1
+
+
+async def purge_expired_tokens() -> int:
+    """Delete spent refresh tokens and password reset tokens: expired, used or revoked ones."""
+    reset_lifetime = timedelta(hours=settings.reset_token_expire_hours)
+    reset = await purge_expired_records_async("password_reset_tokens", PasswordResetToken, "token_id", reset_lifetime)
+    return await tokens.purge_expired() + len(reset)
+
+
+async def sweep_orphans() -> int:
+    """Delete data files of transactions that never committed and are older than ``CLAIM_TIMEOUT``.
+
+    A writer that died between uploading its files and writing the manifest leaves them behind:
+    they are invisible to readers but still listed (and paid for) by every scan of their table.
+    Every tagged file left from before the cutoff has then committed (a transaction running that long
+    uploads nothing), which the log records so that processes stop keeping the ids of those transactions.
+    """
+    cutoff = datetime.now(timezone.utc) - CLAIM_TIMEOUT
+    _, prefixes = await list_objects("", delimiter="/")
+    tables = [p for p in prefixes if not p.startswith("_")]
+    listed = await asyncio.gather(*(list_keys(table) for table in tables))
+    keys = [k for table_keys in listed for k in table_keys if transaction_of(k)]
+    # Resolve the log after listing: a transaction committed in between is seen as committed
+    state = await current_state()
+    orphans = [k for k in keys if not state.is_visible(k) and written_at(k) < cutoff]
+    await delete_many(orphans)
+    async with transaction() as txn:
+        # Allow for writers whose clocks lag, as the settle window does for manifests
+        txn.fold_committed(cutoff - SETTLE_WINDOW)
+    return len(orphans)
+
+
+async def sweep_claims() -> int:
+    """Delete version claims (``_versions/``) older than ``CLAIM_TIMEOUT``.
+
+    A claim only stops a writer that read the previous version from committing the same one; past the
+    timeout nobody still racing for it is expected, and an abandoned claim may be taken over anyway.
+    """
+    cutoff = datetime.now(timezone.utc) - CLAIM_TIMEOUT
+    claims, _ = await list_objects(VERSIONS_PREFIX)
+    done = [claim["Key"] for claim in claims if claim["LastModified"] < cutoff]
+    await delete_many(done)
+    return len(done)
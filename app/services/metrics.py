@@ -0,0 +1,68 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Route labels use the matched route template, never the raw path, to keep label cardinality bounded.
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+S3_LATENCY = Histogram(
+    "s3_operation_duration_seconds",
+    "Latency of individual S3 calls by operation (list, get, put).",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+S3_BYTES = Counter("s3_bytes_total", "Bytes transferred to and from S3.", ["direction"])
+
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Cache lookups by cache name and result (hit, miss).", ["cache", "result"]
+)
+
+AUDIT_WRITES_IN_FLIGHT = Gauge("audit_writes_in_flight", "Audit log writes currently waiting on storage.")
+
+BCRYPT_SECONDS = Histogram(
+    "bcrypt_duration_seconds",
+    "Time spent hashing or verifying passwords with bcrypt.",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+THROTTLED = Counter("throttled_requests_total", "Requests turned away by a rate limit, by limit.", ["scope"])
+HASH_QUEUE_DEPTH = Gauge("password_hash_queue_depth", "Password hashing calls waiting for a worker process.")
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Password hashing calls turned away because the queue was full.", ["operation"]
+)
+
+JOB_RUNS = Counter("job_runs_total", "Maintenance job runs by job and result (ok, error).", ["job", "result"])
+
+JOB_DURATION = Histogram(
+    "job_duration_seconds",
+    "Maintenance job run time.",
+    ["job"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0),
+)
+
+JOB_LAST_SUCCESS = Gauge("job_last_success_timestamp_seconds", "When each maintenance job last succeeded.", ["job"])
+
+SCHEDULER_LEADER = Gauge("scheduler_leader", "1 while this process holds the scheduler lease.")
+
+
+def observe_s3_call(kind: str, seconds: float, nbytes: int = 0) -> None:
+    S3_LATENCY.labels(kind).observe(seconds)
+    if kind == "get":
+        S3_BYTES.labels("read").inc(nbytes)
+    elif kind == "put":
+        S3_BYTES.labels("written").inc(nbytes)
+
+
+def observe_cache(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render() -> tuple[bytes, str]:
+    """Return the current metrics in the Prometheus text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,189 @@
+import asyncio
+import time
+import weakref
+from contextlib import AsyncExitStack
+from datetime import datetime
+from functools import cache
+from typing import Any, Coroutine, TypeVar
+from botocore.exceptions import ClientError
+from app.config import settings
+from app.services.telemetry import record_call
+
+BUCKET_NAME = settings.s3_bucket
+
+T = TypeVar("T")
+
+# One client per event loop: aiohttp sessions cannot be shared across loops.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+
+@cache
+def _session():
+    # aiobotocore (and aiohttp behind it) is imported when the first client is opened, not with the app
+    from aiobotocore.session import get_session
+
+    return get_session()
+
+
+async def _open_client():
+    # The first import takes most of a second; in a worker thread it does not stall requests being served
+    session = await asyncio.to_thread(_session)
+    from aiobotocore.config import AioConfig
+
+    stack = AsyncExitStack()
+    client = await stack.enter_async_context(
+        session.create_client(
+            "s3",
+            region_name=settings.aws_region,
+            endpoint_url=settings.s3_endpoint_url,
+            config=AioConfig(max_pool_connections=settings.s3_max_pool_connections),
+        )
+    )
+    return client, stack
+
+
+async def get_client():
+    """Return the S3 client bound to the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    task = _clients.get(loop)
+    if task is None:
+        task = loop.create_task(_open_client())
+        _clients[loop] = task
+    try:
+        client, _ = await task
+    except BaseException:
+        _clients.pop(loop, None)
+        raise
+    return client
+
+
+async def close_client() -> None:
+    """Close the client bound to the running event loop (if any)."""
+    task = _clients.pop(asyncio.get_running_loop(), None)
+    if task is None:
+        return
+    _, stack = await task
+    await stack.aclose()
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a storage coroutine to completion from synchronous code (scripts, tests)."""
+
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_client()
+
+    return asyncio.run(runner())
+
+
+async def list_objects(
+    prefix: str, start_after: str | None = None, limit: int | None = None, delimiter: str | None = None
+) -> tuple[list[dict], list[str]]:
+    """List the objects under ``prefix`` in lexical order, optionally only those after ``start_after``, and
+    with ``delimiter`` the common prefixes they are grouped under instead.
+
+    With ``limit``, listing stops as soon as that many objects have been collected.
+    """
+    client = await get_client()
+    objects: list[dict] = []
+    prefixes: list[str] = []
+    kwargs: dict[str, Any] = {"Bucket": BUCKET_NAME, "Prefix": prefix}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    while True:
+        if limit is not None:
+            kwargs["MaxKeys"] = min(1000, limit - len(objects))
+        started = time.perf_counter()
+        resp = await client.list_objects_v2(**kwargs)
+        record_call("list", time.perf_counter() - started)
+        objects.extend(resp.get("Contents", []))
+        prefixes.extend(p["Prefix"] for p in resp.get("CommonPrefixes", []))
+        if not resp.get("IsTruncated") or (limit is not None and len(objects) >= limit):
+            return objects, prefixes
+        kwargs["ContinuationToken"] = resp["NextContinuationToken"]
+
+
+async def list_keys(prefix: str, start_after: str | None = None, limit: int | None = None) -> list[str]:
+    """List keys under ``prefix`` in lexical order, optionally only those after ``start_after``.
+
+    With ``limit``, listing stops as soon as that many keys have been collected.
+    """
+    objects, _ = await list_objects(prefix, start_after=start_after, limit=limit)
+    return [obj["Key"] for obj in objects]
+
+
+async def get_bytes(key: str) -> bytes:
+    client = await get_client()
+    started = time.perf_counter()
+    resp = await client.get_object(Bucket=BUCKET_NAME, Key=key)
+    async with resp["Body"] as stream:
+        body = await stream.read()
+    record_call("get", time.perf_counter() - started, len(body))
+    return body
+
+
+async def get_many(keys: list[str]) -> list[bytes]:
+    """Fetch several objects concurrently, preserving the order of ``keys``."""
+    return await asyncio.gather(*(get_bytes(key) for key in keys))
+
+
+async def get_existing(keys: list[str]) -> list[bytes | None]:
+    """Like ``get_many``, with None for the objects that no longer exist."""
+
+    async def get(key: str) -> bytes | None:
+        try:
+            return await get_bytes(key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise
+
+    return await asyncio.gather(*(get(key) for key in keys))
+
+
+async def put_bytes(key: str, body: bytes) -> None:
+    client = await get_client()
+    started = time.perf_counter()
+    await client.put_object(Bucket=BUCKET_NAME, Key=key, Body=body)
+    record_call("put", time.perf_counter() - started, len(body))
+
+
+async def get_with_etag(key: str) -> tuple[bytes, str, datetime]:
+    """Fetch an object together with its ETag and last-modified time."""
+    client = await get_client()
+    started = time.perf_counter()
+    resp = await client.get_object(Bucket=BUCKET_NAME, Key=key)
+    async with resp["Body"] as stream:
+        body = await stream.read()
+    record_call("get", time.perf_counter() - started, len(body))
+    return body, resp["ETag"], resp["LastModified"]
+
+
+async def put_conditional(key: str, body: bytes, *, if_match: str | None = None) -> bool:
+    """PUT only if ``key`` does not exist yet, or still has ETag ``if_match``.
+
+    Returns False instead of raising when the precondition does not hold.
+    """
+    client = await get_client()
+    condition = {"IfMatch": if_match} if if_match else {"IfNoneMatch": "*"}
+    started = time.perf_counter()
+    try:
+        await client.put_object(Bucket=BUCKET_NAME, Key=key, Body=body, **condition)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict", "NoSuchKey"):
+            return False
+        raise
+    finally:
+        record_call("put", time.perf_counter() - started, len(body))
+    return True
+
+
+async def delete_many(keys: list[str]) -> None:
+    client = await get_client()
+    for start in range(0, len(keys), 1000):
+        batch = [{"Key": key} for key in keys[start : start + 1000]]
+        await client.delete_objects(Bucket=BUCKET_NAME, Delete={"Objects": batch, "Quiet": True})
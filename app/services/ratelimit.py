@@ -0,0 +1,62 @@
+"""
+Attempt throttling for endpoints that are expensive to call (login costs a bcrypt check).
+
+Attempts are counted in sliding windows kept in the shared cache tier, so with a Redis backend every
+worker and replica counts the same attempts; with the memory backend each process counts its own. A
+window is estimated from two fixed windows: the current count plus the previous one, weighted by how
+much of it still overlaps. Identities are hashed before they become cache keys.
+"""
+
+import hashlib
+import logging
+import math
+import time
+from fastapi import HTTPException
+from app.services.metrics import THROTTLED
+from app.services.sharedcache import get_backend
+
+logger = logging.getLogger("app.ratelimit")
+
+
+def _key(scope: str, identity: str, window: int, index: int) -> str:
+    digest = hashlib.sha256(identity.encode()).hexdigest()[:32]
+    return f"rate:{scope}:{window}:{digest}:{index}"
+
+
+async def _attempts(scope: str, identity: str, window: int, amount: int) -> tuple[float, float]:
+    """Add ``amount`` attempts; returns the attempts in the last ``window`` seconds and when the window turns."""
+    now = time.time()
+    index, into = divmod(now, window)
+    backend = get_backend()
+    current = await backend.incr(_key(scope, identity, window, int(index)), amount, 2 * window)
+    previous = await backend.incr(_key(scope, identity, window, int(index) - 1), 0, 2 * window)
+    return current + previous * (1 - into / window), window - into
+
+
+async def check(scope: str, identity: str, limit: int, window: int, count: bool = True) -> None:
+    """429 when ``identity`` made ``limit`` attempts within ``window`` seconds. This attempt is counted
+    unless ``count`` is False (``record`` counts it later, e.g. only once it has failed).
+
+    A cache outage never blocks anyone: the check is skipped.
+    """
+    counted = 1 if count else 0
+    try:
+        attempts, turns_in = await _attempts(scope, identity, window, counted)
+    except Exception:
+        logger.warning("rate limit check failed for %s", scope, exc_info=True)
+        return
+    if attempts - counted >= limit:
+        THROTTLED.labels(scope).inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(turns_in)))},
+        )
+
+
+async def record(scope: str, identity: str, window: int) -> None:
+    """Count an attempt checked with ``count=False``."""
+    try:
+        await _attempts(scope, identity, window, 1)
+    except Exception:
+        logger.warning("rate limit update failed for %s", scope, exc_info=True)
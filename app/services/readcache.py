@@ -0,0 +1,72 @@
+from __future__ import annotations
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Awaitable, Callable, Hashable, TypeVar
+from app.lazy import lazy_module
+from fastapi import Request
+from app.services.metrics import observe_cache
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
+T = TypeVar("T")
+
+# Request-scoped memo of storage reads: key -> task producing the result.
+# Keys start with the record_type they read (or a reserved name such as "_commits").
+_read_cache: ContextVar[dict | None] = ContextVar("read_cache", default=None)
+
+
+async def once_per_request(key: tuple[Hashable, ...], loader: Callable[[], Awaitable[T]]) -> T:
+    """Run ``loader`` at most once per request for ``key``; outside a request it always runs.
+
+    Concurrent callers share the in-flight call and its result.
+    """
+    cache = _read_cache.get()
+    if cache is None:
+        return await loader()
+
+    task = cache.get(key)
+    observe_cache("request", task is not None)
+    if task is None:
+        task = asyncio.ensure_future(loader())
+        cache[key] = task
+    try:
+        return await task
+    except BaseException:
+        if cache.get(key) is task:
+            del cache[key]
+        raise
+
+
+async def cached_read(key: tuple[Hashable, ...], loader: Callable[[], Awaitable[pd.DataFrame]]) -> pd.DataFrame:
+    """Memoize a DataFrame read per request. Every caller gets its own copy, so mutating the
+    result never leaks into later reads.
+    """
+    df = await once_per_request(key, loader)
+    return df if _read_cache.get() is None else df.copy()
+
+
+def invalidate(record_type: str) -> None:
+    """Forget every cached read of ``record_type`` made in the current request."""
+    cache = _read_cache.get()
+    if cache:
+        for key in [k for k in cache if k[0] == record_type]:
+            del cache[key]
+
+
+@contextmanager
+def request_scope():
+    """Enable read memoization for the enclosed code (one request, one job run)."""
+    token = _read_cache.set({})
+    try:
+        yield
+    finally:
+        _read_cache.reset(token)
+
+
+async def request_cache_middleware(request: Request, call_next):
+    with request_scope():
+        return await call_next(request)
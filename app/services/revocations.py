@@ -0,0 +1,59 @@
+"""
+Revoked refresh tokens, kept in memory by each process.
+
+A refresh token is revoked when a commit supersedes it: rotation, suspension, password change or account
+deletion. The set is built from the superseded keys of the commit log state the process already keeps,
+and extended with those of every later commit (including the process's own rotations, applied as they
+commit), so rejecting a revoked or reused token is a set lookup. An id is dropped once its token has
+expired, since the token's signature check rejects it from then on.
+"""
+
+import itertools
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+from app.services.commitlog import LogState, transaction_of
+from app.services.storage import written_at
+
+RECORD_PREFIX = "refresh_tokens/"
+# How often ids of expired tokens are dropped
+PRUNE_INTERVAL = timedelta(minutes=10)
+
+_revoked: dict[str, datetime] = {}  # token id -> when the token expires, at the latest
+_source: LogState | None = None  # log state the set was built from
+_synced = 0  # superseded keys of that state already applied
+_compactions = 0  # superseded keys that state had dropped when the set was built
+_pruned_at = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _token_of(key: str) -> str:
+    return key.split("/refresh_token_id=", 1)[1].split("/", 1)[0]
+
+
+def _sync(state: LogState) -> None:
+    """Apply the keys superseded since the last sync. ``state.stale`` grows in insertion order, and is rebuilt
+    from when the state drops the keys of deleted files: their tokens are gone, so no longer revoked here.
+    """
+    global _source, _synced, _compactions, _pruned_at
+    now = datetime.now(timezone.utc)
+    if state is not _source or state.compactions != _compactions:
+        _revoked.clear()
+        _source, _synced, _compactions = state, 0, state.compactions
+    if len(state.stale) > _synced:
+        # Tokens expire one lifetime after they are written, at the latest. Names of files from before
+        # the log may not carry the write time: those are kept one lifetime from now.
+        lifetime = timedelta(days=settings.refresh_token_expire_days)
+        for key in itertools.islice(state.stale, _synced, None):
+            if key.startswith(RECORD_PREFIX):
+                _revoked[_token_of(key)] = (written_at(key) if transaction_of(key) else now) + lifetime
+        _synced = len(state.stale)
+
+    if now - _pruned_at > PRUNE_INTERVAL:
+        for token_id in [t for t, expires in _revoked.items() if expires < now]:
+            del _revoked[token_id]
+        _pruned_at = now
+
+
+def is_revoked(token_id: str, state: LogState) -> bool:
+    """Whether a commit known to ``state`` revoked the token."""
+    _sync(state)
+    return str(token_id) in _revoked
@@ -1,9 +1,16 @@
-from typing import Any, Dict, Optional
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, Optional
 from uuid import UUID
+from app.lazy import lazy_module
 from fastapi import HTTPException
 from app.models.enums import Role
 from app.models.schemas.membership import UserAccount, UserHousehold
-from app.services.storage import load_versions
+from app.services.storage import load_versions_async, shared_read
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
 
 ROLE_WEIGHT: Dict[Role, int] = {Role.reader: 1, Role.member: 2, Role.admin: 3}
 
@@ -12,34 +19,45 @@ def parse_role(v: Role | str) -> Role:
     return v if isinstance(v, Role) else Role(v)
 
 
-def get_membership(user_id: UUID, household_id: UUID) -> Optional[Dict[str, Any]]:
-    df = load_versions("user_households", UserHousehold)
-    if df.empty:
-        return None
-    df = df[
-        (df["is_current"])
-        & (~df.get("is_deleted", False).fillna(False))
-        & (df["user_id"].astype(str) == str(user_id))
-        & (df["household_id"].astype(str) == str(household_id))
-    ]
-    if df.empty:
-        return None
-    df = df.copy()
-    df["role_enum"] = df["role"].apply(parse_role)
-    df["weight"] = df["role_enum"].map(ROLE_WEIGHT)
-    row = df.sort_values("weight", ascending=False).iloc[0].to_dict()
-    row["role"] = row.get("role_enum")
-    return row
+async def user_memberships(user_id: UUID | str) -> Dict[str, Any]:
+    """The user's membership row per household (highest role wins) and the ids of the accounts assigned
+    to them. Shared across requests until a membership or assignment changes.
+    """
+
+    async def load():
+        hh = await load_versions_async("user_households", UserHousehold)
+        households: Dict[str, Dict[str, Any]] = {}
+        if not hh.empty:
+            hh = hh[(hh["is_current"]) & (~hh.get("is_deleted", False).fillna(False)) & (hh["user_id"] == str(user_id))]
+            for row in hh.to_dict(orient="records"):
+                row["role"] = parse_role(row["role"])
+                best = households.get(row["household_id"])
+                if best is None or ROLE_WEIGHT[row["role"]] > ROLE_WEIGHT[best["role"]]:
+                    households[row["household_id"]] = row
+
+        ua = await load_versions_async("user_accounts", UserAccount)
+        accounts: set[str] = set()
+        if not ua.empty:
+            ua = ua[(ua["is_current"]) & (~ua.get("is_deleted", False).fillna(False)) & (ua["user_id"] == str(user_id))]
+            accounts = set(ua["account_id"])
+        return {"households": households, "accounts": accounts}
+
+    return await shared_read("memberships", (str(user_id),), ["user_households", "user_accounts"], load)
+
 
+async def get_membership(user_id: UUID, household_id: UUID) -> Optional[Dict[str, Any]]:
+    row = (await user_memberships(user_id))["households"].get(str(household_id))
+    return dict(row) if row is not None else None
 
-def require_household_role(user: Dict[str, Any], household_id: UUID, required_role: Role | str) -> None:
+
+async def require_household_role(user: Dict[str, Any], household_id: UUID, required_role: Role | str) -> None:
     if user.get("is_superuser"):
         return
 
     u_id = user.get("user_id")
     u_uuid = u_id if isinstance(u_id, UUID) else UUID(str(u_id))
 
-    _mem = get_membership(u_uuid, household_id)
+    _mem = await get_membership(u_uuid, household_id)
     if _mem is None:
         raise HTTPException(
             status_code=403, detail=f"{parse_role(required_role).value} role required for this household"
@@ -58,12 +76,14 @@ def require_household_role(user: Dict[str, Any], household_id: UUID, required_ro
         raise HTTPException(status_code=403, detail=f"{required.value} role required for this household")
 
 
-def require_account_access(user: Dict[str, Any], account: Dict[str, Any], min_role: Role | str = Role.member) -> None:
+async def require_account_access(
+    user: Dict[str, Any], account: Dict[str, Any], min_role: Role | str = Role.member
+) -> None:
     hh_id_val = account["household_id"]
     hh_uuid = hh_id_val if isinstance(hh_id_val, UUID) else UUID(str(hh_id_val))
 
     # Enforce household-level permission
-    require_household_role(user, hh_uuid, required_role=min_role)
+    await require_household_role(user, hh_uuid, required_role=min_role)
 
     if user.get("is_superuser"):
         return
@@ -71,7 +91,7 @@ def require_account_access(user: Dict[str, Any], account: Dict[str, Any], min_ro
     u_id = user.get("user_id")
     u_uuid = u_id if isinstance(u_id, UUID) else UUID(str(u_id))
 
-    _mem = get_membership(u_uuid, hh_uuid)
+    _mem = await get_membership(u_uuid, hh_uuid)
     mem_role_obj: Optional[Role] = None
     if _mem is not None:
         mem: Dict[str, Any] = _mem  # <- promote to non-optional
@@ -83,22 +103,11 @@ def require_account_access(user: Dict[str, Any], account: Dict[str, Any], min_ro
     if mem_role_obj == Role.admin:
         return
 
-    acc_id_val = account["account_id"]
-    acc_uuid_str = str(acc_id_val)
-
-    ua = load_versions("user_accounts", UserAccount)
-    assigned = False
-    if not ua.empty:
-        ua = ua[(ua["is_current"]) & (~ua.get("is_deleted", False).fillna(False))]
-        assigned = not ua[
-            (ua["user_id"].astype(str) == str(u_uuid)) & (ua["account_id"].astype(str) == acc_uuid_str)
-        ].empty
-
-    if not assigned:
+    if str(account["account_id"]) not in (await user_memberships(u_uuid))["accounts"]:
         raise HTTPException(status_code=403, detail="Not assigned to this account")
 
 
-def validate_entry_permissions(
+async def validate_entry_permissions(
     user_id: UUID, account_id: UUID, household_id: UUID, acting_user: Dict[str, Any]
 ) -> None:
     """
@@ -110,24 +119,21 @@ def validate_entry_permissions(
     if str(user_id) != str(acting_user.get("user_id")):
         raise HTTPException(status_code=403, detail="Cannot operate on another user's entries")
 
-    # Check household membership
-    hh = load_versions("user_households", UserHousehold)
-    hh_match = hh[
-        (hh["is_current"])
-        & (~hh.get("is_deleted", False).fillna(False))
-        & (hh["user_id"].astype(str) == str(user_id))
-        & (hh["household_id"].astype(str) == str(household_id))
-    ]
-    if hh_match.empty:
+    memberships = await user_memberships(user_id)
+    if str(household_id) not in memberships["households"]:
         raise HTTPException(status_code=403, detail="User not part of household")
-
-    # Check account membership
-    acc = load_versions("user_accounts", UserAccount)
-    acc_match = acc[
-        (acc["is_current"])
-        & (~acc.get("is_deleted", False).fillna(False))
-        & (acc["user_id"].astype(str) == str(user_id))
-        & (acc["account_id"].astype(str) == str(account_id))
-    ]
-    if acc_match.empty:
+    if str(account_id) not in memberships["accounts"]:
         raise HTTPException(status_code=403, detail="User not assigned to account")
+
+
+async def filter_entry_permissions(df: pd.DataFrame, acting_user: Dict[str, Any]) -> pd.DataFrame:
+    """Rows of ``df`` (entries or debts) that pass ``validate_entry_permissions`` for the acting user."""
+    if df.empty:
+        return df
+    memberships = await user_memberships(acting_user["user_id"])
+    allowed = (
+        (df["user_id"].astype(str) == str(acting_user["user_id"]))
+        & df["household_id"].astype(str).isin(memberships["households"])
+        & df["account_id"].astype(str).isin(memberships["accounts"])
+    )
+    return df[allowed]
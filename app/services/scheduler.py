@@ -0,0 +1,134 @@
+"""
+Background scheduler for maintenance jobs.
+
+Every process runs the loop, but only the holder of the lease object (``_leases/scheduler``) runs jobs.
+The lease is taken and renewed with conditional PUTs, so two processes can never both hold it; a
+holder that stops renewing loses it after ``LEASE_TTL``. The lease also records when each job last
+ran, so a new leader carries on the schedule instead of rerunning everything.
+
+Intervals default to ``DEFAULT_INTERVALS`` and are overridden with ``JOB_INTERVALS`` (JSON, seconds;
+0 disables a job).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+from uuid import uuid4
+from app.config import settings
+from app.services import maintenance
+from app.services.metrics import JOB_DURATION, JOB_LAST_SUCCESS, JOB_RUNS, SCHEDULER_LEADER
+from app.services.objectstore import get_with_etag, put_conditional
+from app.services.readcache import request_scope
+
+LEASE_KEY = "_leases/scheduler"
+LEASE_TTL = timedelta(seconds=60)
+# How often the loop renews the lease and looks for due jobs
+TICK_SECONDS = 15.0
+
+JOBS: dict[str, Callable[[], Awaitable[int]]] = {
+    "checkpoint": maintenance.checkpoint,
+    "purge_expired_tokens": maintenance.purge_expired_tokens,
+    "sweep_claims": maintenance.sweep_claims,
+    "sweep_orphans": maintenance.sweep_orphans,
+}
+DEFAULT_INTERVALS = {
+    "checkpoint": 900.0,
+    "purge_expired_tokens": 3600.0,
+    "sweep_claims": 3600.0,
+    "sweep_orphans": 6 * 3600.0,
+}
+
+logger = logging.getLogger("app.scheduler")
+
+# This process, as named in the lease
+HOLDER = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+
+
+def intervals() -> dict[str, float]:
+    return {name: settings.job_intervals.get(name, DEFAULT_INTERVALS[name]) for name in JOBS}
+
+
+async def run_job(name: str) -> int:
+    """Run one job now, with its metrics. Returns the amount of work it reports."""
+    if name not in JOBS:
+        raise KeyError(f"Unknown job {name!r}; known jobs: {', '.join(sorted(JOBS))}")
+    started = time.perf_counter()
+    try:
+        with request_scope():
+            done = await JOBS[name]()
+    except Exception:
+        JOB_RUNS.labels(name, "error").inc()
+        raise
+    finally:
+        JOB_DURATION.labels(name).observe(time.perf_counter() - started)
+    JOB_RUNS.labels(name, "ok").inc()
+    JOB_LAST_SUCCESS.labels(name).set_to_current_time()
+    return done
+
+
+async def _acquire(now: datetime) -> tuple[dict, str] | None:
+    """Take or renew the lease; returns its body and ETag while this process holds it."""
+    body = {"holder": HOLDER, "expires_at": (now + LEASE_TTL).isoformat(), "last_run": {}}
+    if await put_conditional(LEASE_KEY, json.dumps(body).encode()):
+        return await _read_lease()
+
+    lease, etag = await _read_lease()
+    if lease["holder"] != HOLDER and datetime.fromisoformat(lease["expires_at"]) > now:
+        return None
+    body["last_run"] = lease.get("last_run", {})
+    if not await put_conditional(LEASE_KEY, json.dumps(body).encode(), if_match=etag):
+        return None
+    return await _read_lease()
+
+
+async def _read_lease() -> tuple[dict, str]:
+    raw, etag, _ = await get_with_etag(LEASE_KEY)
+    return json.loads(raw), etag
+
+
+async def tick() -> list[str]:
+    """One round: hold the lease, then run every job that is due. Returns the jobs run."""
+    now = datetime.now(timezone.utc)
+    held = await _acquire(now)
+    SCHEDULER_LEADER.set(held is not None)
+    if held is None:
+        return []
+    lease, etag = held
+
+    ran = []
+    for name, interval in intervals().items():
+        last = lease["last_run"].get(name)
+        if interval <= 0 or (last and datetime.fromisoformat(last) + timedelta(seconds=interval) > now):
+            continue
+        try:
+            done = await run_job(name)
+            logger.info("job %s done: %s", name, done)
+        except Exception:
+            logger.exception("job %s failed", name)
+        # Failed runs wait for their next interval too, rather than retrying every tick
+        lease["last_run"][name] = now.isoformat()
+        ran.append(name)
+        lease["expires_at"] = (datetime.now(timezone.utc) + LEASE_TTL).isoformat()
+        if not await put_conditional(LEASE_KEY, json.dumps(lease).encode(), if_match=etag):
+            # Lost the lease while the job ran: leave the rest to the new holder
+            SCHEDULER_LEADER.set(False)
+            break
+        lease, etag = await _read_lease()
+    return ran
+
+
+async def run_forever(tick_seconds: float = TICK_SECONDS) -> None:
+    """The scheduler loop started by the app's lifespan; runs until cancelled."""
+    while True:
+        try:
+            await tick()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("scheduler tick failed")
+        await asyncio.sleep(tick_seconds)
@@ -0,0 +1,76 @@
+"""Column-wise JSON encoding of rows read from storage, without per-row response model validation."""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal
+from types import NoneType, UnionType
+from typing import TYPE_CHECKING, Union, get_args, get_origin
+from app.lazy import lazy_module
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
+_DATETIME: TypeAdapter[datetime] = TypeAdapter(datetime)
+
+
+def _base_type(annotation):
+    if get_origin(annotation) in (Union, UnionType):
+        args = [a for a in get_args(annotation) if a is not NoneType]
+        return args[0] if len(args) == 1 else annotation
+    return annotation
+
+
+def _json_datetimes(series: pd.Series) -> pd.Series:
+    """ISO 8601 as pydantic writes it: microseconds only when non-zero, ``Z`` for UTC, no suffix when naive."""
+    tz = getattr(series.dtype, "tz", None)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype) and (tz is None or str(tz) == "UTC"):
+        text = series.dt.strftime("%Y-%m-%dT%H:%M:%S")
+        micros = series.dt.microsecond.fillna(0).astype(int)
+        text = text.where(micros == 0, text + "." + micros.astype(str).str.zfill(6))
+        if tz is not None:
+            text = text + "Z"
+        return text.where(series.notna(), None)
+    # Other offsets, or mixed values: let pydantic format each one
+    return series.map(
+        lambda v: None if pd.isna(v) else _DATETIME.dump_python(_DATETIME.validate_python(v), mode="json")
+    )
+
+
+def _json_column(series: pd.Series, annotation) -> pd.Series:
+    """Format a column the way pydantic serializes ``annotation``, nulls kept as None."""
+    base = _base_type(annotation)
+    if base is datetime:
+        return _json_datetimes(series)
+    if base is date:
+        values = pd.to_datetime(series)
+        return values.dt.strftime("%Y-%m-%d").where(values.notna(), None)
+    if base is Decimal:
+        # pydantic writes Decimals as strings
+        return series.astype(str).where(series.notna(), None)
+    return series
+
+
+def json_rows_response(df: pd.DataFrame, model: type[BaseModel], response: Response | None = None) -> Response:
+    """``df`` as a JSON array of ``model`` objects, encoded column by column by pandas.
+
+    Only for trusted rows read from storage: values are formatted the way ``model`` serializes them
+    but not validated. The endpoint keeps ``model`` as its response_model for the OpenAPI schema.
+    Headers already set on ``response`` (ETag, X-Next-Cursor, ...) are carried over.
+    """
+    columns = {}
+    for name, info in model.model_fields.items():
+        series = df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+        columns[name] = _json_column(series, info.annotation)
+    body = pd.DataFrame(columns, index=df.index).to_json(orient="records", force_ascii=False)
+
+    out = Response(content=body, media_type="application/json")
+    if response is not None:
+        for key, value in response.headers.items():
+            if key not in ("content-length", "content-type"):
+                out.headers[key] = value
+    return out
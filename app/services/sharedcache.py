@@ -0,0 +1,216 @@
+"""
+Shared cache tier: results derived from storage that every request would otherwise re-read from S3
+(user principals, memberships, name indexes, summaries), shared by the requests of a process or, with a
+networked backend, by every worker and replica.
+
+Each entry is tagged with the record types and scopes it was computed from, and its key carries their
+data generations from the commit log, so a write anywhere makes older entries unreachable as soon as a
+reader's log state has seen it. Commits also broadcast their tags to the backend (``invalidate``), which
+drops the superseded entries right away instead of leaving them to expire.
+
+The backend is picked by ``CACHE_URL``: unset or ``memory://`` keeps entries in the process,
+``redis://host:port/db`` shares them through Redis (``pip install redis``).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import pickle
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+from app.config import settings
+from app.services.metrics import observe_cache
+
+T = TypeVar("T")
+
+logger = logging.getLogger("app.cache")
+
+# Set of the entry keys carrying a tag, so invalidation finds them without a scan
+_TAG_PREFIX = "tag:"
+
+
+class MemoryBackend:
+    """Entries in this process only: an LRU bounded by ``max_entries``, each entry expiring after its TTL."""
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._tagged: dict[str, set[str]] = {}
+        self._counters: OrderedDict[str, tuple[float, int]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: Any, ttl: int, tags: list[str]) -> None:
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate(self, tags: list[str]) -> None:
+        for tag in tags:
+            for key in self._tagged.pop(tag, set()):
+                self._drop(key)
+
+    async def incr(self, key: str, amount: int, ttl: int) -> int:
+        """Add ``amount`` to a counter that expires ``ttl`` seconds after it was created; returns its value."""
+        now = time.monotonic()
+        expires, value = self._counters.get(key, (0.0, 0))
+        if expires < now:
+            expires, value = now + ttl, 0
+        self._counters[key] = (expires, value + amount)
+        self._counters.move_to_end(key)
+        while len(self._counters) > self.max_entries:
+            self._counters.popitem(last=False)
+        return value + amount
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+
+class RedisBackend:
+    """Entries in Redis, shared by every process using the same ``url``. Values are pickled.
+
+    ``client_factory`` builds the client for an event loop; it defaults to ``redis.asyncio.from_url``
+    and lets tests substitute a local stand-in speaking the same commands.
+    """
+
+    def __init__(self, url: str, client_factory: Callable[[], Any] | None = None, namespace: str = "hf:cache:"):
+        if client_factory is None:
+            import redis.asyncio
+
+            def client_factory():
+                return redis.asyncio.from_url(url)
+
+        self.namespace = namespace
+        self._factory = client_factory
+        # Like the S3 client: one connection pool per event loop
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._factory()
+        return client
+
+    async def get(self, key: str) -> Any | None:
+        body = await self._client().get(self.namespace + key)
+        return None if body is None else pickle.loads(body)
+
+    async def set(self, key: str, value: Any, ttl: int, tags: list[str]) -> None:
+        async with self._client().pipeline(transaction=False) as pipe:
+            pipe.set(self.namespace + key, pickle.dumps(value), ex=ttl)
+            for tag in tags:
+                pipe.sadd(self.namespace + _TAG_PREFIX + tag, key)
+                pipe.expire(self.namespace + _TAG_PREFIX + tag, ttl)
+            await pipe.execute()
+
+    async def incr(self, key: str, amount: int, ttl: int) -> int:
+        async with self._client().pipeline(transaction=True) as pipe:
+            pipe.incrby(self.namespace + key, amount)
+            pipe.expire(self.namespace + key, ttl, nx=True)
+            value, _ = await pipe.execute()
+        return value
+
+    async def invalidate(self, tags: list[str]) -> None:
+        client = self._client()
+        tag_keys = [self.namespace + _TAG_PREFIX + tag for tag in tags]
+        async with client.pipeline(transaction=False) as pipe:
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members = await pipe.execute()
+        keys = {self.namespace + k.decode() for keys in members for k in keys}
+        if keys or tag_keys:
+            await client.delete(*keys, *tag_keys)
+
+
+def _from_settings():
+    url = settings.cache_url
+    if not url or url.startswith("memory://"):
+        return MemoryBackend(settings.cache_max_entries)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL scheme: {url}")
+
+
+_backend = None
+
+
+def get_backend():
+    """The configured backend, created on first use."""
+    global _backend
+    if _backend is None:
+        _backend = _from_settings()
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """Replace the backend (tests, or an app wiring its own)."""
+    global _backend
+    _backend = backend
+
+
+def _key(name: str, args: tuple[Hashable, ...], tags: dict[str, str | None]) -> str:
+    digest = hashlib.sha256(json.dumps([args, sorted(tags.items())], default=str).encode())
+    return f"{name}:{digest.hexdigest()[:32]}"
+
+
+async def cached(
+    name: str,
+    args: tuple[Hashable, ...],
+    tags: dict[str, str | None],
+    loader: Callable[[], Awaitable[T]],
+    ttl: int | None = None,
+) -> T:
+    """``loader()``'s result for ``args``, shared until a write to one of ``tags`` (tag -> its generation).
+
+    Results are treated as read-only by callers. A backend error never fails the read: it falls
+    back to the loader.
+    """
+    key = _key(name, args, tags)
+    backend = get_backend()
+    try:
+        value = await backend.get(key)
+    except Exception:
+        logger.warning("shared cache read failed for %s", name, exc_info=True)
+        value = None
+    observe_cache(name, value is not None)
+    if value is not None:
+        return value
+
+    value = await loader()
+    try:
+        await backend.set(key, value, ttl or settings.cache_ttl_seconds, list(tags))
+    except Exception:
+        logger.warning("shared cache write failed for %s", name, exc_info=True)
+    return value
+
+
+async def invalidate(tags: list[str]) -> None:
+    """Broadcast a commit's tags: drop every shared entry computed from them."""
+    try:
+        await get_backend().invalidate(tags)
+    except Exception:
+        # Entries are keyed by generation, so a missed broadcast only delays their eviction
+        logger.warning("shared cache invalidation failed for %s", tags, exc_info=True)
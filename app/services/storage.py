@@ -1,146 +1,453 @@
+from __future__ import annotations
 from uuid import UUID, uuid4
 import pyarrow.parquet as pq
-import boto3
+import asyncio
+import functools
 import json
 import io
+import re
 import pyarrow as pa
 from datetime import datetime, timezone, date, timedelta
-import pandas as pd
-from typing import Type, Optional
+from app.lazy import lazy_module
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Type, Optional
 from fastapi import HTTPException
+from pydantic import BaseModel
 from dateutil.relativedelta import relativedelta
-from app.config import settings
+from app.models.arrow import arrow_schema, conform, to_table
+from app.services.commitlog import TIMESTAMP_FORMAT, LogState, current_state, timestamp, transaction
+from app.services.objectstore import delete_many, list_keys, get_many, run_sync
+from app.services.readcache import cached_read
+from app.services import hottables, sharedcache
+from app.services.telemetry import record_rows
+from app.services.metrics import AUDIT_WRITES_IN_FLIGHT
 from app.models.schemas.entry import Entry
-from app.models.schemas.user import RefreshToken
 from app.models.schemas.membership import UserAccount, UserHousehold
 from app.models.schemas.audit import AuditLog
 from app.models.schemas.debt import Debt
 from app.models.enums import EntryType, Category
 
-aws_region = settings.aws_region
-s3 = boto3.client("s3", region_name=aws_region)
-BUCKET_NAME = settings.s3_bucket
-SENSITIVE_FIELDS = {"password", "hashed_password", "access_token", "refresh_token"}
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
+SENSITIVE_FIELDS = {"password", "hashed_password", "access_token", "refresh_token", "otp_code"}
+# Writes to these record types bump the data generation of the user and household they belong to
+# (audit logs, tokens and the like never change what a list or summary shows)
+SCOPED_RECORD_TYPES = {"entries", "debts", "accounts", "households", "user_accounts", "user_households"}
+SCOPE_FIELDS = ("user_id", "household_id")
+# Keys listed per round trip while filling a page
+PAGE_SCAN_BATCH = 200
+# Record types stored under their parent, <record_type>/<field>=<value>/<id_field>=<id>/..., so one listing
+# finds every record of a parent. Reading them by id needs the parent (``parent_id``).
+PARTITIONED_BY = {"refresh_tokens": "user_id", "password_reset_tokens": "user_id", "password_history": "user_id"}
+
+# Data file names end in the write timestamp, optionally followed by the transaction tag
+_WRITTEN_AT = re.compile(r"-(\d{8}T\d{12}Z)(?:-[0-9a-f]{32})?\.parquet$")
+
+
+def partition_prefix(record_type: str, parent_id: UUID | str | None = None) -> str:
+    """Prefix of a record type's files, or of one parent's records for types in ``PARTITIONED_BY``."""
+    if parent_id is None:
+        return f"{record_type}/"
+    return f"{record_type}/{PARTITIONED_BY[record_type]}={parent_id}/"
+
+
+async def mark_old_version_as_stale_async(
+    record_type: str, record_id: UUID, id_column: str = "id", parent_id: UUID | str | None = None
+) -> None:
+    """Supersede every visible version of a record. Files are immutable: the log records the change."""
+    state = await current_state()
+    prefix = f"{partition_prefix(record_type, parent_id)}{id_column}={str(record_id)}/"
+    keys = [k for k in await list_keys(prefix) if state.is_visible(k)]
 
-
-def mark_old_version_as_stale(record_type: str, record_id: UUID, id_column: str = "id") -> None:
-    prefix = f"{record_type}/{id_column}={str(record_id)}/"
-    result = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=prefix)
-
-    if "Contents" not in result:
+    if not keys:
         raise HTTPException(status_code=404, detail=f"No versions found for {record_type} {str(record_id)}")
 
-    for obj in result["Contents"]:
-        key = obj["Key"]
-        obj_data = s3.get_object(Bucket=BUCKET_NAME, Key=key)
-        body = io.BytesIO(obj_data["Body"].read())
-        table = pq.read_table(body)
-        df = table.to_pandas()
+    async with transaction() as txn:
+        txn.remove(record_type, str(record_id), [k for k in keys if k not in state.stale])
+
 
-        if df.get("is_current", True).iloc[0]:
-            df["is_current"] = False
-            buffer = io.BytesIO()
-            pq.write_table(pa.Table.from_pandas(df), buffer)
-            buffer.seek(0)
-            s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=buffer.read())
+async def supersede_records_async(record_type: str, id_column: str, record_ids) -> int:
+    """Supersede every visible version of many records in one commit; returns how many had versions.
 
+    A few records are listed one partition each, concurrently; many share a single listing of the table.
+    """
+    ids = sorted({str(i) for i in record_ids})
+    if not ids:
+        return 0
+    state = await current_state()
+    if len(ids) <= PAGE_SCAN_BATCH and record_type not in PARTITIONED_BY:
+        listed = await asyncio.gather(*(list_keys(f"{record_type}/{id_column}={i}/") for i in ids))
+        keys = [k for ks in listed for k in ks]
+    else:
+        keys = await list_keys(f"{record_type}/")
 
-def cascade_stale(record_type: str, record_id: UUID, mapping_type: str, foreign_key: str):
-    df = load_versions(mapping_type, schema=record_type)
+    by_record: dict[str, list[str]] = {}
+    for key in keys:
+        if state.is_visible(key) and key not in state.stale:
+            by_record.setdefault(_record_of(key).rsplit("/", 1)[-1], []).append(key)
+    superseded = 0
+    async with transaction() as txn:
+        for record_id in ids:
+            record_keys = by_record.get(f"{id_column}={record_id}")
+            if record_keys:
+                txn.remove(record_type, record_id, record_keys)
+                superseded += 1
+    return superseded
+
+
+async def cascade_stale_async(record_type: str, record_id: UUID, mapping_type: str, foreign_key: str):
+    df = await load_versions_async(mapping_type, schema=record_type)
     matches = df[(df[foreign_key] == record_id) & (df["is_current"]) & (~df["is_deleted"].fillna(False))]
 
-    for _, row in matches.iterrows():
-        mark_old_version_as_stale(mapping_type, row["mapping_id"], "mapping_id")
+    await supersede_records_async(mapping_type, "mapping_id", matches["mapping_id"])
 
 
-def save_version(record, record_type: str, id_field: str):
-    # Handle both Pydantic models and plain dicts
-    if hasattr(record, "model_dump"):  # Pydantic v2
-        record_data = record.model_dump()
-    elif hasattr(record, "dict"):  # Pydantic v1
-        record_data = record.dict()
+async def purge_expired_records_async(record_type: str, schema, id_field: str, lifetime: timedelta) -> list[str]:
+    """Delete every file of the records that were superseded for good or are past their ``expires_at``;
+    returns their ids. For record types nothing reads once spent, such as tokens.
+
+    ``lifetime`` is the longest a record is issued for: only records written longer ago than that are
+    read to check their expiry.
+    """
+    now = datetime.now(timezone.utc)
+    state = await current_state()
+    by_record: dict[str, list[str]] = {}
+    for key in await list_keys(f"{record_type}/"):
+        if state.is_visible(key):
+            record_id = _record_of(key).rsplit("/", 1)[-1].removeprefix(f"{id_field}=")
+            by_record.setdefault(record_id, []).append(key)
+
+    purged, aged = [], {}
+    for record_id, keys in by_record.items():
+        live = [k for k in keys if k not in state.stale]
+        if not live:
+            purged.append(record_id)
+        elif all(written_at(k) + lifetime < now for k in live):
+            aged[record_id] = max(live, key=written_at)
+    tables = await _read_tables(list(aged.values()), {}, schema)
+    for record_id, table in zip(aged, tables):
+        if table.column("expires_at")[0].as_py() < now:
+            purged.append(record_id)
+
+    await delete_many([k for record_id in purged for k in by_record[record_id]])
+    # Only once the files are gone: processes then stop tracking them as superseded
+    async with transaction() as txn:
+        for record_id in purged:
+            txn.forget(record_type, record_id, by_record[record_id])
+    return purged
+
+
+async def save_version_async(record, record_type: str, id_field: str):
+    # Pydantic models are written with their canonical Arrow schema; plain dicts get an inferred one
+    if isinstance(record, BaseModel):
+        record_data, model = record.model_dump(), type(record)
     elif isinstance(record, dict):
-        record_data = record
+        record_data, model = record, None
     else:
         raise TypeError(f"Unsupported object type for save_version: {type(record)}")
 
-    # Convert UUIDs and datetimes
-    for k, v in record_data.items():
-        if isinstance(v, UUID):
-            record_data[k] = str(v)
-        if isinstance(v, datetime):
-            record_data[k] = pd.to_datetime(v)
-
-    df = pd.DataFrame([record_data])
+    table = to_table(record_data, model)
 
-    record_id = record_data[id_field]
+    record_id = str(record_data[id_field])
     now = datetime.now(timezone.utc)
-    timestamp = now.strftime("%Y%m%dT%H%M%S%fZ")
 
-    # Hybrid partitioning: id → year → month → day
-    key = (
-        f"{record_type}/{id_field}={record_id}/"
-        f"year={now.year}/month={now.month:02}/day={now.day:02}/"
-        f"{record_type[:-1]}-{record_id}-{timestamp}.parquet"
-    )
-
-    table = pa.Table.from_pandas(df, preserve_index=False)
     out_buffer = pa.BufferOutputStream()
     pq.write_table(table, out_buffer)
 
-    s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=out_buffer.getvalue().to_pybytes())
+    async with transaction() as txn:
+        # Hybrid partitioning: (parent →) id → year → month → day
+        parent = PARTITIONED_BY.get(record_type)
+        partition = partition_prefix(record_type, record_data[parent] if parent else None)
+        key = txn.data_key(
+            f"{partition}{id_field}={record_id}/"
+            f"year={now.year}/month={now.month:02}/day={now.day:02}/"
+            f"{record_type[:-1]}-{record_id}-{timestamp(now)}"
+        )
+        txn.add(
+            record_type,
+            record_id,
+            key,
+            out_buffer.getvalue().to_pybytes(),
+            scopes=data_scopes(record_type, record_data),
+        )
+        # New records (version 1) have fresh ids nobody else can write: only updates race for a version
+        if model is not None and "version" in model.model_fields and int(record_data["version"] or 1) > 1:
+            txn.claim(record_type, record_id, record_data["version"])
+
+
+def data_scopes(record_type: str, record_data: dict) -> list[str]:
+    """Users and households whose data a record belongs to, as generation scopes."""
+    if record_type not in SCOPED_RECORD_TYPES:
+        return []
+    return [f"{field}={record_data[field]}" for field in SCOPE_FIELDS if record_data.get(field)]
+
+
+def next_version(row: dict) -> int:
+    """Version number of the version that supersedes ``row``."""
+    return int(row.get("version") or 1) + 1
+
+
+def _is_model(schema) -> bool:
+    return isinstance(schema, type) and issubclass(schema, BaseModel)
 
 
 def _empty_df(schema):
     if schema is None:
         return pd.DataFrame()
-    if hasattr(schema, "model_fields"):  # Pydantic v2
-        return pd.DataFrame(columns=list(schema.model_fields.keys()))
+    if _is_model(schema):
+        return arrow_schema(schema).empty_table().to_pandas()
     if hasattr(schema, "__fields__"):  # Pydantic v1
         return pd.DataFrame(columns=list(schema.__fields__.keys()))
     return pd.DataFrame(columns=list(schema))
 
 
-def load_versions(
+async def load_versions_async(
     record_type: str,
     schema,
     record_id: UUID | None = None,
     start: datetime | None = None,
     end: datetime | None = None,
+    as_of: datetime | None = None,
+    parent_id: UUID | str | None = None,
 ):
-    prefix = f"{record_type}/"
+    """Load stored versions of ``record_type``.
+
+    With ``as_of``, only each record's effective version at that moment is returned, with
+    ``is_current`` telling whether it was still current then. With ``parent_id`` (record types in
+    ``PARTITIONED_BY``), only that parent's records are listed and read.
+    """
+    if as_of is not None and as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    schema_key = getattr(schema, "__name__", str(schema))
+    parent = str(parent_id) if parent_id else None
+    key = (record_type, schema_key, str(record_id) if record_id else None, start, end, as_of, parent)
+    return await cached_read(
+        key, lambda: _load_versions_uncached(record_type, schema, record_id, start, end, as_of, parent)
+    )
+
+
+def _with_current(table: pa.Table, current: bool) -> pa.Table:
+    column = pa.array([current] * table.num_rows, type=pa.bool_())
+    idx = table.schema.get_field_index("is_current")
+    if idx == -1:
+        return table.append_column("is_current", column)
+    return table.set_column(idx, table.schema.field(idx), column)
+
+
+def written_at(key: str) -> datetime:
+    match = _WRITTEN_AT.search(key)
+    if match is None:
+        raise ValueError(f"Data key carries no write time: {key}")
+    return datetime.strptime(match.group(1), TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _record_of(key: str) -> str:
+    """Partition of the record a data key belongs to: ``<record_type>/<id_field>=<id>``."""
+    return key.split("/year=", 1)[0]
+
+
+def _effective_versions(keys: list[str], state: LogState, as_of: datetime | None = None) -> dict[str, bool | None]:
+    """Pick each record's effective version (the latest, or the latest at ``as_of``) from the key names alone.
+
+    Keys are grouped by record partition and ordered by the write timestamp in their name, so only the
+    chosen versions need downloading. Maps each chosen key to whether it is (or was, at ``as_of``)
+    current, or None when only the file's own ``is_current`` flag can tell.
+    """
+    chosen: dict[str, tuple[datetime, str]] = {}
+    rewritten = set()  # records with a version written after as_of
+    for key in keys:
+        record, written = _record_of(key), written_at(key)
+        if as_of is not None and written > as_of:
+            rewritten.add(record)
+        elif record not in chosen or written > chosen[record][0]:
+            chosen[record] = (written, key)
+
+    effective: dict[str, bool | None] = {}
+    for record, (_, key) in chosen.items():
+        superseded_at = state.superseded_at(key)
+        if superseded_at is not None:
+            effective[key] = as_of is not None and superseded_at > as_of
+        else:
+            # Files from before the log were rewritten with is_current=False when superseded: if the
+            # superseding version came after as_of, this one was still current then
+            effective[key] = True if record in rewritten else None
+    return effective
+
+
+async def _load_versions_uncached(record_type: str, schema, record_id, start, end, as_of, parent_id) -> pd.DataFrame:
+    # Resolve the log before listing, so files of commits newer than the state stay hidden
+    state = await current_state()
+    prefix = partition_prefix(record_type, parent_id)
+
+    if record_id is None and parent_id is None and not (start and end) and as_of is None:
+        hot = await hottables.read(record_type, schema, state)
+        if hot is not None:
+            return hot
 
     if start and end:
         # Only scan partitions within the date range
-        keys = []
+        prefixes = []
         current = start
         while current <= end:
-            prefix_dt = f"{record_type}/year={current.year}/month={current.month:02d}/day={current.day:02d}/"
-            resp = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=prefix_dt)
-            for obj in resp.get("Contents", []):
-                keys.append(obj["Key"])
+            prefixes.append(f"{record_type}/year={current.year}/month={current.month:02d}/day={current.day:02d}/")
             current += timedelta(days=1)
+        keys = [key for day_keys in await asyncio.gather(*map(list_keys, prefixes)) for key in day_keys]
     elif record_id:
-        prefix = f"{record_type}/{schema.__name__.lower()}_id={record_id}/"
-        resp = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=prefix)
-        keys = [obj["Key"] for obj in resp.get("Contents", [])]
+        # Stored models declare their id field first (entry_id, mapping_id, refresh_token_id, ...)
+        id_field = next(iter(schema.model_fields)) if _is_model(schema) else f"{str(schema).lower()}_id"
+        keys = await list_keys(f"{prefix}{id_field}={record_id}/")
     else:
-        resp = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=prefix)
-        keys = [obj["Key"] for obj in resp.get("Contents", [])]
+        keys = await list_keys(prefix)
 
+    keys = [k for k in keys if state.is_visible(k)]
+    if as_of is not None:
+        is_current = _effective_versions(keys, state, as_of)
+        keys = list(is_current)
+    else:
+        is_current = {k: False for k in keys if k in state.stale}
     if not keys:
-        return pd.DataFrame(columns=schema.model_fields.keys())
+        return _empty_df(schema)
+
+    table = _concat(await _read_tables(keys, is_current, schema), schema)
+    record_rows(table.num_rows)
+
+    return table.to_pandas()
+
+
+async def _read_tables(keys: list[str], is_current: dict[str, bool | None], schema) -> list[pa.Table]:
+    tables = [pq.read_table(io.BytesIO(body)) for body in await get_many(keys)]
+    if _is_model(schema):
+        tables = [conform(t, schema) for t in tables]
+    # Overlay what the log knows about each version being current; other files keep their own flag
+    currents = [is_current.get(k) for k in keys]
+    return [t if current is None else _with_current(t, current) for current, t in zip(currents, tables)]
+
+
+def _concat(tables: list[pa.Table], schema) -> pa.Table:
+    return pa.concat_tables(tables, promote_options="none" if _is_model(schema) else "permissive")
+
+
+async def _candidates_by_id(record_type: str, state: LogState, after: str | None, as_of: datetime | None):
+    """Effective versions in record id order, listing lazily from the record after ``after``."""
+    # Every key of a record starts with "<partition>/year=": "~" sorts after all of them
+    start_after = f"{_record_of(after)}/~" if after else None
+    pending: list[str] = []
+    while True:
+        listed = await list_keys(f"{record_type}/", start_after=start_after, limit=PAGE_SCAN_BATCH)
+        keys = pending + [k for k in listed if state.is_visible(k)]
+        exhausted = len(listed) < PAGE_SCAN_BATCH
+        if not exhausted:
+            # The last record's versions may continue in the next listing
+            last = _record_of(listed[-1])
+            pending = [k for k in keys if _record_of(k) == last]
+            keys = keys[: len(keys) - len(pending)]
+            start_after = listed[-1]
+        effective = _effective_versions(keys, state, as_of)
+        for key in sorted(effective):
+            yield key, effective[key]
+        if exhausted:
+            return
+
+
+async def _candidates_newest_first(record_type: str, state: LogState, after: str | None, as_of: datetime | None):
+    """Effective versions, most recently written first, after ``after``."""
+    keys = [k for k in await list_keys(f"{record_type}/") if state.is_visible(k)]
+    effective = _effective_versions(keys, state, as_of)
+    order = sorted(effective, key=lambda k: (written_at(k), k), reverse=True)
+    if after:
+        order = [k for k in order if (written_at(k), k) < (written_at(after), after)]
+    for key in order:
+        yield key, effective[key]
+
+
+async def _live_batches(candidates, schema, size: int, keep):
+    """Download candidates ``size`` at a time and yield the live rows of each batch, tagged with their key."""
+    while True:
+        batch: dict[str, bool | None] = {}
+        async for key, is_current in candidates:
+            batch[key] = is_current
+            if len(batch) >= size:
+                break
+        if not batch:
+            return
+
+        tables = await _read_tables(list(batch), batch, schema)
+        table = _concat(tables, schema)
+        record_rows(table.num_rows)
+        df = table.to_pandas()
+        df["_key"] = [k for k, t in zip(batch, tables) for _ in range(t.num_rows)]
+        df = df[df["is_current"] & ~df["is_deleted"].fillna(False)]
+        if keep is not None and not df.empty:
+            df = await keep(df)
+        if not df.empty:
+            yield df
 
-    dfs = []
-    for key in keys:
-        obj = s3.get_object(Bucket=BUCKET_NAME, Key=key)
-        dfs.append(pd.read_parquet(io.BytesIO(obj["Body"].read())))
 
-    return pd.concat(dfs, ignore_index=True)
+async def load_page_async(
+    record_type: str,
+    schema: type[BaseModel],
+    *,
+    limit: int,
+    after: str | None = None,
+    keep: Callable[[pd.DataFrame], Awaitable[pd.DataFrame]] | None = None,
+    as_of: datetime | None = None,
+    newest_first: bool = False,
+) -> tuple[pd.DataFrame, str | None]:
+    """One page of live (current, not deleted) records and the cursor of the next page, or None.
+
+    Records come in id order, the order of their ``<id_field>=<id>/`` partitions: listing starts right
+    after the cursor and stops once ``limit`` records have passed ``keep``, so a deep page costs the same
+    as the first. ``newest_first`` orders them by the write time in their key instead, which needs a full
+    listing but still only downloads the files of the page. ``after`` is a cursor returned earlier (a data
+    key); ``keep`` filters each downloaded batch.
+    """
+    state = await current_state()
+    if newest_first:
+        candidates = _candidates_newest_first(record_type, state, after, as_of)
+    else:
+        candidates = _candidates_by_id(record_type, state, after, as_of)
+
+    # Read a page's worth of candidates and one more at a time; rows past the cursor are simply read again
+    # later. A next page is reported only once a row past this one has survived filtering.
+    batches = _live_batches(candidates, schema, limit + 1, keep)
+    pages, found = [], 0
+    async for df in batches:
+        pages.append(df)
+        found += len(df)
+        if found > limit:
+            break
+    more = found > limit
+    await batches.aclose()
+    await candidates.aclose()
+
+    if not found:
+        return _empty_df(schema), None
+    page = pd.concat(pages).iloc[:limit]
+    next_cursor = page["_key"].iloc[-1] if more else None
+    return page.drop(columns="_key").reset_index(drop=True), next_cursor
 
 
-def resolve_id_by_name(record_type: str, name: str, schema, name_field: str, id_field: str) -> UUID:
-    df = load_versions(record_type, schema)
+async def stream_records_async(
+    record_type: str,
+    schema: type[BaseModel],
+    *,
+    batch_size: int = 500,
+    keep: Callable[[pd.DataFrame], Awaitable[pd.DataFrame]] | None = None,
+    as_of: datetime | None = None,
+) -> AsyncIterator[pd.DataFrame]:
+    """Every live record in id order, as one DataFrame per ``batch_size`` files downloaded.
+
+    Only one batch is held at a time, so exports of any size stream in constant memory.
+    """
+    state = await current_state()
+    async for df in _live_batches(_candidates_by_id(record_type, state, None, as_of), schema, batch_size, keep):
+        yield df.drop(columns="_key").reset_index(drop=True)
+
+
+async def resolve_id_by_name_async(record_type: str, name: str, schema, name_field: str, id_field: str) -> UUID:
+    df = await load_versions_async(record_type, schema)
 
     match = df[(df[name_field] == name) & (df["is_current"]) & (~df["is_deleted"].fillna(False))]
 
@@ -150,18 +457,37 @@ def resolve_id_by_name(record_type: str, name: str, schema, name_field: str, id_
     return match.iloc[0][id_field]
 
 
-def resolve_name_by_id(record_type: str, record_id: UUID, schema, id_field: str, name_field: str) -> UUID:
-    df = load_versions(record_type, schema)
+async def shared_read(name: str, args: tuple, tags: list[str], loader: Callable[[], Awaitable]):
+    """``loader()``'s result shared across requests and workers until a write to one of ``tags``
+    (record types or ``<field>=<id>`` scopes) is committed.
+    """
+    state = await current_state()
+    return await sharedcache.cached(name, args, {tag: state.generations.get(tag) for tag in tags}, loader)
 
-    match = df[(df[id_field] == record_id) & (df["is_current"]) & (~df["is_deleted"].fillna(False))]
 
-    if match.empty:
-        raise HTTPException(status_code=404, detail=f"{record_type[:-1].capitalize()} '{record_id}' not found")
+async def name_index_async(
+    record_type: str, schema, id_field: str, name_field: str, as_of: datetime | None = None
+) -> dict[str, str]:
+    """``id -> name`` of every live ``record_type`` record."""
+
+    async def load():
+        df = await load_versions_async(record_type, schema, as_of=as_of)
+        live = df[(df["is_current"]) & (~df["is_deleted"].fillna(False))]
+        return dict(zip(live[id_field].astype(str), live[name_field]))
 
-    return match.iloc[0][name_field]
+    return await shared_read("names", (record_type, id_field, name_field, as_of), [record_type], load)
 
 
-def soft_delete_record(
+async def resolve_name_by_id_async(
+    record_type: str, record_id: UUID, schema, id_field: str, name_field: str, as_of: datetime | None = None
+) -> str:
+    names = await name_index_async(record_type, schema, id_field, name_field, as_of)
+    if str(record_id) not in names:
+        raise HTTPException(status_code=404, detail=f"{record_type[:-1].capitalize()} '{record_id}' not found")
+    return names[str(record_id)]
+
+
+async def soft_delete_record_async(
     record_type: str,
     record_id: UUID,
     id_field: str,
@@ -177,7 +503,7 @@ def soft_delete_record(
       - saves a new version with is_deleted=True and is_current=True
       - performs built-in cascade for 'users' and 'debts'
     """
-    df = load_versions(record_type, model_cls)
+    df = await load_versions_async(record_type, model_cls)
 
     match = df[(df[id_field] == str(record_id)) & (df["is_current"]) & (~df.get("is_deleted", False).fillna(False))]
 
@@ -192,72 +518,77 @@ def soft_delete_record(
         if owner_field in row and str(row[owner_field]) != str(user.get("user_id")):
             raise HTTPException(status_code=403, detail="Not authorized to delete this resource")
 
-    # Mark existing versions stale
-    mark_old_version_as_stale(record_type, record_id, id_field)
+    # The deletion and its cascades are committed together
+    async with transaction():
+        # Mark existing versions stale
+        await mark_old_version_as_stale_async(record_type, record_id, id_field)
 
-    # Build deleted object, copying values from the found row
-    now = datetime.now(timezone.utc)
-    data = row.to_dict()
-    # ensure id is present
-    data[id_field] = data.get(id_field) or str(record_id)
-    data.update(
-        {
-            "updated_at": now,
-            "is_current": True,  # latest version will indicate deleted
-            "is_deleted": True,
-        }
-    )
+        # Build deleted object, copying values from the found row
+        now = datetime.now(timezone.utc)
+        data = row.to_dict()
+        # ensure id is present
+        data[id_field] = data.get(id_field) or str(record_id)
+        data.update(
+            {
+                "updated_at": now,
+                "is_current": True,  # latest version will indicate deleted
+                "is_deleted": True,
+            }
+        )
+        if "version" in model_cls.model_fields:
+            data["version"] = next_version(data)
 
-    # instantiate model and save
-    deleted_obj = model_cls(**data)
-    save_version(deleted_obj, record_type, id_field)
-    log_action(user.get("user_id") if user else None, "delete", record_type, str(record_id))
+        # instantiate model and save
+        deleted_obj = model_cls(**data)
+        await save_version_async(deleted_obj, record_type, id_field)
+        await log_action_async(user.get("user_id") if user else None, "delete", record_type, str(record_id))
 
-    # Built-in cascades:
-    if record_type == "users":
-        _cascade_user_deletion(str(record_id), now)
-    elif record_type == "debts":
-        # try to cascade debt -> entries (best-effort)
-        _cascade_debt_deletion(str(record_id), row, now)
+        # Built-in cascades:
+        if record_type == "users":
+            await _cascade_user_deletion(str(record_id), now)
+        elif record_type == "debts":
+            # try to cascade debt -> entries (best-effort)
+            await _cascade_debt_deletion(str(record_id), row, now)
 
     return {"message": f"{record_type[:-1].capitalize()} deleted", id_field: str(record_id)}
 
 
-def _cascade_user_deletion(user_id: str, now: datetime):
-    """Mark user_accounts, user_households and refresh_tokens as deleted for this user."""
-    # user_accounts
-    ua_df = load_versions("user_accounts", UserAccount)
+async def _cascade_user_deletion(user_id: str, now: datetime):
+    """Mark user_accounts and user_households as deleted for this user (the caller revokes its tokens).
 
-    for _, r in ua_df[
-        (ua_df["user_id"] == str(user_id)) & (ua_df["is_current"]) & (~ua_df.get("is_deleted", False).fillna(False))
-    ].iterrows():
-        mark_old_version_as_stale("user_accounts", r["mapping_id"], "mapping_id")
-        data = r.to_dict()
-        data.update({"updated_at": now, "is_current": True, "is_deleted": True})
-        save_version(UserAccount(**data), "user_accounts", "mapping_id")
-        log_action(user_id, "cascade_delete", "account_membership", r["mapping_id"])
+    One scan per table finds every affected row; their versions are superseded and the deleted
+    versions written as one batch, all joining the deletion's transaction.
+    """
+    ua_df, uh_df = await asyncio.gather(
+        load_versions_async("user_accounts", UserAccount),
+        load_versions_async("user_households", UserHousehold),
+    )
 
-    # user_households
-    uh_df = load_versions("user_households", UserHousehold)
+    def live(df: pd.DataFrame) -> pd.DataFrame:
+        return df[(df["user_id"] == str(user_id)) & (df["is_current"]) & (~df["is_deleted"].fillna(False))]
 
-    for _, r in uh_df[
-        (uh_df["user_id"] == str(user_id)) & (uh_df["is_current"]) & (~uh_df.get("is_deleted", False).fillna(False))
-    ].iterrows():
-        mark_old_version_as_stale("user_households", r["mapping_id"], "mapping_id")
-        data = r.to_dict()
-        data.update({"updated_at": now, "is_current": True, "is_deleted": True})
-        save_version(UserHousehold(**data), "user_households", "mapping_id")
-        log_action(user_id, "cascade_delete", "household_membership", r["mapping_id"])
+    mappings: list[tuple[str, type[BaseModel], str, pd.DataFrame]] = [
+        ("user_accounts", UserAccount, "account_membership", live(ua_df)),
+        ("user_households", UserHousehold, "household_membership", live(uh_df)),
+    ]
 
-    # refresh_tokens (invalidate)
-    rt_df = load_versions("refresh_tokens", RefreshToken)
+    await asyncio.gather(
+        *(
+            supersede_records_async(record_type, "mapping_id", rows["mapping_id"])
+            for record_type, _, _, rows in mappings
+        )
+    )
 
-    for _, r in rt_df[(rt_df["user_id"] == str(user_id)) & (rt_df["is_current"])].iterrows():
-        mark_old_version_as_stale("refresh_tokens", r["refresh_token_id"], "refresh_token_id")
-        # Optionally save a deleted refresh token object if you have a schema, else skipping saving a deleted record is fine.
+    writes: list[Awaitable] = []
+    for record_type, model, resource_type, rows in mappings:
+        for data in rows.to_dict(orient="records"):
+            data.update({"updated_at": now, "is_current": True, "is_deleted": True})
+            writes.append(save_version_async(model(**data), record_type, "mapping_id"))
+            writes.append(log_action_async(user_id, "cascade_delete", resource_type, data["mapping_id"]))
+    await asyncio.gather(*writes)
 
 
-def _cascade_debt_deletion(debt_id: str, debt_row: pd.Series, now: datetime):
+async def _cascade_debt_deletion(debt_id: str, debt_row: pd.Series, now: datetime):
     """
     Cascade delete entries generated by a debt.
 
@@ -266,7 +597,7 @@ def _cascade_debt_deletion(debt_id: str, debt_row: pd.Series, now: datetime):
     - Otherwise best-effort: match description containing debt.name and same user.
     """
 
-    entries_df = load_versions("entries", Entry)
+    entries_df = await load_versions_async("entries", Entry)
 
     sel = entries_df[
         (entries_df["debt_id"] == str(debt_id))
@@ -274,15 +605,17 @@ def _cascade_debt_deletion(debt_id: str, debt_row: pd.Series, now: datetime):
         & (~entries_df.get("is_deleted", False).fillna(False))
     ]
 
-    for _, row in sel.iterrows():
-        mark_old_version_as_stale("entries", row["entry_id"], "entry_id")
-        data = row.to_dict()
-        data.update({"updated_at": now, "is_current": True, "is_deleted": True})
-        save_version(Entry(**data), "entries", "entry_id")
-        log_action(debt_row.get("user_id"), "cascade_delete", "entries", row["entry_id"])
+    # One pass supersedes every installment; the deleted versions join the same commit
+    await supersede_records_async("entries", "entry_id", sel["entry_id"])
+    writes = []
+    for data in sel.to_dict(orient="records"):
+        data.update({"updated_at": now, "is_current": True, "is_deleted": True, "version": next_version(data)})
+        writes.append(save_version_async(Entry(**data), "entries", "entry_id"))
+        writes.append(log_action_async(debt_row.get("user_id"), "cascade_delete", "entries", data["entry_id"]))
+    await asyncio.gather(*writes)
 
 
-def log_action(
+async def log_action_async(
     user_id: str | None, action: str, resource_type: str, resource_id: str | None, details: dict | None = None
 ):
     # Normalize details: convert UUIDs and datetimes to strings
@@ -306,7 +639,8 @@ def log_action(
         details=details_json,
     )
 
-    save_version(entry, "audit_logs", "log_id")
+    with AUDIT_WRITES_IN_FLIGHT.track_inprogress():
+        await save_version_async(entry, "audit_logs", "log_id")
 
 
 def generate_debt_entries(
@@ -360,3 +694,24 @@ def generate_debt_entries(
         entries.append(entry)
 
     return entries
+
+
+def _blocking(fn):
+    """Expose a storage coroutine as a blocking call for scripts and tests."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return run_sync(fn(*args, **kwargs))
+
+    wrapper.__name__ = fn.__name__.removesuffix("_async")
+    return wrapper
+
+
+mark_old_version_as_stale = _blocking(mark_old_version_as_stale_async)
+cascade_stale = _blocking(cascade_stale_async)
+save_version = _blocking(save_version_async)
+load_versions = _blocking(load_versions_async)
+resolve_id_by_name = _blocking(resolve_id_by_name_async)
+resolve_name_by_id = _blocking(resolve_name_by_id_async)
+soft_delete_record = _blocking(soft_delete_record_async)
+log_action = _blocking(log_action_async)
@@ -0,0 +1,92 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from fastapi import Request
+from app.services.metrics import REQUEST_LATENCY, UNMATCHED_ROUTE, observe_s3_call
+
+logger = logging.getLogger("app.requests")
+
+
+@dataclass
+class StorageStats:
+    """Storage work performed on behalf of a single request."""
+
+    list_calls: int = 0
+    get_calls: int = 0
+    put_calls: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    rows_decoded: int = 0
+    s3_seconds: float = 0.0
+
+
+_current_stats: ContextVar[StorageStats | None] = ContextVar("storage_stats", default=None)
+
+
+def current_stats() -> StorageStats | None:
+    return _current_stats.get()
+
+
+def record_call(kind: str, seconds: float, nbytes: int = 0) -> None:
+    """Account one S3 call ("list", "get" or "put") against the current request and the process metrics."""
+    observe_s3_call(kind, seconds, nbytes)
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    setattr(stats, f"{kind}_calls", getattr(stats, f"{kind}_calls") + 1)
+    stats.s3_seconds += seconds
+    if kind == "get":
+        stats.bytes_read += nbytes
+    elif kind == "put":
+        stats.bytes_written += nbytes
+
+
+def record_rows(count: int) -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.rows_decoded += count
+
+
+def server_timing(stats: StorageStats, total_seconds: float) -> str:
+    calls = f"list={stats.list_calls} get={stats.get_calls} put={stats.put_calls}"
+    volume = f"rows={stats.rows_decoded} read={stats.bytes_read}B written={stats.bytes_written}B"
+    return (
+        f's3;dur={stats.s3_seconds * 1000:.1f};desc="{calls}", '
+        f'decode;desc="{volume}", '
+        f"total;dur={total_seconds * 1000:.1f}"
+    )
+
+
+async def storage_accounting_middleware(request: Request, call_next):
+    """Collect per-request storage counters, expose them as Server-Timing and log them."""
+    stats = StorageStats()
+    token = _current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+    elapsed = time.perf_counter() - started
+
+    response.headers["Server-Timing"] = server_timing(stats, elapsed)
+
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(request.method, getattr(route, "path", UNMATCHED_ROUTE), response.status_code).observe(
+        elapsed
+    )
+    logger.info(
+        json.dumps(
+            {
+                "event": "request",
+                "method": request.method,
+                "route": getattr(route, "path", request.url.path),
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 1),
+                **asdict(stats),
+                "s3_seconds": round(stats.s3_seconds, 4),
+            }
+        )
+    )
+    return response
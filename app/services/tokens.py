@@ -0,0 +1,104 @@
+"""
+Refresh token store.
+
+Tokens are partitioned by user (``refresh_tokens/user_id=<user>/refresh_token_id=<jti>/...``), so issuing,
+checking, rotating and revoking a user's tokens only lists that user's partition: none of it grows with
+the number of logins in the system. Tokens written before the partitioning
+(``refresh_tokens/refresh_token_id=<jti>/...``) are honoured until they expire and are purged.
+"""
+
+import asyncio
+import io
+from datetime import datetime, timedelta
+from uuid import UUID
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+from app.config import settings
+from app.models.schemas.user import RefreshToken
+from app.services import revocations
+from app.services.commitlog import VERSIONS_PREFIX, current_state, transaction, transaction_of
+from app.services.objectstore import delete_many, get_many, list_keys
+from app.services.storage import purge_expired_records_async, save_version_async
+
+RECORD_TYPE = "refresh_tokens"
+LEGACY_PREFIX = f"{RECORD_TYPE}/refresh_token_id="
+# Version claimed when a token is rotated: a token can be exchanged only once, even by racing requests
+ROTATED_VERSION = 2
+
+
+def _user_prefix(user_id: UUID | str) -> str:
+    return f"{RECORD_TYPE}/user_id={user_id}/"
+
+
+def _token_of(key: str) -> str:
+    return key.split("/refresh_token_id=", 1)[1].split("/", 1)[0]
+
+
+async def _live_keys(prefix: str) -> dict[str, list[str]]:
+    """Committed, not superseded keys under ``prefix``, by token id."""
+    state = await current_state()
+    live: dict[str, list[str]] = {}
+    for key in await list_keys(prefix):
+        if state.is_visible(key) and key not in state.stale:
+            live.setdefault(_token_of(key), []).append(key)
+    return live
+
+
+async def _legacy_keys(user_id: UUID | str, token_id: str | None = None) -> dict[str, list[str]]:
+    """Live keys of the user's tokens from before the partitioning. Reads them to find their owner,
+    which stays cheap: no such token is written any more and every one of them expires.
+    """
+    live = await _live_keys(f"{LEGACY_PREFIX}{token_id}/" if token_id else LEGACY_PREFIX)
+    keys = [k for ks in live.values() for k in ks]
+    owned: dict[str, list[str]] = {}
+    for key, body in zip(keys, await get_many(keys)):
+        row = pq.read_table(io.BytesIO(body), columns=["user_id", "is_current"]).to_pylist()[0]
+        # Files from before the commit log were rewritten with is_current=False when superseded
+        if str(row["user_id"]) == str(user_id) and (transaction_of(key) or row["is_current"]):
+            owned.setdefault(_token_of(key), []).append(key)
+    return owned
+
+
+async def issue(user_id: UUID | str, expires_at: datetime) -> str:
+    """Store a new token for the user and return its id (the JWT's ``jti``)."""
+    token = RefreshToken(user_id=UUID(str(user_id)), expires_at=expires_at)
+    await save_version_async(token, RECORD_TYPE, "refresh_token_id")
+    return str(token.refresh_token_id)
+
+
+async def retire(user_id: UUID | str, token_id: str) -> None:
+    """Supersede a token being exchanged for a new one; 401 if it was revoked or already used.
+
+    Joins the caller's transaction, which fails with 412 if another request retired the token first.
+    """
+    # Reuse of a rotated or revoked token is rejected from memory, without touching storage
+    if revocations.is_revoked(token_id, await current_state()):
+        raise HTTPException(status_code=401, detail="Token expired or already used")
+    keys = (await _live_keys(f"{_user_prefix(user_id)}refresh_token_id={token_id}/")).get(token_id)
+    if not keys:
+        keys = (await _legacy_keys(user_id, token_id)).get(token_id)
+    if not keys:
+        raise HTTPException(status_code=401, detail="Token expired or already used")
+    async with transaction() as txn:
+        txn.remove(RECORD_TYPE, token_id, keys)
+        txn.claim(RECORD_TYPE, token_id, ROTATED_VERSION)
+
+
+async def revoke_all(user_id: UUID | str) -> int:
+    """Revoke every live token of the user in one commit; returns how many there were."""
+    partitioned, legacy = await asyncio.gather(_live_keys(_user_prefix(user_id)), _legacy_keys(user_id))
+    live = {**legacy, **partitioned}
+    async with transaction() as txn:
+        for token_id, keys in live.items():
+            txn.remove(RECORD_TYPE, token_id, keys)
+    return len(live)
+
+
+async def purge_expired() -> int:
+    """Delete the files of tokens that were revoked, rotated or have expired; returns how many tokens."""
+    lifetime = timedelta(days=settings.refresh_token_expire_days)
+    purged = set(await purge_expired_records_async(RECORD_TYPE, RefreshToken, "refresh_token_id", lifetime))
+    # Their rotation claims too
+    claims = [k for k in await list_keys(f"{VERSIONS_PREFIX}{RECORD_TYPE}/") if k.split("/")[2] in purged]
+    await delete_many(claims)
+    return len(purged)
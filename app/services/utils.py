@@ -1,12 +1,25 @@
-from fastapi import HTTPException, Depends, Query
+from __future__ import annotations
+from typing import TYPE_CHECKING, AsyncIterator
+from fastapi import HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from app.services.auth import get_current_user
+from app.services.hashing import verify_password
+import asyncio
+import base64
+import binascii
+import functools
 import re
 from datetime import datetime, timezone
-import pandas as pd
+from app.lazy import lazy_module
 import os
-import boto3
 from botocore.exceptions import ClientError
 
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_module("pandas")
+
 
 # Utility functions for user management, password handling, and email sending
 PASSWORD_EXPIRY_DAYS = 90
@@ -38,16 +51,27 @@ def normalize_email(email: str) -> str:
     return email.strip().lower()
 
 
+async def is_recent_password(password: str, hashed_passwords: list[str]) -> bool:
+    """Whether the password matches one of the user's previous hashes; they are checked in parallel."""
+    return any(await asyncio.gather(*(verify_password(password, hashed) for hashed in hashed_passwords)))
+
+
 # AWS SES setup
 SES_REGION = os.getenv("SES_REGION", "us-east-1")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "no-reply@yourdomain.com")
 
-ses_client = boto3.client("ses", region_name=SES_REGION)
+
+@functools.cache
+def ses_client():
+    """SES client, built on first use: only processes that send email pay for boto3 and its models."""
+    import boto3
+
+    return boto3.client("ses", region_name=SES_REGION)
 
 
 def send_email(recipient: str, subject: str, body: str) -> bool:
     try:
-        ses_client.send_email(
+        ses_client().send_email(
             Source=FROM_EMAIL,
             Destination={"ToAddresses": [recipient]},
             Message={
@@ -78,6 +102,49 @@ def require_role(allowed_roles: list[str], user=Depends(get_current_user), resou
 
 def page_params(
     limit: int = Query(50, ge=1, le=500),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Records to skip; prefer cursor, which does not re-read skipped records"),
+    cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
+):
+    return {"limit": limit, "offset": offset, "cursor": cursor}
+
+
+def encode_cursor(key: str | None) -> str | None:
+    """Opaque pagination cursor for a storage key."""
+    return base64.urlsafe_b64encode(key.encode()).decode() if key else None
+
+
+def decode_cursor(cursor: str | None, prefix: str) -> str | None:
+    """Storage key of a cursor from ``encode_cursor``; it must lie under ``prefix``."""
+    if not cursor:
+        return None
+    try:
+        key = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not key.startswith(prefix):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def set_next_cursor(response: Response, key: str | None) -> None:
+    cursor = encode_cursor(key)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+
+def ndjson_response(batches: AsyncIterator[pd.DataFrame], model: type[BaseModel]) -> StreamingResponse:
+    """Stream DataFrame batches as newline-delimited JSON, one ``model`` object per line."""
+
+    async def lines():
+        async for df in batches:
+            yield "".join(model.model_validate(row).model_dump_json() + "\n" for row in df.to_dict(orient="records"))
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def as_of_param(
+    as_of: datetime | None = Query(
+        None, description="Return records as they were at this moment (ISO 8601; UTC when no offset is given)"
+    ),
 ):
-    return {"limit": limit, "offset": offset}
+    return as_of
@@ -0,0 +1,96 @@
+"""
+Cold-start benchmark: time from a fresh interpreter to the first answered request.
+
+Each run starts a new Python process that imports app.main, runs the lifespan startup and serves
+GET /health straight through the ASGI app (no server, no network), then reports the phases:
+
+    python -m scripts.benchmark_startup --runs 5 --budget 1.0
+
+With --budget the script exits non-zero when the median time to first response exceeds it, so CI
+catches import-time regressions. Modules that should stay lazy are listed in the output when importing
+the app loads them.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Imported on first use only; loading any of them with the app is a regression
+LAZY_MODULES = ["pandas", "boto3", "aiobotocore", "aiohttp", "matplotlib", "s3fs", "openpyxl"]
+
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+lazy_loaded = [m for m in %r if m in sys.modules]
+
+
+async def first_request():
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/health", "raw_path": b"/health", "query_string": b"", "headers": [], "root_path": "",
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80), "app": app.main.app,
+    }
+    async with app.main.lifespan(app.main.app):
+        ready = time.perf_counter()
+        await app.main.app(scope, receive, send)
+        return ready, time.perf_counter(), sent[0]["status"]
+
+
+ready, answered, status = asyncio.run(first_request())
+print(json.dumps({
+    "import_s": imported - started,
+    "startup_s": ready - imported,
+    "first_response_s": answered - started,
+    "status": status,
+    "lazy_loaded": lazy_loaded,
+}))
+"""
+
+
+def _run_once() -> dict:
+    env = {**os.environ, "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark")}
+    env.setdefault("S3_BUCKET", "hf-startup-benchmark")
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE % (LAZY_MODULES,)], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API's cold start.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes to time")
+    parser.add_argument("--budget", type=float, help="Fail when the median time to first response exceeds this (s)")
+    args = parser.parse_args()
+
+    runs = [_run_once() for _ in range(args.runs)]
+    result = {
+        phase: round(statistics.median(r[phase] for r in runs), 4)
+        for phase in ("import_s", "startup_s", "first_response_s")
+    }
+    result["runs"] = args.runs
+    result["lazy_loaded"] = sorted({m for r in runs for m in r["lazy_loaded"]})
+    print(json.dumps(result, indent=2))
+
+    if any(r["status"] != 200 for r in runs):
+        sys.exit("GET /health did not answer 200")
+    if result["lazy_loaded"]:
+        sys.exit(f"loaded at startup: {', '.join(result['lazy_loaded'])}")
+    if args.budget is not None and result["first_response_s"] > args.budget:
+        sys.exit(f"cold start {result['first_response_s']:.2f}s is over the {args.budget:.2f}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Micro-benchmarks for the version store primitives in app.services.storage.
+
+Measures latency and S3 call counts of save_version, load_versions (all / by id / by date),
+mark_old_version_as_stale and soft_delete_record while scaling the number of stored versions.
+
+By default an in-process Moto server is started, so no AWS access is needed:
+
+    python -m scripts.benchmark_storage --sizes 100,1000,10000,100000 --output bench.json
+
+Point it at another S3-compatible endpoint (MinIO, LocalStack, a standalone Moto server) with
+--endpoint-url, and compare two runs with --baseline old.json.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from uuid import uuid4
+
+SEED_CONCURRENCY = 200
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class CallCounter:
+    """Counts S3 API calls issued through the storage client, by operation name."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+
+    def __call__(self, model, **kwargs):
+        self.calls[model.name] += 1
+
+    def snapshot(self) -> Counter:
+        return Counter(self.calls)
+
+
+async def _measure(name, size, counter, fn, ids, repeat):
+    samples, rows = [], None
+    before = counter.snapshot()
+    for i in range(repeat):
+        target = ids[i % len(ids)] if ids else None
+        started = time.perf_counter()
+        result = await fn(target)
+        samples.append((time.perf_counter() - started) * 1000)
+        if hasattr(result, "__len__"):
+            rows = len(result)
+    calls = counter.snapshot() - before
+    return {
+        "size": size,
+        "op": name,
+        "samples": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(_percentile(samples, 50), 3),
+        "p95_ms": round(_percentile(samples, 95), 3),
+        "max_ms": round(max(samples), 3),
+        "s3_calls_per_op": {op: round(n / len(samples), 2) for op, n in sorted(calls.items())},
+        "rows": rows,
+    }
+
+
+async def _seed(storage, Entry, record_type: str, size: int) -> list[str]:
+    today = date.today()
+    ids = []
+    for start in range(0, size, SEED_CONCURRENCY):
+        batch = []
+        for i in range(start, min(size, start + SEED_CONCURRENCY)):
+            entry = Entry(
+                user_id=uuid4(),
+                account_id=uuid4(),
+                household_id=uuid4(),
+                entry_date=today - timedelta(days=i % 365),
+                value_date=today - timedelta(days=i % 365),
+                type="expense",
+                category="groceries",
+                amount=round(random.uniform(1, 500), 2),
+                description=f"benchmark entry {i}",
+            )
+            ids.append(str(entry.entry_id))
+            batch.append(storage.save_version_async(entry, record_type, "entry_id"))
+        await asyncio.gather(*batch)
+    return ids
+
+
+async def run_suite(sizes: list[int], repeat: int) -> list[dict]:
+    from app.models.schemas.entry import Entry
+    from app.services import objectstore, storage
+
+    counter = CallCounter()
+    client = await objectstore.get_client()
+    client.meta.events.register("before-call.s3", counter)
+
+    results = []
+    for size in sizes:
+        record_type = f"bench{size}-entries"
+        started = time.perf_counter()
+        ids = await _seed(storage, Entry, record_type, size)
+        print(f"seeded {size} versions in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        sampled = random.sample(ids, min(len(ids), 2 * repeat))
+        stale_ids, delete_ids = sampled[::2], sampled[1::2]
+        now = datetime.now(timezone.utc)
+
+        async def save(_):
+            entry = Entry(
+                user_id=uuid4(),
+                account_id=uuid4(),
+                household_id=uuid4(),
+                entry_date=date.today(),
+                value_date=date.today(),
+                type="income",
+                category="salary",
+                amount=1.0,
+            )
+            await storage.save_version_async(entry, record_type, "entry_id")
+
+        cases = [
+            ("save_version", save, None),
+            ("load_versions.all", lambda _: storage.load_versions_async(record_type, Entry), None),
+            ("load_versions.by_id", lambda i: storage.load_versions_async(record_type, Entry, record_id=i), stale_ids),
+            (
+                "load_versions.by_date",
+                lambda _: storage.load_versions_async(record_type, Entry, start=now - timedelta(days=1), end=now),
+                None,
+            ),
+            (
+                "mark_old_version_as_stale",
+                lambda i: storage.mark_old_version_as_stale_async(record_type, i, "entry_id"),
+                stale_ids,
+            ),
+            (
+                "soft_delete_record",
+                lambda i: storage.soft_delete_record_async(record_type, i, "entry_id", Entry, require_owner=False),
+                delete_ids,
+            ),
+        ]
+        for name, fn, ids_arg in cases:
+            result = await _measure(name, size, counter, fn, ids_arg, repeat)
+            results.append(result)
+            print(f"{size:>7} {name:<28} mean={result['mean_ms']:>10.2f}ms", file=sys.stderr)
+
+    await objectstore.close_client()
+    return results
+
+
+def _compare(results: list[dict], baseline_path: str) -> None:
+    with open(baseline_path) as fh:
+        baseline = {(r["size"], r["op"]): r for r in json.load(fh)["results"]}
+    print(f"{'size':>7} {'op':<28} {'base ms':>10} {'new ms':>10} {'ratio':>7}", file=sys.stderr)
+    for r in results:
+        old = baseline.get((r["size"], r["op"]))
+        if old is None:
+            continue
+        ratio = r["mean_ms"] / old["mean_ms"] if old["mean_ms"] else float("inf")
+        print(
+            f"{r['size']:>7} {r['op']:<28} {old['mean_ms']:>10.2f} {r['mean_ms']:>10.2f} {ratio:>7.2f}", file=sys.stderr
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the S3 version store primitives.")
+    parser.add_argument(
+        "--sizes", default="100,1000,10000", help="Comma-separated stored version counts (up to 100000)"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per operation and size")
+    parser.add_argument("--endpoint-url", help="S3-compatible endpoint; defaults to an in-process Moto server")
+    parser.add_argument("--bucket", help="Bucket to use (created if missing); defaults to a fresh one")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = args.endpoint_url
+    if endpoint_url is None:
+        from moto.server import ThreadedMotoServer
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+        server.start()
+        endpoint_url = "http://{}:{}".format(*server.get_host_and_port())
+        for var in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+            os.environ.setdefault(var, "bench")
+
+    bucket = args.bucket or f"hf-bench-{uuid4().hex[:12]}"
+    os.environ["S3_ENDPOINT_URL"] = endpoint_url
+    os.environ["S3_BUCKET"] = bucket
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import boto3
+    from app.config import settings
+
+    s3 = boto3.client("s3", region_name=settings.aws_region, endpoint_url=endpoint_url)
+    if bucket not in {b["Name"] for b in s3.list_buckets().get("Buckets", [])}:
+        if settings.aws_region == "us-east-1":
+            s3.create_bucket(Bucket=bucket)
+        else:
+            s3.create_bucket(Bucket=bucket, CreateBucketConfiguration={"LocationConstraint": settings.aws_region})
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    try:
+        results = asyncio.run(run_suite(sizes, args.repeat))
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "endpoint": "moto" if server is not None else endpoint_url,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        _compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,13 @@ from app.models.schemas.account import Account
 from app.models.schemas.household import Household
 from app.services.storage import save_version, resolve_id_by_name
 from app.services.auth import get_current_user
+from app.services.objectstore import run_sync
 from app.models.enums import EntryType, Category
 
 
 def import_entries_from_csv(path: str, token: str):
     df = pd.read_csv(path)
-    user = get_current_user(token)
+    user = run_sync(get_current_user(token))
 
     required_cols = {"account_name", "household_name", "entry_date", "value_date", "type", "category", "amount"}
     missing = required_cols - set(df.columns)
@@ -0,0 +1,70 @@
+"""
+Move records written before their type was partitioned by user into the per-user layout, e.g.
+``password_history/history_id=<id>/...`` to ``password_history/user_id=<user>/history_id=<id>/...``:
+
+    python -m scripts.partition_records password_history password_reset_tokens
+
+Reads by user only list the user's partition, so records left in the old layout are not found
+(a password changed before the move would not count as a previous password). Current versions are
+rewritten under their user and the old ones superseded in the same commit, then the old files are
+deleted. Safe to rerun. Refresh tokens need no move: old ones are honoured until they expire.
+"""
+
+import argparse
+import io
+import sys
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+from app.models.arrow import conform
+from app.models.schemas.user import PasswordHistory, PasswordResetToken
+from app.services.commitlog import current_state, transaction
+from app.services.objectstore import delete_many, get_many, list_keys, run_sync
+from app.services.storage import save_version_async
+
+MOVABLE: dict[str, tuple[type[BaseModel], str]] = {
+    "password_history": (PasswordHistory, "history_id"),
+    "password_reset_tokens": (PasswordResetToken, "token_id"),
+}
+# Records rewritten per commit
+BATCH = 500
+
+
+async def move(record_type: str) -> int:
+    """Rewrite the type's current records under their user; returns how many were moved."""
+    model, id_field = MOVABLE[record_type]
+    state = await current_state()
+    old = [k for k in await list_keys(f"{record_type}/{id_field}=") if state.is_visible(k)]
+    moved = 0
+    for start in range(0, len(old), BATCH):
+        keys = old[start : start + BATCH]
+        ids = []
+        async with transaction() as txn:
+            for key, body in zip(keys, await get_many(keys)):
+                row = conform(pq.read_table(io.BytesIO(body)), model).to_pylist()[0]
+                # Files from before the commit log were rewritten with is_current=False when superseded
+                if key not in state.stale and row["is_current"]:
+                    await save_version_async(model(**row), record_type, id_field)
+                    moved += 1
+                txn.remove(record_type, row[id_field], [key])
+                ids.append(row[id_field])
+        await delete_many(keys)
+        async with transaction() as txn:
+            for record_id, key in zip(ids, keys):
+                txn.forget(record_type, record_id, [key])
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move records into the per-user layout.")
+    parser.add_argument("record_types", nargs="+", help=f"Any of: {', '.join(MOVABLE)}")
+    args = parser.parse_args()
+
+    unknown = [t for t in args.record_types if t not in MOVABLE]
+    if unknown:
+        sys.exit(f"not movable: {', '.join(unknown)}")
+    for record_type in args.record_types:
+        print(f"{record_type}: {run_sync(move(record_type))} moved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Run maintenance jobs once, outside the scheduler (no lease is taken):
+
+    python -m scripts.run_job purge_expired_tokens
+    python -m scripts.run_job --list
+"""
+
+import argparse
+import sys
+from app.services.objectstore import run_sync
+from app.services.scheduler import JOBS, intervals, run_job
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run maintenance jobs once.")
+    parser.add_argument("jobs", nargs="*", help="Jobs to run, in order")
+    parser.add_argument("--list", action="store_true", help="List the jobs and their intervals")
+    args = parser.parse_args()
+
+    if args.list or not args.jobs:
+        for name, interval in intervals().items():
+            print(f"{name:<24} every {interval:g}s" if interval > 0 else f"{name:<24} disabled")
+        return
+
+    unknown = [name for name in args.jobs if name not in JOBS]
+    if unknown:
+        sys.exit(f"unknown job(s): {', '.join(unknown)}")
+    for name in args.jobs:
+        print(f"{name}: {run_sync(run_job(name))}")
+
+
+if __name__ == "__main__":
+    main()
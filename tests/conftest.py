@@ -13,14 +13,15 @@ os.environ.setdefault("S3_BUCKET", f"hf-test-{uuid4().hex}")
 
 import pytest
 from fastapi.testclient import TestClient
-from moto import mock_aws
+from moto.server import ThreadedMotoServer
 import boto3
 
 # Import after env is set so settings reads the values above
 from app.config import settings
 import app.main as app
 
-from app.services.storage import load_versions, save_version
+from app.services import commitlog, hottables, sharedcache
+from app.services.storage import load_versions, save_version, mark_old_version_as_stale
 from app.models.schemas.user import User
 
 
@@ -35,9 +36,15 @@ def _empty_bucket(s3, bucket_name: str):
 
 @pytest.fixture(scope="session", autouse=True)
 def aws_moto():
-    """Global Moto for all tests (no real AWS calls)."""
-    with mock_aws():
-        yield
+    """Global Moto server for all tests (no real AWS calls).
+
+    The async S3 client talks HTTP, so Moto runs as a local server instead of patching botocore in-process.
+    """
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    settings.s3_endpoint_url = "http://{}:{}".format(*server.get_host_and_port())
+    yield
+    server.stop()
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -45,7 +52,7 @@ def setup_s3(aws_moto):
     """Create the test bucket inside Moto."""
     bucket_name = settings.s3_bucket
     region = settings.aws_region
-    s3 = boto3.client("s3", region_name=region)
+    s3 = boto3.client("s3", region_name=region, endpoint_url=settings.s3_endpoint_url)
 
     # us-east-1 doesn't need LocationConstraint; others do
     if region == "us-east-1":
@@ -67,6 +74,10 @@ def clean_bucket(setup_s3):
     """Ensure the bucket is empty before each test."""
     s3, bucket_name = setup_s3
     _empty_bucket(s3, bucket_name)
+    # The log went with the bucket
+    commitlog._state = commitlog.LogState()
+    sharedcache.set_backend(sharedcache.MemoryBackend())
+    hottables.reset()
     yield
 
 
@@ -91,6 +102,7 @@ def superuser_client(client):
     users_df = load_versions("users", User, record_id=user_id)
     row = users_df.iloc[0].to_dict()
     row.update({"is_superuser": True})
+    mark_old_version_as_stale("users", user_id, "user_id")
     save_version(User(**row), "users", "user_id")
 
     # Login
@@ -0,0 +1,159 @@
+import json
+from datetime import date, timedelta
+from uuid import uuid4
+import pytest
+from fastapi import HTTPException
+from app.models.enums import Category, EntryType
+from app.models.schemas.entry import Entry
+from app.services import storage
+from app.services.commitlog import COMMITS_PREFIX, transaction
+from app.services.objectstore import run_sync
+
+
+def _entry() -> Entry:
+    return Entry(
+        user_id=uuid4(),
+        account_id=uuid4(),
+        household_id=uuid4(),
+        entry_date=date(2025, 7, 1),
+        value_date=date(2025, 7, 1),
+        type=EntryType.expense,
+        category=Category.groceries,
+        amount=10.0,
+    )
+
+
+def _manifests(s3, bucket):
+    resp = s3.list_objects_v2(Bucket=bucket, Prefix=COMMITS_PREFIX)
+    return [json.loads(s3.get_object(Bucket=bucket, Key=o["Key"])["Body"].read()) for o in resp.get("Contents", [])]
+
+
+def test_transaction_commits_all_writes_in_one_manifest(setup_s3):
+    s3, bucket = setup_s3
+    entries = [_entry() for _ in range(3)]
+
+    async def write():
+        async with transaction():
+            for e in entries:
+                await storage.save_version_async(e, "entries", "entry_id")
+
+    run_sync(write())
+
+    manifests = _manifests(s3, bucket)
+    assert len(manifests) == 1
+    assert {a["record_id"] for a in manifests[0]["actions"]} == {str(e.entry_id) for e in entries}
+    assert len(storage.load_versions("entries", Entry)) == 3
+
+
+def test_failed_transaction_leaves_nothing_visible(setup_s3):
+    s3, bucket = setup_s3
+    kept = _entry()
+    storage.save_version(kept, "entries", "entry_id")
+
+    async def failing():
+        async with transaction():
+            await storage.mark_old_version_as_stale_async("entries", kept.entry_id, "entry_id")
+            await storage.save_version_async(_entry(), "entries", "entry_id")
+            raise HTTPException(status_code=409, detail="conflict")
+
+    with pytest.raises(HTTPException):
+        run_sync(failing())
+
+    df = storage.load_versions("entries", Entry)
+    assert df["entry_id"].tolist() == [str(kept.entry_id)]
+    assert df["is_current"].all()
+
+
+def test_uncommitted_data_files_are_ignored(setup_s3):
+    s3, bucket = setup_s3
+    storage.save_version(_entry(), "entries", "entry_id")
+    committed = s3.list_objects_v2(Bucket=bucket, Prefix="entries/")["Contents"][0]["Key"]
+
+    # A data file whose transaction never wrote its manifest (e.g. the process died mid-commit)
+    orphan = committed[: -len("00000000000000000000000000000000.parquet")] + uuid4().hex + ".parquet"
+    s3.copy_object(Bucket=bucket, Key=orphan, CopySource={"Bucket": bucket, "Key": committed})
+
+    assert len(storage.load_versions("entries", Entry)) == 1
+
+
+def test_superseded_versions_are_resolved_from_the_log(setup_s3):
+    s3, bucket = setup_s3
+    entry = _entry()
+    storage.save_version(entry, "entries", "entry_id")
+    key = s3.list_objects_v2(Bucket=bucket, Prefix="entries/")["Contents"][0]["Key"]
+    etag = s3.head_object(Bucket=bucket, Key=key)["ETag"]
+
+    storage.mark_old_version_as_stale("entries", entry.entry_id, "entry_id")
+
+    # The data file is not rewritten
+    assert s3.head_object(Bucket=bucket, Key=key)["ETag"] == etag
+    assert not storage.load_versions("entries", Entry, record_id=entry.entry_id)["is_current"].any()
+
+
+def test_cold_start_resumes_from_checkpoint(setup_s3, monkeypatch):
+    from app.services import commitlog
+
+    s3, bucket = setup_s3
+    entry = _entry()
+    storage.save_version(entry, "entries", "entry_id")
+    # Commits never write checkpoints themselves: the scheduler's lease holder does
+    assert s3.list_objects_v2(Bucket=bucket, Prefix=commitlog.CHECKPOINTS_PREFIX)["KeyCount"] == 0
+    run_sync(commitlog.write_checkpoint())
+    storage.save_version(_entry(), "entries", "entry_id")
+    run_sync(commitlog.write_checkpoint())
+    storage.save_version(_entry(), "entries", "entry_id")
+    run_sync(commitlog.write_checkpoint())
+    # Superseded checkpoints are deleted, but for the one a restoring process may have just listed
+    assert s3.list_objects_v2(Bucket=bucket, Prefix=commitlog.CHECKPOINTS_PREFIX)["KeyCount"] == 2
+
+    # A fresh process with the manifests gone must still see the committed files
+    for obj in s3.list_objects_v2(Bucket=bucket, Prefix=COMMITS_PREFIX)["Contents"]:
+        s3.delete_object(Bucket=bucket, Key=obj["Key"])
+    monkeypatch.setattr(commitlog, "_state", commitlog.LogState())
+
+    assert str(entry.entry_id) in storage.load_versions("entries", Entry)["entry_id"].tolist()
+
+
+def test_log_state_drops_swept_transactions_and_deleted_files(monkeypatch):
+    from app.services import commitlog, maintenance
+    from app.services.objectstore import list_keys
+
+    entry = _entry()
+    storage.save_version(entry, "entries", "entry_id")
+    storage.mark_old_version_as_stale("entries", entry.entry_id, "entry_id")
+    state = run_sync(commitlog.current_state())
+    (key,) = run_sync(list_keys("entries/"))
+    assert commitlog.transaction_of(key) in state.committed and key in state.stale
+
+    # Once orphans older than the cutoff are swept, the ids of transactions from before it are dropped
+    monkeypatch.setattr(maintenance, "CLAIM_TIMEOUT", timedelta(seconds=-30))
+    run_sync(maintenance.sweep_orphans())
+    assert commitlog.transaction_of(key) not in state.committed and state.committed_before is not None
+    assert state.is_visible(key)
+    assert storage.load_versions("entries", Entry)["entry_id"].tolist() == [str(entry.entry_id)]
+
+    # A fresh process restoring a checkpoint is as compact
+    run_sync(commitlog.write_checkpoint())
+    monkeypatch.setattr(commitlog, "_state", commitlog.LogState())
+    restored = run_sync(commitlog.current_state())
+    assert restored.committed_before == state.committed_before and restored.is_visible(key)
+
+    # Deleted files are dropped from the superseded keys
+    async def delete():
+        async with transaction() as txn:
+            txn.forget("entries", str(entry.entry_id), [key])
+
+    run_sync(delete())
+    assert key not in restored.stale and restored.compactions == 1
+
+
+def test_transaction_running_past_the_claim_timeout_writes_nothing(setup_s3, monkeypatch):
+    from app.services import commitlog
+
+    s3, bucket = setup_s3
+    # Every file now looks stamped before the sweep cutoff
+    monkeypatch.setattr(commitlog, "CLAIM_TIMEOUT", timedelta(0))
+    with pytest.raises(HTTPException) as exc:
+        storage.save_version(_entry(), "entries", "entry_id")
+    assert exc.value.status_code == 503
+    assert s3.list_objects_v2(Bucket=bucket)["KeyCount"] == 0
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import date
+from uuid import uuid4
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.models.schemas.entry import Entry
+from app.services import storage
+from app.services.commitlog import transaction
+from app.services.objectstore import run_sync
+
+
+def test_account_update_honours_if_match(client: TestClient, auth_headers):
+    r = client.post("/households/", json={"name": "ETag Household"}, headers=auth_headers)
+    household_id = r.json()["household_id"]
+    r = client.post("/accounts/", json={"name": "ETag Account", "household_id": household_id}, headers=auth_headers)
+    account_id = r.json()["account_id"]
+
+    r = client.get(f"/accounts/{account_id}", headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["ETag"] == '"1"'
+
+    r = client.put(f"/accounts/{account_id}", params={"name": "Stale"}, headers={**auth_headers, "If-Match": '"7"'})
+    assert r.status_code == 412
+
+    r = client.put(f"/accounts/{account_id}", params={"name": "Renamed"}, headers={**auth_headers, "If-Match": '"1"'})
+    assert r.status_code == 200
+    assert r.headers["ETag"] == '"2"'
+
+    r = client.get(f"/accounts/{account_id}", headers=auth_headers)
+    assert r.json()["name"] == "Renamed"
+    assert r.headers["ETag"] == '"2"'
+
+
+def test_concurrent_writers_cannot_commit_the_same_version():
+    entry = Entry(
+        user_id=uuid4(),
+        account_id=uuid4(),
+        household_id=uuid4(),
+        entry_date=date(2025, 7, 1),
+        value_date=date(2025, 7, 1),
+        type="expense",
+        category="groceries",
+        amount=10.0,
+    )
+    storage.save_version(entry, "entries", "entry_id")
+
+    async def update(amount: float):
+        nxt = entry.model_copy(update={"amount": amount, "version": 2})
+        async with transaction():
+            await storage.mark_old_version_as_stale_async("entries", entry.entry_id, "entry_id")
+            await storage.save_version_async(nxt, "entries", "entry_id")
+
+    async def race():
+        return await asyncio.gather(update(20.0), update(30.0), return_exceptions=True)
+
+    results = run_sync(race())
+    failures = [r for r in results if isinstance(r, HTTPException)]
+    assert len(failures) == 1 and failures[0].status_code == 412
+
+    df = storage.load_versions("entries", Entry, record_id=entry.entry_id)
+    current = df[df["is_current"]]
+    assert len(current) == 1
+    assert current["version"].iloc[0] == 2
+
+    with pytest.raises(HTTPException):
+        storage.save_version(entry.model_copy(update={"version": 2}), "entries", "entry_id")
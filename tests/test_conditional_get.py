@@ -0,0 +1,69 @@
+from fastapi import Response
+from fastapi.testclient import TestClient
+from app.api import household, summaries
+
+
+def test_unchanged_lists_are_not_modified(client: TestClient, auth_headers, another_auth_headers, monkeypatch):
+    r = client.get("/households/", headers=auth_headers)
+    assert r.status_code == 200
+    tag = r.headers["ETag"]
+
+    # Unchanged: 304 without scanning the records
+    def no_scan(*args, **kwargs):
+        raise AssertionError("households were scanned")
+
+    with monkeypatch.context() as m:
+        m.setattr(household, "load_page_async", no_scan)
+        r = client.get("/households/", headers={**auth_headers, "If-None-Match": tag})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == tag
+
+    # A wildcard is not a tag the caller holds
+    assert client.get("/households/", headers={**auth_headers, "If-None-Match": "*"}).status_code == 200
+
+    # Other parameters or another caller get other tags
+    assert client.get("/households/", params={"limit": 5}, headers=auth_headers).headers["ETag"] != tag
+    assert client.get("/households/", headers=another_auth_headers).headers["ETag"] != tag
+
+    # Household lists follow the generation of every household, so any new one changes the tag
+    client.post("/households/", json={"name": "Someone else's"}, headers=another_auth_headers)
+    r = client.get("/households/", headers={**auth_headers, "If-None-Match": tag})
+    assert r.status_code == 200
+    tag = r.headers["ETag"]
+
+    # A write of the user's own data changes it
+    client.post("/households/", json={"name": "Mine"}, headers=auth_headers)
+    r = client.get("/households/", headers={**auth_headers, "If-None-Match": tag})
+    assert r.status_code == 200
+    assert [h["name"] for h in r.json()] == ["Mine"]
+
+
+def test_entry_list_generation_is_per_user(client: TestClient, auth_headers, another_auth_headers):
+    tag = client.get("/entries/", headers=auth_headers).headers["ETag"]
+
+    # Another user's household (and its memberships) leaves this user's entries untouched
+    client.post("/households/", json={"name": "Elsewhere"}, headers=another_auth_headers)
+    assert client.get("/entries/", headers={**auth_headers, "If-None-Match": tag}).status_code == 304
+
+    client.post("/households/", json={"name": "Here"}, headers=auth_headers)
+    assert client.get("/entries/", headers={**auth_headers, "If-None-Match": tag}).status_code == 200
+
+    r = client.get("/summaries/summary", headers=auth_headers)
+    r = client.get("/summaries/summary", headers={**auth_headers, "If-None-Match": r.headers["ETag"]})
+    assert r.status_code == 304
+
+
+def test_household_summary_authorizes_before_not_modified(
+    client: TestClient, auth_headers, another_auth_headers, monkeypatch
+):
+    household_id = client.post("/households/", json={"name": "Private"}, headers=auth_headers).json()["household_id"]
+
+    # Even a tag that matches must not answer a non-member with 304, which would confirm the household
+    async def matching_tag(*args, **kwargs):
+        return Response(status_code=304)
+
+    monkeypatch.setattr(summaries, "conditional_get", matching_tag)
+    r = client.get("/summaries/summary", params={"household_id": household_id}, headers=another_auth_headers)
+    assert r.status_code == 403
+    r = client.get("/summaries/summary", params={"household_id": household_id}, headers=auth_headers)
+    assert r.status_code == 304
@@ -76,3 +76,49 @@ def test_debt_creates_entries(client: TestClient):
     # Verify related entries removed
     r = client.get("/entries/", headers=headers)
     assert all(e["debt_id"] != debt_id for e in r.json())
+
+
+def test_debt_installments_are_superseded_in_one_pass(client: TestClient, monkeypatch):
+    from app.api import debts
+    from app.services import storage
+
+    email = f"batch-{uuid4().hex[:6]}@example.com"
+    r = client.post("/users/register", json={"email": email, "user_name": "batch", "password": "Batch123!"})
+    user_id = r.json()["user_id"]
+    tokens = client.post("/users/login", json={"email": email, "password": "Batch123!"}).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    household_id = client.post("/households/", json={"name": "Batch Household"}, headers=headers).json()["household_id"]
+    account = {"name": "Batch Account", "household_id": household_id}
+    account_id = client.post("/accounts/", json=account, headers=headers).json()["account_id"]
+    client.post(f"/accounts/{account_id}/assign-user", params={"target_user_id": user_id}, headers=headers)
+    debt_payload = {
+        "user_id": user_id,
+        "account_name": "Batch Account",
+        "household_name": "Batch Household",
+        "name": "Sofa",
+        "principal": 600.0,
+        "interest_rate": 0.0,
+        "installments": 6,
+        "start_date": str(date.today()),
+        "due_day": date.today().day,
+    }
+    debt_id = client.post("/debts/", json=debt_payload, headers=headers).json()["debt_id"]
+
+    single = []
+    original = storage.mark_old_version_as_stale_async
+
+    async def mark_old_version_as_stale_async(record_type, *args, **kwargs):
+        single.append(record_type)
+        return await original(record_type, *args, **kwargs)
+
+    monkeypatch.setattr(storage, "mark_old_version_as_stale_async", mark_old_version_as_stale_async)
+    monkeypatch.setattr(debts, "mark_old_version_as_stale_async", mark_old_version_as_stale_async)
+
+    r = client.put(f"/debts/{debt_id}", json={"installments": 3}, headers=headers)
+    assert r.status_code == 200
+    entries = [e for e in client.get("/entries/", headers=headers).json() if e["debt_id"] == debt_id]
+    assert len(entries) == 3
+
+    assert client.delete(f"/debts/{debt_id}", headers=headers).status_code == 200
+    assert all(e["debt_id"] != debt_id for e in client.get("/entries/", headers=headers).json())
+    assert "entries" not in single
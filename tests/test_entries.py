@@ -1,9 +1,12 @@
 import pytest
 from fastapi.testclient import TestClient
 from uuid import uuid4
-from datetime import date
+from datetime import date, datetime, timezone
 import io
+import json
 import pandas as pd
+import pyarrow.parquet as pq
+from app.models.schemas.entry import EntryOut
 
 
 def test_entries_full_lifecycle(client: TestClient):
@@ -191,3 +194,99 @@ def test_import_entries_xlsx(client):
     r = client.get("/entries/", headers=headers)
     entries = r.json()
     assert any(e["description"] == "XLSX row 1" for e in entries)
+
+
+def test_list_entries_as_of(client):
+    headers, household_id, account_id = _bootstrap_user_household_account(client)
+    user_id = client.get("/users/me", headers=headers).json()["user_id"]
+    before = datetime.now(timezone.utc).isoformat()
+
+    payload = {
+        "user_id": user_id,
+        "account_name": "Import ACC",
+        "household_name": "Import HH",
+        "entry_date": str(date.today()),
+        "value_date": str(date.today()),
+        "type": "expense",
+        "category": "groceries",
+        "amount": 42.5,
+        "description": "Original",
+    }
+    r = client.post("/entries/", json=payload, headers=headers)
+    assert r.status_code == 200
+    entry_id = r.json()["entry_id"]
+    created = datetime.now(timezone.utc).isoformat()
+
+    r = client.put(f"/entries/{entry_id}", json={**payload, "amount": 55.0}, headers=headers)
+    assert r.status_code == 200
+    updated = datetime.now(timezone.utc).isoformat()
+
+    r = client.delete(f"/entries/{entry_id}", headers=headers)
+    assert r.status_code == 200
+
+    def amounts(as_of=None):
+        params = {"as_of": as_of} if as_of else {}
+        r = client.get("/entries/", params=params, headers=headers)
+        assert r.status_code == 200
+        return [float(e["amount"]) for e in r.json() if e["entry_id"] == entry_id]
+
+    assert amounts(before) == []
+    assert amounts(created) == [42.5]
+    assert amounts(updated) == [55.0]
+    assert amounts() == []
+
+    r = client.get("/summaries/summary", params={"as_of": created}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()["total"] == 42.5
+
+
+def test_export_entries_streams_ndjson(client):
+    headers, household_id, account_id = _bootstrap_user_household_account(client)
+    user_id = client.get("/users/me", headers=headers).json()["user_id"]
+    for i in range(3):
+        payload = {
+            "user_id": user_id,
+            "account_name": "Import ACC",
+            "household_name": "Import HH",
+            "entry_date": str(date.today()),
+            "value_date": str(date.today()),
+            "type": "expense",
+            "category": "groceries",
+            "amount": 10 + i,
+            "description": f"Export {i}",
+        }
+        assert client.post("/entries/", json=payload, headers=headers).status_code == 200
+
+    with client.stream("GET", "/entries/export", headers=headers) as r:
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in r.iter_lines() if line]
+
+    assert sorted(row["description"] for row in rows) == ["Export 0", "Export 1", "Export 2"]
+    assert [row["entry_id"] for row in rows] == sorted(row["entry_id"] for row in rows)
+    assert set(rows[0]) == set(EntryOut.model_fields)
+
+
+def test_export_entries_as_parquet(client):
+    headers, household_id, account_id = _bootstrap_user_household_account(client)
+    user_id = client.get("/users/me", headers=headers).json()["user_id"]
+    for entry_date in ["2025-07-01", "2025-08-01"]:
+        payload = {
+            "user_id": user_id,
+            "account_name": "Import ACC",
+            "household_name": "Import HH",
+            "entry_date": entry_date,
+            "value_date": entry_date,
+            "type": "expense",
+            "category": "groceries",
+            "amount": 12.5,
+        }
+        assert client.post("/entries/", json=payload, headers=headers).status_code == 200
+
+    r = client.get("/entries/export", params={"format": "parquet", "start": "2025-08-01"}, headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/vnd.apache.parquet"
+    table = pq.read_table(io.BytesIO(r.content))
+    assert table.column_names == list(EntryOut.model_fields)
+    assert table.column("entry_date").to_pylist() == [date(2025, 8, 1)]
+    assert table.column("household_id").to_pylist() == [household_id]
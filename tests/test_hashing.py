@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.services import hashing
+from app.services.objectstore import run_sync
+from app.services.utils import is_recent_password
+
+
+@pytest.fixture(autouse=True, scope="module")
+def _stop_pool():
+    yield
+    hashing.shutdown()
+
+
+def test_hashes_round_trip_in_the_pool():
+    async def scenario():
+        old = await asyncio.gather(*(hashing.hash_password(f"Old{i}pass!") for i in range(3)))
+        assert await hashing.verify_password("Old1pass!", old[1])
+        assert await is_recent_password("Old2pass!", old)
+        assert not await is_recent_password("New0pass!", old)
+
+    run_sync(scenario())
+
+
+def test_full_queue_turns_calls_away(monkeypatch):
+    monkeypatch.setattr(hashing.settings, "hash_workers", 1)
+    monkeypatch.setattr(hashing.settings, "hash_queue_limit", 1)
+
+    async def burst():
+        return await asyncio.gather(*(hashing.hash_password("Burst1pass!") for _ in range(3)), return_exceptions=True)
+
+    outcomes = run_sync(burst())
+    # One call runs, one waits, the third is refused
+    assert [isinstance(o, str) for o in outcomes] == [True, True, False]
+    assert isinstance(outcomes[2], HTTPException) and outcomes[2].status_code == 503
+    assert hashing._pending == 0
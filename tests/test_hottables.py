@@ -0,0 +1,80 @@
+import asyncio
+import time
+import pandas as pd
+from fastapi.testclient import TestClient
+import app.main as main
+from app.models.schemas.user import User
+from app.services import hottables, storage
+from app.services.commitlog import COMMITS_PREFIX, current_state
+from app.services.objectstore import run_sync
+
+
+def _register(client: TestClient, name: str) -> str:
+    payload = {"email": f"{name}@example.com", "user_name": name, "password": "Test123!"}
+    return client.post("/users/register", json=payload).json()["user_id"]
+
+
+def _login(client: TestClient, name: str) -> dict:
+    r = client.post("/users/login", json={"email": f"{name}@example.com", "password": "Test123!"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_hot_tables_serve_reads_and_apply_the_delta(client: TestClient, monkeypatch):
+    first = _register(client, "warm")
+    cold = storage.load_versions("users", User)
+    run_sync(hottables.warm_up())
+
+    listed = []
+    original = storage.list_keys
+
+    async def list_keys(prefix, start_after=None, limit=None):
+        listed.append(prefix)
+        return await original(prefix, start_after=start_after, limit=limit)
+
+    monkeypatch.setattr(storage, "list_keys", list_keys)
+    pd.testing.assert_frame_equal(storage.load_versions("users", User), cold)
+    assert listed == []
+
+    # A later write is picked up from the commit log, without listing the table again
+    second = _register(client, "delta")
+    client.put(f"/users/{first}", json={"user_name": "renamed"}, headers=_login(client, "warm"))
+    users = storage.load_versions("users", User)
+    current = users[users["is_current"]].set_index("user_id")["user_name"]
+    assert current[first] == "renamed" and second in current.index
+    assert "users/" not in listed
+
+
+def test_requests_behind_the_log_share_one_refresh(client: TestClient, monkeypatch):
+    _register(client, "early")
+    run_sync(hottables.warm_up())
+    _register(client, "late")
+
+    listed = []
+    original = hottables.list_keys
+
+    async def list_keys(prefix, start_after=None, limit=None):
+        listed.append(prefix)
+        await asyncio.sleep(0.01)  # let every reader reach the refresh before it finishes
+        return await original(prefix, start_after=start_after, limit=limit)
+
+    monkeypatch.setattr(hottables, "list_keys", list_keys)
+
+    async def read_concurrently():
+        state = await current_state()
+        assert hottables._tables["users"].generation < state.generations["users"]
+        return await asyncio.gather(*(hottables.read("users", User, state) for _ in range(5)))
+
+    frames = run_sync(read_concurrently())
+    assert listed == [COMMITS_PREFIX]
+    assert all(set(df["user_name"]) == {"early", "late"} for df in frames)
+
+
+def test_ready_after_warm_up():
+    with TestClient(main.app) as client:
+        deadline = time.monotonic() + 10
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline, "hot tables never warmed up"
+            time.sleep(0.05)
+        assert client.get("/ready").json() == {"ready": True}
+    hottables.reset()
+    assert TestClient(main.app).get("/ready").status_code == 503
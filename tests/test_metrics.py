@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+
+def test_metrics_exposes_route_and_storage_histograms(client: TestClient, auth_headers):
+    assert client.get("/users/me", headers=auth_headers).status_code == 200
+    client.get("/does-not-exist")
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+
+    body = r.text
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/users/me",status="200"}' in body
+    assert 'route="<unmatched>",status="404"' in body
+    assert "/does-not-exist" not in body
+    assert 's3_operation_duration_seconds_count{operation="list"}' in body
+    assert 's3_operation_duration_seconds_count{operation="get"}' in body
+    assert 'bcrypt_duration_seconds_count{operation="hash"}' in body
+    assert "audit_writes_in_flight 0.0" in body
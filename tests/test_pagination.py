@@ -0,0 +1,127 @@
+from datetime import date
+from uuid import uuid4
+from app.models.schemas.entry import Entry
+from app.services import storage
+from app.services.objectstore import run_sync
+
+
+def _entry(**overrides) -> Entry:
+    data = {
+        "user_id": uuid4(),
+        "account_id": uuid4(),
+        "household_id": uuid4(),
+        "entry_date": date(2025, 7, 1),
+        "value_date": date(2025, 7, 1),
+        "type": "expense",
+        "category": "groceries",
+        "amount": 10.0,
+    }
+    return Entry(**{**data, **overrides})
+
+
+def _all_pages(limit: int, **kwargs) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        df, cursor = run_sync(storage.load_page_async("entries", Entry, limit=limit, after=cursor, **kwargs))
+        pages.append(df["entry_id"].tolist())
+        if cursor is None:
+            return pages
+
+
+def test_pages_walk_records_in_id_order(monkeypatch):
+    # Tiny listings, so a record's versions straddle two of them
+    monkeypatch.setattr(storage, "PAGE_SCAN_BATCH", 2)
+    entries = [_entry() for _ in range(5)]
+    for e in entries:
+        storage.save_version(e, "entries", "entry_id")
+
+    # A second version of one entry and a deleted one: each record appears once, deleted ones not at all
+    updated, deleted = entries[1], entries[3]
+    storage.mark_old_version_as_stale("entries", updated.entry_id, "entry_id")
+    storage.save_version(updated.model_copy(update={"amount": 99.0, "version": 2}), "entries", "entry_id")
+    storage.mark_old_version_as_stale("entries", deleted.entry_id, "entry_id")
+    storage.save_version(deleted.model_copy(update={"is_deleted": True, "version": 2}), "entries", "entry_id")
+
+    pages = _all_pages(limit=2)
+    expected = sorted(str(e.entry_id) for e in entries if e is not deleted)
+    assert [len(p) for p in pages] == [2, 2]
+    assert [i for p in pages for i in p] == expected
+
+    df, _ = run_sync(storage.load_page_async("entries", Entry, limit=10))
+    assert df.loc[df["entry_id"] == str(updated.entry_id), "amount"].tolist() == [99.0]
+
+
+def test_deep_pages_only_read_their_own_records(monkeypatch):
+    entries = [_entry() for _ in range(6)]
+    for e in entries:
+        storage.save_version(e, "entries", "entry_id")
+    _, cursor = run_sync(storage.load_page_async("entries", Entry, limit=4))
+
+    listed, read = [], []
+    original_list, original_get = storage.list_keys, storage.get_many
+
+    async def list_keys(prefix, start_after=None, limit=None):
+        keys = await original_list(prefix, start_after=start_after, limit=limit)
+        listed.extend(keys)
+        return keys
+
+    async def get_many(keys):
+        read.extend(keys)
+        return await original_get(keys)
+
+    monkeypatch.setattr(storage, "list_keys", list_keys)
+    monkeypatch.setattr(storage, "get_many", get_many)
+
+    df, cursor = run_sync(storage.load_page_async("entries", Entry, limit=4, after=cursor))
+    assert df["entry_id"].tolist() == sorted(str(e.entry_id) for e in entries)[4:]
+    assert cursor is None
+    assert len(listed) == len(read) == 2
+
+
+def test_keep_filters_before_the_page_is_filled():
+    mine = uuid4()
+    for i in range(6):
+        storage.save_version(_entry(user_id=mine if i % 2 else uuid4()), "entries", "entry_id")
+
+    async def only_mine(df):
+        return df[df["user_id"] == str(mine)]
+
+    pages = _all_pages(limit=2, keep=only_mine)
+    assert sum(len(p) for p in pages) == 3
+    assert all(p for p in pages)
+
+
+def test_audit_logs_page_newest_first(client, auth_headers):
+    for i in range(4):
+        client.post("/households/", json={"name": f"Paged {i}"}, headers=auth_headers)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        r = client.get("/audit/logs", params=params, headers=auth_headers)
+        assert r.status_code == 200
+        assert len(r.json()) <= 2
+        seen.extend(r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert len({log["log_id"] for log in seen}) == len(seen) > 2
+    timestamps = [log["timestamp"] for log in seen]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+    r = client.get("/audit/logs", params={"cursor": "bm90LWEta2V5"}, headers=auth_headers)
+    assert r.status_code == 400
+
+
+def test_stream_records_yields_bounded_batches():
+    entries = [_entry() for _ in range(5)]
+    for e in entries:
+        storage.save_version(e, "entries", "entry_id")
+
+    async def collect():
+        return [df async for df in storage.stream_records_async("entries", Entry, batch_size=2)]
+
+    batches = run_sync(collect())
+    assert [len(df) for df in batches] == [2, 2, 1]
+    assert [i for df in batches for i in df["entry_id"]] == sorted(str(e.entry_id) for e in entries)
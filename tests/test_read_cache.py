@@ -0,0 +1,52 @@
+from uuid import uuid4
+from app.models.schemas.user import User
+from app.services import storage
+from app.services.objectstore import run_sync
+from app.services.readcache import request_scope
+
+
+def _counting_list_keys(monkeypatch):
+    calls = []
+    original = storage.list_keys
+
+    async def list_keys(prefix):
+        calls.append(prefix)
+        return await original(prefix)
+
+    monkeypatch.setattr(storage, "list_keys", list_keys)
+    return calls
+
+
+def _user(name: str) -> User:
+    return User(user_id=uuid4(), user_name=name, email=f"{name}@example.com", hashed_password="x")
+
+
+def test_reads_are_memoized_until_the_request_writes(monkeypatch):
+    storage.save_version(_user("first"), "users", "user_id")
+    calls = _counting_list_keys(monkeypatch)
+
+    async def scenario():
+        with request_scope():
+            a = await storage.load_versions_async("users", User)
+            b = await storage.load_versions_async("users", User)
+            assert len(calls) == 1
+            assert len(a) == len(b) == 1
+
+            # Callers get independent copies
+            a["user_name"] = "mutated"
+            c = await storage.load_versions_async("users", User)
+            assert c["user_name"].iloc[0] == "first"
+
+            await storage.save_version_async(_user("second"), "users", "user_id")
+            d = await storage.load_versions_async("users", User)
+            assert len(calls) == 2
+            assert len(d) == 2
+
+    run_sync(scenario())
+
+
+def test_reads_outside_a_request_are_not_memoized(monkeypatch):
+    calls = _counting_list_keys(monkeypatch)
+    storage.load_versions("users", User)
+    storage.load_versions("users", User)
+    assert len(calls) == 2
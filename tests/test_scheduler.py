@@ -0,0 +1,80 @@
+from datetime import date, datetime, timedelta, timezone
+from uuid import uuid4
+from app.models.schemas.entry import Entry
+from app.models.schemas.user import RefreshToken
+from app.services import scheduler, storage
+from app.services.commitlog import VERSIONS_PREFIX, timestamp
+from app.services.objectstore import list_keys, put_bytes, run_sync
+
+
+def test_only_the_lease_holder_runs_due_jobs(monkeypatch):
+    monkeypatch.setattr(scheduler, "HOLDER", "a")
+    monkeypatch.setattr(scheduler, "LEASE_TTL", timedelta(0))
+    assert run_sync(scheduler.tick()) == sorted(scheduler.JOBS)
+    # Nothing is due again until its interval has passed
+    assert run_sync(scheduler.tick()) == []
+
+    # "a" let the lease lapse: "b" takes it over and keeps the schedule
+    monkeypatch.setattr(scheduler, "HOLDER", "b")
+    monkeypatch.setattr(scheduler, "LEASE_TTL", timedelta(minutes=1))
+    monkeypatch.setattr(scheduler.settings, "job_intervals", {"checkpoint": 0.001})
+    assert run_sync(scheduler.tick()) == ["checkpoint"]
+
+    monkeypatch.setattr(scheduler, "HOLDER", "a")
+    assert run_sync(scheduler.tick()) == []
+
+
+def test_purge_expired_tokens(monkeypatch):
+    # Tokens are only checked once they are older than the configured lifetime
+    monkeypatch.setattr(scheduler.settings, "refresh_token_expire_days", 0)
+    now = datetime.now(timezone.utc)
+    expired = RefreshToken(user_id=uuid4(), expires_at=now - timedelta(days=1))
+    valid = RefreshToken(user_id=uuid4(), expires_at=now + timedelta(days=1))
+    for token in (expired, valid):
+        storage.save_version(token, "refresh_tokens", "refresh_token_id")
+
+    assert run_sync(scheduler.run_job("purge_expired_tokens")) == 1
+    tokens = storage.load_versions("refresh_tokens", RefreshToken)
+    assert tokens["refresh_token_id"].tolist() == [str(valid.refresh_token_id)]
+
+
+def test_sweep_orphans_deletes_only_abandoned_files():
+    storage.save_version(
+        RefreshToken(user_id=uuid4(), expires_at=datetime.now(timezone.utc)), "refresh_tokens", "refresh_token_id"
+    )
+
+    def orphan(age: timedelta) -> str:
+        written = timestamp(datetime.now(timezone.utc) - age)
+        key = f"refresh_tokens/refresh_token_id={uuid4()}/year=2025/month=01/day=01/refresh_token-x-{written}-{uuid4().hex}.parquet"
+        run_sync(put_bytes(key, b"never committed"))
+        return key
+
+    old, recent = orphan(timedelta(hours=1)), orphan(timedelta(seconds=1))
+    assert run_sync(scheduler.run_job("sweep_orphans")) == 1
+    keys = run_sync(list_keys("refresh_tokens/"))
+    assert old not in keys and recent in keys and len(keys) == 2
+
+
+def test_only_updates_claim_versions_and_old_claims_are_swept(monkeypatch):
+    from app.services import maintenance
+
+    entry = Entry(
+        user_id=uuid4(),
+        account_id=uuid4(),
+        household_id=uuid4(),
+        entry_date=date(2025, 7, 1),
+        value_date=date(2025, 7, 1),
+        type="expense",
+        category="groceries",
+        amount=1.0,
+    )
+    storage.save_version(entry, "entries", "entry_id")
+    assert run_sync(list_keys(VERSIONS_PREFIX)) == []
+
+    storage.save_version(entry.model_copy(update={"version": 2}), "entries", "entry_id")
+    assert run_sync(list_keys(VERSIONS_PREFIX)) == [f"{VERSIONS_PREFIX}entries/{entry.entry_id}/{2:012d}"]
+
+    assert run_sync(scheduler.run_job("sweep_claims")) == 0
+    monkeypatch.setattr(maintenance, "CLAIM_TIMEOUT", timedelta(seconds=-5))
+    assert run_sync(scheduler.run_job("sweep_claims")) == 1
+    assert run_sync(list_keys(VERSIONS_PREFIX)) == []
@@ -0,0 +1,62 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+from uuid import uuid4
+import pandas as pd
+from pydantic import BaseModel
+from app.models.schemas.entry import Entry, EntryOut
+from app.services import storage
+from app.services.serialization import json_rows_response
+
+
+def test_rows_encode_like_the_response_model():
+    created = datetime(2025, 7, 1, 10, 30, 15, 123456, tzinfo=timezone.utc)
+    entries = [
+        Entry(
+            user_id=uuid4(),
+            account_id=uuid4(),
+            household_id=uuid4(),
+            debt_id=uuid4() if i else None,
+            entry_date=date(2025, 7, i + 1),
+            value_date=date(2025, 7, i + 1),
+            type="expense",
+            category="groceries",
+            amount=[42.5, 0.1, 1234.0][i],
+            created_at=created,
+            updated_at=created,
+        )
+        for i in range(3)
+    ]
+    for e in entries:
+        storage.save_version(e, "entries", "entry_id")
+    df = storage.load_versions("entries", Entry).sort_values("entry_date")
+
+    fast = json.loads(json_rows_response(df, EntryOut).body)
+    validated = [json.loads(EntryOut.model_validate(row).model_dump_json()) for row in df.to_dict(orient="records")]
+    assert fast == validated
+
+
+def test_list_keeps_its_schema_and_is_compressed(client, auth_headers):
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/entries/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert response["items"]["$ref"].endswith("/EntryOut")
+
+    client.post("/households/", json={"name": "Compressed"}, headers=auth_headers)
+    r = client.get("/audit/logs", headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert {log["action"] for log in r.json()} >= {"register", "create"}
+
+
+def test_datetimes_encode_like_pydantic():
+    class Stamped(BaseModel):
+        at: datetime | None = None
+
+    aware = [datetime(2025, 7, 1, 10, 30, tzinfo=timezone.utc), datetime(2025, 7, 1, 10, 30, 0, 5, tzinfo=timezone.utc)]
+    naive = [datetime(2025, 7, 1, 10, 30), datetime(2025, 7, 1, 10, 30, 0, 120000)]
+    mixed = [aware[0], naive[1], datetime(2025, 7, 1, 12, tzinfo=timezone(timedelta(hours=2))), None]
+    for values in (aware, naive, mixed, aware + [None]):
+        df = pd.DataFrame({"at": pd.Series(values, dtype=object)})
+        if values is not mixed:
+            df["at"] = pd.to_datetime(df["at"])
+        fast = json.loads(json_rows_response(df, Stamped).body)
+        assert fast == [Stamped(at=v).model_dump(mode="json") for v in values]
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.services import auth, roles, sharedcache
+
+
+def test_principal_and_memberships_are_shared_until_written(client: TestClient, auth_headers, monkeypatch):
+    me = client.get("/users/me", headers=auth_headers).json()
+    household_id = client.post("/households/", json={"name": "Cached"}, headers=auth_headers).json()["household_id"]
+    summary = {"household_id": household_id}
+    assert client.get("/summaries/summary", params=summary, headers=auth_headers).status_code == 200
+
+    def no_read(*args, **kwargs):
+        raise AssertionError("read from storage")
+
+    # Later requests authenticate and check roles without reading users or memberships
+    with monkeypatch.context() as m:
+        m.setattr(auth, "load_versions_async", no_read)
+        m.setattr(roles, "load_versions_async", no_read)
+        assert client.get("/users/me", headers=auth_headers).json()["user_id"] == me["user_id"]
+        assert client.get("/summaries/summary", params=summary, headers=auth_headers).status_code == 200
+    # Secrets never enter the shared cache
+    assert all("hashed_password" not in repr(entry) for entry in sharedcache.get_backend()._entries.values())
+
+    # A write to the user's record reaches the next request
+    r = client.put(f"/users/{me['user_id']}", json={"user_name": "renamed"}, headers=auth_headers)
+    assert r.status_code == 200
+    assert client.get("/users/me", headers=auth_headers).json()["user_name"] == "renamed"
+
+
+def test_memory_backend_drops_tagged_and_least_recent_entries():
+    backend = sharedcache.MemoryBackend(max_entries=2)
+
+    async def scenario():
+        await backend.set("a", 1, 60, ["users"])
+        await backend.set("b", 2, 60, ["accounts"])
+        await backend.invalidate(["users"])
+        assert await backend.get("a") is None
+        await backend.set("c", 3, 60, ["accounts"])
+        await backend.set("d", 4, 60, [])
+        return [await backend.get(k) for k in "bcd"]
+
+    assert asyncio.run(scenario()) == [None, 3, 4]
+
+
+def test_redis_backend_is_shared_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+
+    # Two workers, each with its own client to the same (stand-in) Redis
+    def worker():
+        return sharedcache.RedisBackend(
+            "redis://stand-in", client_factory=lambda: fakeredis.FakeAsyncRedis(server=server)
+        )
+
+    first, second = worker(), worker()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return {"names": {"a": "Groceries"}}
+
+    async def scenario():
+        tags = {"accounts": "_commits/1"}
+        sharedcache.set_backend(first)
+        assert await sharedcache.cached("names", ("accounts",), tags, load) == {"names": {"a": "Groceries"}}
+        sharedcache.set_backend(second)
+        await sharedcache.cached("names", ("accounts",), tags, load)
+        assert len(calls) == 1
+
+        # A commit on the second worker drops the entry for the first one too
+        await sharedcache.invalidate(["accounts"])
+        sharedcache.set_backend(first)
+        await sharedcache.cached("names", ("accounts",), tags, load)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_counters_expire_with_their_window():
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = sharedcache.RedisBackend("redis://stand-in", client_factory=lambda: fakeredis.FakeAsyncRedis())
+
+    async def scenario(backend):
+        counts = [await backend.incr("rate:x", 1, 60) for _ in range(3)]
+        return counts + [await backend.incr("rate:x", 0, 60), await backend.incr("rate:y", 0, 60)]
+
+    for backend in (sharedcache.MemoryBackend(), redis):
+        assert asyncio.run(scenario(backend)) == [1, 2, 3, 3, 0]
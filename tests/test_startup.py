@@ -0,0 +1,7 @@
+from scripts.benchmark_startup import _run_once
+
+
+def test_cold_start_keeps_heavy_clients_lazy():
+    run = _run_once()
+    assert run["status"] == 200
+    assert run["lazy_loaded"] == []
@@ -0,0 +1,107 @@
+import io
+from datetime import date, datetime, timezone
+from uuid import uuid4
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+from app.models.enums import Category, EntryType
+from app.models.schemas.entry import Entry
+from app.models.schemas.user import PasswordHistory, RefreshToken
+from app.services.objectstore import list_keys, run_sync
+from app.services.storage import load_versions, save_version
+from scripts import partition_records
+
+
+def _entry() -> Entry:
+    return Entry(
+        user_id=uuid4(),
+        account_id=uuid4(),
+        household_id=uuid4(),
+        entry_date=date(2025, 7, 1),
+        value_date=date(2025, 7, 1),
+        type=EntryType.expense,
+        category=Category.groceries,
+        amount=12.5,
+    )
+
+
+def test_versions_are_written_and_read_with_the_canonical_schema():
+    entry = _entry()
+    save_version(entry, "entries", "entry_id")
+
+    df = load_versions("entries", Entry)
+    assert len(df) == 1
+    assert df["entry_id"].iloc[0] == str(entry.entry_id)
+    assert isinstance(df["category"].dtype, pd.CategoricalDtype)
+    assert str(df["created_at"].dtype) == "datetime64[us, UTC]"
+    assert df["is_deleted"].dtype == bool
+    assert df["entry_date"].iloc[0] == date(2025, 7, 1)
+
+
+def test_legacy_files_are_conformed_on_read(setup_s3):
+    s3, bucket = setup_s3
+    token_id = str(uuid4())
+    legacy = pd.DataFrame(
+        [
+            {
+                "refresh_token_id": token_id,
+                "user_id": str(uuid4()),
+                "expires_at": "2030-01-01T00:00:00+00:00",
+                "is_current": True,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+        ]
+    )
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(legacy), buffer)
+    s3.put_object(
+        Bucket=bucket, Key=f"refresh_tokens/refresh_token_id={token_id}/legacy.parquet", Body=buffer.getvalue()
+    )
+
+    df = load_versions("refresh_tokens", RefreshToken, record_id=token_id)
+    assert len(df) == 1
+    assert df["expires_at"].iloc[0] == pd.Timestamp("2030-01-01", tz="UTC")
+    assert not df["is_deleted"].iloc[0]
+
+
+def test_refresh_token_rotation(client: TestClient):
+    email = f"rt-{uuid4().hex[:6]}@example.com"
+    client.post("/users/register", json={"email": email, "user_name": "rt", "password": "Test123!"})
+    refresh_token = client.post("/users/login", json={"email": email, "password": "Test123!"}).json()["refresh_token"]
+
+    r = client.post("/users/refresh", params={"refresh_token": refresh_token})
+    assert r.status_code == 200
+    assert r.json()["refresh_token"] != refresh_token
+
+    # The old token was rotated out
+    r = client.post("/users/refresh", params={"refresh_token": refresh_token})
+    assert r.status_code == 401
+
+
+def test_records_move_into_the_per_user_layout(setup_s3):
+    s3, bucket = setup_s3
+    user_id, history_id = str(uuid4()), str(uuid4())
+    legacy = pd.DataFrame(
+        [
+            {
+                "history_id": history_id,
+                "user_id": user_id,
+                "hashed_password": "old-hash",
+                "changed_at": datetime.now(timezone.utc).isoformat(),
+                "is_current": True,
+            }
+        ]
+    )
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(legacy), buffer)
+    key = f"password_history/history_id={history_id}/year=2025/month=01/day=01/password_histor-{history_id}-20250101T000000000000Z.parquet"
+    s3.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
+    assert load_versions("password_history", PasswordHistory, parent_id=user_id).empty
+
+    assert run_sync(partition_records.move("password_history")) == 1
+    # Rerunning finds nothing left to move
+    assert run_sync(partition_records.move("password_history")) == 0
+    df = load_versions("password_history", PasswordHistory, parent_id=user_id)
+    assert df["hashed_password"].tolist() == ["old-hash"] and df["is_current"].all()
+    assert run_sync(list_keys("password_history/")) == run_sync(list_keys(f"password_history/user_id={user_id}/"))
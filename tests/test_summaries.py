@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 from uuid import uuid4
 from datetime import date
+import pyarrow as pa
 import app.main as app
 
 client = TestClient(app.app)
@@ -115,3 +116,32 @@ def test_summary_trends(client: TestClient):
     assert "category_trends" in result
     assert any(trend["type"] == "expense" for trend in result["type_trends"])
     assert any(trend["type"] == "income" for trend in result["type_trends"])
+
+
+def test_summary_export_is_columnar(client: TestClient, auth_headers):
+    user_id = client.get("/users/me", headers=auth_headers).json()["user_id"]
+    household_id = client.post("/households/", json={"name": "Export HH"}, headers=auth_headers).json()["household_id"]
+    r = client.post("/accounts/", json={"name": "Export ACC", "household_id": household_id}, headers=auth_headers)
+    client.post(
+        f"/accounts/{r.json()['account_id']}/assign-user", params={"target_user_id": user_id}, headers=auth_headers
+    )
+
+    for entry_date, amount in [("2025-07-01", 10), ("2025-07-15", 5), ("2025-08-01", 7)]:
+        entry = {
+            "user_id": user_id,
+            "account_name": "Export ACC",
+            "household_name": "Export HH",
+            "entry_date": entry_date,
+            "value_date": entry_date,
+            "type": "expense",
+            "category": "groceries",
+            "amount": amount,
+        }
+        assert client.post("/entries/", json=entry, headers=auth_headers).status_code == 200
+
+    r = client.get("/summaries/export", params={"format": "arrow", "end": "2025-07-31"}, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    rows = pa.ipc.open_stream(r.content).read_all().to_pylist()
+    assert [(row["month"], row["amount"], row["entries"]) for row in rows] == [("2025-07", 15.0, 2)]
+    assert rows[0]["household_id"] == household_id
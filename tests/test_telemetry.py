@@ -0,0 +1,20 @@
+import re
+from fastapi.testclient import TestClient
+
+
+def test_server_timing_reports_storage_calls(client: TestClient, auth_headers):
+    r = client.get("/users/me", headers=auth_headers)
+    assert r.status_code == 200
+
+    timing = r.headers["Server-Timing"]
+    assert re.search(r"s3;dur=[\d.]+", timing)
+    assert re.search(r"total;dur=[\d.]+", timing)
+
+    # get_current_user lists and reads the user's versions
+    calls = dict(re.findall(r"(list|get|put)=(\d+)", timing))
+    assert int(calls["list"]) >= 1
+    assert int(calls["get"]) >= 1
+    assert int(calls["put"]) == 0
+
+    r = client.get("/health")
+    assert "list=0 get=0 put=0" in r.headers["Server-Timing"]
@@ -0,0 +1,93 @@
+import asyncio
+import io
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+import jwt
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+from app.services import objectstore, revocations, tokens
+from app.services.auth import ALGORITHM, SECRET_KEY, rotate_refresh_token
+from app.services.commitlog import current_state
+from app.services.objectstore import list_keys, run_sync
+
+
+def _login(client: TestClient) -> tuple[str, str]:
+    email = f"tok-{uuid4().hex[:6]}@example.com"
+    client.post("/users/register", json={"email": email, "user_name": "tok", "password": "Test123!"})
+    body = client.post("/users/login", json={"email": email, "password": "Test123!"}).json()
+    return jwt.decode(body["access_token"], SECRET_KEY, algorithms=[ALGORITHM])["sub"], body["refresh_token"]
+
+
+def test_token_operations_only_list_the_users_partition(client: TestClient, monkeypatch):
+    user_id, refresh_token = _login(client)
+    _login(client)
+
+    listed = []
+    original = objectstore.list_keys
+
+    async def spy(prefix: str) -> list[str]:
+        listed.append(prefix)
+        return await original(prefix)
+
+    monkeypatch.setattr(tokens, "list_keys", spy)
+    assert client.post("/users/refresh", params={"refresh_token": refresh_token}).status_code == 200
+    assert run_sync(tokens.revoke_all(user_id)) == 1
+    partition = f"refresh_tokens/user_id={user_id}/"
+    assert all(p.startswith(partition) or p.startswith(tokens.LEGACY_PREFIX) for p in listed)
+
+
+def test_legacy_tokens_rotate_until_purged(client: TestClient, setup_s3):
+    s3, bucket = setup_s3
+    user_id, _ = _login(client)
+    token_id = str(uuid4())
+    expires = datetime.now(timezone.utc) + timedelta(days=1)
+    row = {"refresh_token_id": token_id, "user_id": user_id, "expires_at": expires.isoformat(), "is_current": True}
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(pd.DataFrame([row])), buffer)
+    s3.put_object(Bucket=bucket, Key=f"{tokens.LEGACY_PREFIX}{token_id}/legacy.parquet", Body=buffer.getvalue())
+    legacy = jwt.encode({"sub": user_id, "jti": token_id, "exp": expires}, SECRET_KEY, algorithm=ALGORITHM)
+
+    assert client.post("/users/refresh", params={"refresh_token": legacy}).status_code == 200
+    assert client.post("/users/refresh", params={"refresh_token": legacy}).status_code == 401
+
+    # The rotated legacy token and its claim are deleted; the user's new token stays
+    assert run_sync(tokens.purge_expired()) == 1
+    assert not run_sync(list_keys(tokens.LEGACY_PREFIX))
+    assert run_sync(list_keys(f"refresh_tokens/user_id={user_id}/"))
+
+
+def test_concurrent_rotation_lets_one_request_win(client: TestClient):
+    user_id, refresh_token = _login(client)
+    token_id = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])["jti"]
+
+    async def both():
+        return await asyncio.gather(
+            rotate_refresh_token(user_id, token_id), rotate_refresh_token(user_id, token_id), return_exceptions=True
+        )
+
+    outcomes = run_sync(both())
+    assert sum(isinstance(o, str) for o in outcomes) == 1
+    assert [o.status_code for o in outcomes if not isinstance(o, str)] == [401]
+
+
+def test_reused_token_is_rejected_from_memory(client: TestClient, monkeypatch):
+    user_id, refresh_token = _login(client)
+    token_id = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])["jti"]
+    assert client.post("/users/refresh", params={"refresh_token": refresh_token}).status_code == 200
+
+    async def no_listing(prefix: str) -> list[str]:
+        raise AssertionError(f"listed {prefix}")
+
+    monkeypatch.setattr(tokens, "list_keys", no_listing)
+    assert client.post("/users/refresh", params={"refresh_token": refresh_token}).status_code == 401
+
+    # Later revocations are picked up from the log state
+    monkeypatch.undo()
+    other_user, other = _login(client)
+    other_id = jwt.decode(other, SECRET_KEY, algorithms=[ALGORITHM])["jti"]
+    assert not revocations.is_revoked(other_id, run_sync(current_state()))
+    run_sync(tokens.revoke_all(other_user))
+    assert revocations.is_revoked(other_id, run_sync(current_state()))
+    assert revocations.is_revoked(token_id, run_sync(current_state()))
@@ -1,5 +1,7 @@
 from uuid import uuid4
 from fastapi.testclient import TestClient
+from app.services.commitlog import COMMITS_PREFIX
+from app.services.objectstore import list_keys, run_sync
 
 
 def test_register_login_update_change_password(client: TestClient, superuser_client):
@@ -83,3 +85,106 @@ def test_register_login_update_change_password(client: TestClient, superuser_cli
 
     r = client.get("/households/memberships", headers=su_headers)
     assert all(m["user_id"] != user_id for m in r.json())
+
+
+def test_delete_user_in_background_commits_once(client: TestClient, another_user, superuser_client):
+    _, su_headers = superuser_client
+    user_id, headers = another_user
+    for i in range(3):
+        client.post("/households/", json={"name": f"Household {i}"}, headers=headers)
+
+    commits_before = len(run_sync(list_keys(COMMITS_PREFIX)))
+    r = client.delete(f"/users/{user_id}", params={"background": True}, headers=headers)
+    assert r.status_code == 202
+    job = client.get(f"/users/jobs/{r.json()['job_id']}").json()
+    assert job["status"] == "done" and job["result"]["user_id"] == user_id
+    assert "owner_id" not in job
+
+    # The user, every membership and every audit record of the cascade land in one commit
+    assert len(run_sync(list_keys(COMMITS_PREFIX))) == commits_before + 1
+    r = client.get("/households/memberships", headers=su_headers)
+    assert all(m["user_id"] != user_id for m in r.json())
+    assert client.get(f"/users/jobs/{uuid4().hex}").status_code == 404
+
+
+def test_login_is_throttled_before_any_work(client: TestClient, monkeypatch):
+    from app.api import users
+
+    monkeypatch.setattr(users.settings, "login_failures_per_email", 2)
+    monkeypatch.setattr(users.settings, "login_attempts_per_ip", 3)
+    email = f"throttle-{uuid4().hex[:6]}@example.com"
+    client.post("/users/register", json={"email": email, "user_name": "throttle", "password": "Test123!"})
+
+    for _ in range(2):
+        assert client.post("/users/login", json={"email": email, "password": "Wrong123!"}).status_code == 401
+
+    def no_work(*args, **kwargs):
+        raise AssertionError("throttled attempts must not read storage or hash")
+
+    with monkeypatch.context() as m:
+        m.setattr(users, "load_versions_async", no_work)
+        m.setattr(users, "verify_password", no_work)
+        # Failures lock the email, even with the right password...
+        r = client.post("/users/login", json={"email": email, "password": "Test123!"})
+        assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+        # ...and every attempt counts against the client, whatever the email
+        assert client.post("/users/login", json={"email": "x@example.com", "password": "y"}).status_code == 429
+
+
+def test_password_reset_reads_only_the_users_partition(client: TestClient, monkeypatch):
+    from app.services import scheduler, storage
+
+    email = f"reset-{uuid4().hex[:6]}@example.com"
+    client.post("/users/register", json={"email": email, "user_name": "reset", "password": "First123!"})
+    client.post("/users/register", json={"email": f"other-{email}", "user_name": "other", "password": "First123!"})
+    issued = client.post("/users/request-password-reset", params={"email": email}).json()
+    assert issued["expires_in_minutes"] == 60
+    otp = issued["otp"]
+
+    listed = []
+    original = storage.list_keys
+
+    async def spy(prefix: str, **kwargs) -> list[str]:
+        listed.append(prefix)
+        return await original(prefix, **kwargs)
+
+    reset = {"email": email, "otp_code": otp, "new_password": "Second123!"}
+    with monkeypatch.context() as m:
+        m.setattr(storage, "list_keys", spy)
+        assert client.post("/users/reset-password", params=reset).status_code == 200
+    user_id = client.post("/users/login", json={"email": email, "password": "Second123!"}).json()["user_id"]
+    password_listings = [p for p in listed if p.startswith("password_")]
+    assert password_listings
+    assert all(p.startswith(storage.partition_prefix(p.split("/")[0], user_id)) for p in password_listings)
+
+    # The used token is spent; history now holds the new password
+    assert client.post("/users/reset-password", params=reset).status_code == 400
+    otp = client.post("/users/request-password-reset", params={"email": email}).json()["otp"]
+    r = client.post("/users/reset-password", params={**reset, "otp_code": otp})
+    assert r.status_code == 400 and "reuse" in r.json()["detail"]
+
+    # Spent tokens are purged; the unused one is kept until it expires
+    assert run_sync(scheduler.run_job("purge_expired_tokens")) == 1
+    assert len(run_sync(list_keys("password_reset_tokens/"))) == 1
+
+
+def test_forwarded_for_only_counts_from_trusted_proxies(monkeypatch):
+    from app.api import users
+    from app.main import app
+
+    monkeypatch.setattr(users.settings, "login_attempts_per_ip", 2)
+    attempt = {"email": "nobody@example.com", "password": "Wrong123!"}
+
+    # A client cannot claim a fresh address with the header...
+    direct = TestClient(app, client=("203.0.113.7", 50000))
+    codes = [
+        direct.post("/users/login", json=attempt, headers={"X-Forwarded-For": f"198.51.100.{i}"}).status_code
+        for i in range(3)
+    ]
+    assert codes == [401, 401, 429]
+
+    # ...but behind the trusted proxy each client is counted on its own
+    proxied = TestClient(app, client=("127.0.0.1", 50000))
+    for i in range(3):
+        r = proxied.post("/users/login", json=attempt, headers={"X-Forwarded-For": f"203.0.113.7, 198.51.100.{i}"})
+        assert r.status_code == 401